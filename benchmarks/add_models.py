@@ -0,0 +1,42 @@
+"""
+Measures the time to add and remove many models, one at a time and in bulk.
+Run from the project root with: python -m benchmarks.add_models
+"""
+
+import numpy as np
+from benchmarks.common import create_scene, timeit
+
+
+def main(counts: tuple=(1000, 10000, 100000)) -> None:
+    scene = create_scene(meshes=('sphere',))
+    model_handler = scene.model_handler
+    rng = np.random.default_rng(0)
+
+    print(f'{"models":>8} {"add (s)":>9} {"add_many (s)":>13} {"remove (s)":>11} {"remove_many (s)":>16}')
+    for count in counts:
+        positions = rng.uniform(-500, 500, (count, 3))
+
+        def add():
+            model_handler.clear()
+            for position in positions.tolist(): model_handler.add(vbo='sphere', position=position)
+        def add_many():
+            model_handler.clear()
+            model_handler.add_many(positions, vbo='sphere')
+
+        single = timeit(add, repeat=1)
+        bulk   = timeit(add_many, repeat=3)
+
+        # Remove a tenth of the models
+        removed = model_handler.models[::10]
+        def remove():
+            for model in removed: model_handler.remove(model)
+        bulk_remove   = timeit(lambda: model_handler.remove_many(removed), repeat=1)
+        add_many()
+        removed = model_handler.models[::10]
+        single_remove = timeit(remove, repeat=1) if count <= 10000 else float('nan')
+
+        print(f'{count:>8} {single:>9.3f} {bulk:>13.3f} {single_remove:>11.3f} {bulk_remove:>16.3f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""
+Measures how long ModelHandler.update holds the main thread while a scene's chunks are batched for the first time.
+Compares building the chunk meshes on the main thread with building them on worker threads and only uploading them on the main thread.
+Each frame sleeps for the rest of a 60 fps frame, standing in for the time the GPU and display take.
+Run from the project root with: python -m benchmarks.async_batching
+"""
+
+import time
+from scripts.camera import Camera
+from benchmarks.common import create_scene, populate
+
+
+def load(scene, frame_time: float=1 / 60) -> dict:
+    """
+    Updates the model handler once per frame until every chunk is batched.
+    Returns the number of frames taken, the total time, and the slowest and total update times.
+    """
+
+    model_handler = scene.model_handler
+    results = {'frames' : 0, 'total' : 0, 'worst' : 0, 'main' : 0}
+
+    start = time.perf_counter()
+    while True:
+        frame_start = time.perf_counter()
+        model_handler.update()
+        elapsed = time.perf_counter() - frame_start
+
+        results['frames'] += 1
+        results['worst'] = max(results['worst'], elapsed)
+        results['main'] += elapsed
+        if not model_handler.jobs: break
+        time.sleep(max(frame_time - elapsed, 0))
+
+    results['total'] = time.perf_counter() - start
+    return results
+
+
+def main(n_models: int=300, n_chunks: int=8, workers: tuple=(0, 1, 2)) -> None:
+    scene = create_scene()
+    scene.camera = Camera(scene.engine, position=(0, 20, 20))
+    model_handler = scene.model_handler
+    model_handler.instance_threshold = 2 ** 31  # Batch every mesh, which is the slowest to assemble
+    model_handler.rebatch_budget = None  # Submit every chunk on the first update
+
+    print(f'{n_models} models in {n_chunks} chunks')
+    print(f'{"workers":>8} {"frames":>7} {"worst update (ms)":>18} {"main thread (ms)":>17} {"total (ms)":>11}')
+    for n_workers in workers:
+        model_handler.clear()
+        model_handler.batch_workers = n_workers
+        if model_handler.executor: model_handler.executor.shutdown()
+        model_handler.executor = None
+        populate(scene, n_models, n_chunks=n_chunks)
+
+        results = load(scene)
+        print(f'{n_workers:>8} {results["frames"]:>7} {results["worst"] * 1000:>18.2f} {results["main"] * 1000:>17.2f} {results["total"] * 1000:>11.2f}')
+
+
+if __name__ == '__main__':
+    main()
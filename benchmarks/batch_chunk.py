@@ -0,0 +1,68 @@
+"""
+Measures chunk rebatch throughput in models per second.
+Compares the previous per-model copy and vstack batching against ModelHandler.get_batch_data.
+Run from the project root with: python -m benchmarks.batch_chunk
+"""
+
+import numpy as np
+from benchmarks.common import create_scene, populate, timeit
+
+
+def legacy_batch_data(model_handler, models: list) -> np.ndarray:
+    """
+    The batching used before get_batch_data. Copies every mesh and allocates per model.
+    Per object data is in the layout read by the original batch shader, with euler rotations.
+    """
+
+    batch_data = []
+    for model in models:
+        vbo = model_handler.vbos[model.vbo]
+        vertex_data = vbo.vertex_data[vbo.index_data]
+        model_data = np.array([*model.position, *model.rotation, *model.scale, model.material])
+        object_data = np.zeros(shape=(vertex_data.shape[0], 24), dtype='f4')
+        object_data[:,:vertex_data.shape[1]] = vertex_data
+        object_data[:,14:] = model_data
+        batch_data.append(object_data)
+    return np.vstack(batch_data)
+
+
+def sort_rows(data: np.ndarray) -> np.ndarray:
+    """
+    Sorts the rows of an array as whole rows, so that arrays holding the same rows in any order compare equal
+    """
+
+    return data[np.lexsort(data.T)]
+
+
+def main(counts: tuple=(10, 100, 1000)) -> None:
+    scene = create_scene(meshes=('bunny', 'sphere'))
+    model_handler = scene.model_handler
+
+    print(f'{"models":>8} {"legacy models/s":>16} {"batched models/s":>17} {"speedup":>8}')
+    for count in counts:
+        model_handler.models.clear()
+        model_handler.chunks.clear()
+        populate(scene, count)
+        models = model_handler.models
+
+        # Both paths must produce the same verticies for each model once the batch is expanded by its indices.
+        # Rows are compared whole, with the mesh data, position, scale, and material of each vertex. Rotations are stored differently
+        batch_data, index_data, _, index_ranges = model_handler.get_batch_data(models)
+        legacy_data = legacy_batch_data(model_handler, models)
+        offset = 0
+        for model in models:
+            first, n_indices = index_ranges[model]
+            legacy_rows = legacy_data[offset:offset + n_indices][:,[*range(17), 20, 21, 22, 23]]
+            batch_rows  = batch_data[index_data[first:first + n_indices]][:,[*range(17), 21, 22, 23, 24]]
+            assert np.allclose(sort_rows(legacy_rows), sort_rows(batch_rows))
+            offset += n_indices
+        assert offset == len(legacy_data)
+        del legacy_data
+
+        legacy  = timeit(lambda: legacy_batch_data(model_handler, models), repeat=3)
+        batched = timeit(lambda: model_handler.get_batch_data(models), repeat=3)
+        print(f'{count:>8} {count / legacy:>16.0f} {count / batched:>17.0f} {legacy / batched:>7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
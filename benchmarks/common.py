@@ -0,0 +1,77 @@
+import time
+import numpy as np
+import moderngl as mgl
+from types import SimpleNamespace
+from scripts.render.vao_handler import VAOHandler
+from scripts.render.vbo_handler import ModelVBO
+from scripts.render.texture_handler import TextureHandler
+from scripts.render.material_handler import MaterialHandler
+from scripts.model_handler import ModelHandler
+
+
+def create_context() -> mgl.Context:
+    """
+    Creates a standalone GL context. Tries EGL first so that benchmarks can run without a display.
+    """
+
+    try: return mgl.create_standalone_context(backend='egl')
+    except Exception: return mgl.create_standalone_context()
+
+
+def create_scene(meshes: list=('bunny', 'sphere'), materials: int=4, win_size: tuple=(800, 800), textures: bool=False):
+    """
+    Creates the minimal set of handlers needed by a ModelHandler without opening a window.
+    Returns a namespace standing in for the scene.
+    Args:
+        meshes: list
+            Names of the obj files in the models folder to load
+        materials: int
+            Number of material ids that models can use
+        textures: bool
+            Loads the textures folder into a real TextureHandler
+    """
+
+    ctx = create_context()
+    engine = SimpleNamespace(ctx=ctx, win_size=win_size)
+    project = SimpleNamespace(engine=engine, ctx=ctx, texture_handler=SimpleNamespace(texture_ids={}))
+
+    scene = SimpleNamespace(engine=engine, project=project, ctx=ctx)
+    scene.vao_handler = VAOHandler(project)
+    if textures: project.texture_handler = TextureHandler(engine, scene.vao_handler)
+    scene.material_handler = MaterialHandler(scene)
+    for name in ['base'] + [f'material_{i}' for i in range(1, materials)]: scene.material_handler.add(name)
+
+    vbos = scene.vao_handler.vbo_handler.vbos
+    for mesh in meshes:
+        vbos[mesh] = ModelVBO(ctx, f'models/{mesh}.obj')
+
+    scene.model_handler = ModelHandler(scene)
+    return scene
+
+
+def populate(scene, n_models: int, n_chunks: int=1, seed: int=0) -> None:
+    """
+    Adds models with random meshes, materials, and transforms to the scene, spread across n_chunks chunks along the x axis.
+    """
+
+    rng = np.random.default_rng(seed)
+    meshes = [key for key in scene.model_handler.vbos if key != 'cube']
+    materials = list(scene.material_handler.material_ids)
+
+    positions = rng.uniform(0, 39, (n_models, 3))
+    positions[:,0] += (np.arange(n_models) % n_chunks) * 40
+    scene.model_handler.add_many(positions, rng.uniform(-3, 3, (n_models, 3)), rng.uniform(.5, 2, (n_models, 3)),
+                                 vbo=[meshes[i % len(meshes)] for i in range(n_models)], material=[materials[i % len(materials)] for i in range(n_models)])
+
+
+def timeit(func, repeat: int=5) -> float:
+    """
+    Returns the best time in seconds of repeat calls to func
+    """
+
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
@@ -0,0 +1,59 @@
+"""
+Measures the frames per second of the headless engine when every frame is read back to the CPU.
+Compares reading the framebuffer directly after each frame, which waits for the frame to finish rendering,
+to the asynchronous pixel buffer reads of FrameReader.
+Run from the project root with: python -m benchmarks.headless_readback
+"""
+
+import time
+import numpy as np
+from headless import HeadlessEngine
+
+
+def rewind(engine) -> None:
+    """
+    Moves the scripted camera back to the start of its path, so each method renders the same frames
+    """
+
+    engine.project.current_scene.camera.time = 0
+
+
+def legacy_run(engine, frames: int, on_frame) -> dict:
+    """
+    Renders frames like HeadlessEngine.run, but reads each one with Framebuffer.read as soon as it is rendered
+    """
+
+    start = time.perf_counter()
+    for index in range(frames):
+        engine.update()
+        engine.render()
+        data = engine.project.vao_handler.framebuffer.read(components=4)
+        on_frame(index, np.frombuffer(data, dtype='u1').reshape(engine.win_size[1], engine.win_size[0], 4)[::-1])
+
+    elapsed = time.perf_counter() - start
+    return {'frames' : frames, 'seconds' : elapsed, 'fps' : frames / elapsed}
+
+
+def main(sizes: tuple=((320, 240), (1280, 720)), frames: int=120) -> None:
+    print(f'{"size":>10} {"no readback (fps)":>18} {"direct (fps)":>13} {"async (fps)":>12}')
+    for size in sizes:
+        engine = HeadlessEngine(win_size=size)
+        checksums = {}
+
+        # Warm up so shaders are compiled and chunks are batched
+        engine.run(10)
+
+        rewind(engine)
+        none = engine.run(frames)
+        rewind(engine)
+        direct = legacy_run(engine, frames, lambda index, pixels: checksums.setdefault(('direct', index), int(pixels[0, 0, 3])))
+        rewind(engine)
+        pbo = engine.run(frames, lambda index, pixels: checksums.setdefault(('async', index), int(pixels[0, 0, 3])))
+        assert len(checksums) == 2 * frames
+
+        print(f'{size[0]:>5}x{size[1]:<4} {none["fps"]:>18.1f} {direct["fps"]:>13.1f} {pbo["fps"]:>12.1f}')
+        engine.release()
+
+
+if __name__ == '__main__':
+    main()
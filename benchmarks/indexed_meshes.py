@@ -0,0 +1,92 @@
+"""
+Compares meshes drawn as triangle lists, as the engine did before, with indexed meshes in file order and indexed meshes ordered for the vertex cache.
+Reports the memory of each mesh and of a chunk batch, the vertices shaded per frame with a first in first out cache of CACHE_SIZE vertices,
+and the time to render the batch into a 1x1 framebuffer so that the vertex stage is most of the frame.
+Run from the project root with: python -m benchmarks.indexed_meshes
+"""
+
+import time
+import numpy as np
+from scripts.render.vbo_handler import ModelVBO
+from scripts.render.chunk_batch import ChunkBatch, VERTEX_FLOATS, VERTEX_SIZE, INDEX_SIZE, INDEX_DTYPE
+from scripts.generic.mesh_optimize import index_vertices, optimize_mesh, get_acmr, CACHE_SIZE
+from benchmarks.common import create_scene, populate
+
+LAYOUTS = ('triangle list', 'indexed', 'optimized')
+
+
+def get_layouts(path: str) -> dict:
+    """
+    Returns the (vertex data, index data) of a model file in each layout, and the time to optimize it.
+    The triangle list is drawn with sequential indices, which shade every vertex like a draw without indices
+    """
+
+    vertex_data = ModelVBO.read_vertex_data(path)
+    start = time.perf_counter()
+    optimized = optimize_mesh(vertex_data)
+    seconds = time.perf_counter() - start
+
+    return {'triangle list' : (vertex_data, np.arange(len(vertex_data), dtype=INDEX_DTYPE)),
+            'indexed'       : index_vertices(vertex_data),
+            'optimized'     : optimized}, seconds
+
+
+def time_frames(ctx, batch: ChunkBatch, frames: int) -> float:
+    """
+    Returns the average time in seconds to render a batch, waiting for the GPU to finish each frame
+    """
+
+    batch.render()
+    ctx.finish()
+
+    start = time.perf_counter()
+    for _ in range(frames):
+        batch.render()
+        ctx.finish()
+    return (time.perf_counter() - start) / frames
+
+
+def main(meshes: tuple=('bunny', 'sphere', 'monkey', 'donut'), n_models: int=200, frames: int=10) -> None:
+    scene = create_scene(meshes=meshes)
+    ctx = scene.ctx
+    model_handler = scene.model_handler
+
+    print(f'{"mesh":>8} {"triangles":>10} {"verticies":>22} {"memory (KB)":>22} {"verticies per triangle":>24} {"optimize (ms)":>14}')
+    layouts = {}
+    for mesh in meshes:
+        layouts[mesh], seconds = get_layouts(f'models/{mesh}.obj')
+        n_triangles = len(layouts[mesh]['triangle list'][1]) // 3
+
+        counts = [len(layouts[mesh][layout][0]) for layout in ('triangle list', 'optimized')]
+        memory = [layouts[mesh]['triangle list'][0].nbytes / 1024, sum(array.nbytes for array in layouts[mesh]['optimized']) / 1024]
+        acmr = [get_acmr(layouts[mesh][layout][1]) for layout in LAYOUTS]
+        print(f'{mesh:>8} {n_triangles:>10} {counts[0]:>10} -> {counts[1]:>8} {memory[0]:>10.0f} -> {memory[1]:>8.0f} {" -> ".join(f"{value:.2f}" for value in acmr):>24} {seconds * 1000:>14.1f}')
+
+    # One chunk batch of every model in each layout
+    populate(scene, n_models)
+    models = model_handler.models
+    groups = [(vbo, group, model_handler.object_data[model_handler.get_slots(group)]) for vbo, group in model_handler.group_models(models).items()]
+
+    program = scene.vao_handler.shader_handler.get_program('batch', ())
+    framebuffer = ctx.framebuffer([ctx.renderbuffer((1, 1), components=4)])
+    framebuffer.use()
+
+    print(f"\n{n_models} models batched in one chunk, with a {CACHE_SIZE} vertex cache")
+    print(f'{"layout":>14} {"memory (MB)":>12} {"verticies drawn":>16} {"verticies shaded":>17} {"render (ms)":>12}')
+    for layout in LAYOUTS:
+        layout_groups = [(layouts[vbo][layout], group, object_data) for vbo, group, object_data in groups]
+        n_verticies, n_indices = model_handler.get_batch_size(layout_groups)
+        buffers = np.empty(shape=(n_verticies, VERTEX_FLOATS), dtype='f4'), np.empty(shape=(n_indices,), dtype=INDEX_DTYPE)
+        batch_data, index_data, ranges, index_ranges = model_handler.write_batch_data(layout_groups, *buffers)
+        batch = ChunkBatch(ctx, program, batch_data, ranges, 0, index_data, index_ranges)
+
+        # A triangle list is drawn without an index buffer, so its memory is only the verticies
+        memory = n_verticies * VERTEX_SIZE + (n_indices * INDEX_SIZE if layout != 'triangle list' else 0)
+        shaded = sum(get_acmr(layouts[vbo][layout][1]) * len(layouts[vbo][layout][1]) // 3 * len(group) for vbo, group, _ in groups)
+
+        print(f'{layout:>14} {memory / 2 ** 20:>12.1f} {n_indices:>16} {shaded:>17.0f} {time_frames(ctx, batch, frames) * 1000:>12.2f}')
+        batch.release()
+
+
+if __name__ == '__main__':
+    main()
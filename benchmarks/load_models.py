@@ -0,0 +1,54 @@
+"""
+Measures the time to deduplicate the vertices of each mesh in the models folder, with the old per vertex list search and the single np.unique pass.
+Run from the project root with: python -m benchmarks.load_models
+"""
+
+import glob
+import os
+import numpy as np
+from pyobjloader import load_model
+from scripts.render.vbo_handler import BaseVBO
+from benchmarks.common import timeit
+
+
+def legacy_unique_points(points: np.ndarray) -> tuple:
+    """
+    The deduplication BaseVBO.get_vbo used before, kept for comparison. O(n^2) in the number of vertices.
+    """
+
+    unique_points_set = set()
+    unique_points = []
+    for x in points.tolist():
+        if tuple(x) not in unique_points_set:
+            unique_points.append(x)
+            unique_points_set.add(tuple(x))
+
+    mesh_indicies = np.zeros(shape=(len(points)))
+    for i, vertex in enumerate(points):
+        mesh_indicies[i] = unique_points.index(vertex.tolist())
+
+    return np.array(unique_points, dtype='f4'), mesh_indicies
+
+
+def main(paths: list=None) -> None:
+    paths = paths or sorted(glob.glob('models/*.obj'))
+
+    print(f'{"model":>10} {"vertices":>9} {"unique":>7} {"load (s)":>9} {"legacy (s)":>11} {"np.unique (s)":>14} {"speedup":>8}')
+    for path in paths:
+        load = timeit(lambda: load_model(path, calculate_tangents=True), repeat=1)
+        points = load_model(path).vertex_data[:,:3].astype('f4')
+
+        legacy = timeit(lambda: legacy_unique_points(points), repeat=1)
+        unique = timeit(lambda: BaseVBO.get_unique_points(points), repeat=5)
+
+        # Both methods must give the same points in the same order
+        legacy_points, legacy_indicies = legacy_unique_points(points)
+        unique_points, mesh_indicies = BaseVBO.get_unique_points(points)
+        assert np.array_equal(legacy_points, unique_points) and np.array_equal(legacy_indicies, mesh_indicies)
+
+        name = os.path.splitext(os.path.basename(path))[0]
+        print(f'{name:>10} {len(points):>9} {len(unique_points):>7} {load:>9.3f} {legacy:>11.3f} {unique:>14.4f} {legacy / unique:>7.0f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+"""
+Measures the time to import the meshes and textures of a scene with different numbers of worker processes.
+The scene is made of copies of the files in the models and textures folders. The mesh cache is not used, so every model file is parsed.
+Run from the project root with: python -m benchmarks.load_scene
+"""
+
+import glob
+import os
+import shutil
+import tempfile
+from scripts.file_manager.import_pipeline import import_assets
+from benchmarks.common import create_scene, timeit
+
+
+def main(copies: int=6, workers: tuple=None) -> None:
+    scene = create_scene(meshes=(), textures=True)
+    texture_handler = scene.project.texture_handler
+    workers = workers or sorted({1, 2, 4, os.cpu_count() or 1})
+
+    with tempfile.TemporaryDirectory() as directory:
+        meshes, images = {}, []
+        for i in range(copies):
+            for path in glob.glob('models/*.obj'):
+                name = f'{os.path.splitext(os.path.basename(path))[0]}_{i}'
+                meshes[name] = shutil.copy(path, os.path.join(directory, f'{name}.obj'))
+            for path in glob.glob('textures/*.png'):
+                name = f'{os.path.splitext(os.path.basename(path))[0]}_{i}'
+                images.append('/' + os.path.basename(shutil.copy(path, os.path.join(directory, f'{name}.png'))))
+        texture_handler.directory = directory
+
+        print(f'{len(meshes)} meshes, {len(images)} textures, {os.cpu_count()} cores')
+        print(f'{"workers":>8} {"time (s)":>9} {"speedup":>8}')
+        base = None
+        for count in workers:
+            time = timeit(lambda: import_assets(scene, meshes, images, cache=None, max_workers=count), repeat=2)
+            base = base or time
+            print(f'{count:>8} {time:>9.3f} {base / time:>7.2f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""
+Measures the time and peak memory to load the textures folder into texture arrays.
+Compares the old path, which uploaded each image as its own texture and read it back, to the texture cache when empty (cold) and filled (warm).
+Run from the project root with: python -m benchmarks.load_textures
+"""
+
+import os
+import tempfile
+import tracemalloc
+import numpy as np
+import pygame as pg
+from scripts.render.texture_handler import TextureHandler
+from scripts.file_manager.texture_cache import TextureCache
+from benchmarks.common import create_scene, timeit
+
+
+def legacy_texture_arrays(ctx, directory: str, sizes: tuple) -> dict:
+    """
+    The texture loading TextureHandler used before, kept for comparison. Returns the texture arrays.
+    """
+
+    textures, surfaces = {}, {}
+    for file in os.listdir(directory):
+        texture = pg.image.load(f'{directory}/{file}')
+        surfaces[file[:-4]] = texture.copy()
+
+        original_size = texture.get_size()[0]
+        size = sizes[np.argmin([abs(bucket_size - original_size) for bucket_size in sizes])]
+        texture = pg.transform.flip(pg.transform.scale(texture, (size, size)), False, True)
+        textures[file[:-4]] = (ctx.texture(size=(size, size), components=3, data=pg.image.tostring(texture, 'RGB')), size)
+
+    size_data = {size : [] for size in sizes}
+    for texture, size in textures.values(): size_data[size].append(texture.read())
+
+    arrays = {size : ctx.texture_array((size, size, len(size_data[size])), 3, np.array(size_data[size])) for size in sizes}
+    for array in arrays.values(): array.build_mipmaps()
+    for texture, size in textures.values(): texture.release()
+    return arrays
+
+
+def measure(func) -> tuple:
+    """
+    Returns the time in seconds and the peak traced memory in MB of a call to func
+    """
+
+    tracemalloc.start()
+    time = timeit(func, repeat=1)
+    peak = tracemalloc.get_traced_memory()[1] / 2**20
+    tracemalloc.stop()
+    return time, peak
+
+
+def main() -> None:
+    scene = create_scene(meshes=())
+    ctx, sizes = scene.ctx, (128, 256, 512, 1024, 2048)
+
+    with tempfile.TemporaryDirectory() as directory:
+        cache = TextureCache(directory)
+
+        def load(cache):
+            TextureHandler(scene.engine, scene.vao_handler, cache=cache).release()
+        def cold():
+            cache.clear()
+            load(cache)
+        def legacy():
+            [array.release() for array in legacy_texture_arrays(ctx, 'textures', sizes).values()]
+
+        print(f'{len(os.listdir("textures"))} textures')
+        print(f'{"method":>9} {"time (s)":>9} {"peak (MB)":>10}')
+        for name, func in (('legacy', legacy), ('no cache', lambda: load(None)), ('cold', cold), ('warm', lambda: load(cache))):
+            func()
+            print(f'{name:>9} {timeit(func, repeat=3):>9.3f} {measure(func)[1]:>10.1f}')
+
+        # The texture arrays must match the old path exactly
+        handler = TextureHandler(scene.engine, scene.vao_handler, cache=cache)
+        arrays = legacy_texture_arrays(ctx, 'textures', sizes)
+        assert all(handler.texture_arrays[size].read() == arrays[size].read() for size in sizes)
+
+
+if __name__ == '__main__':
+    main()
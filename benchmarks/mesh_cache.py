@@ -0,0 +1,47 @@
+"""
+Measures the time to create a ModelVBO for each mesh in the models folder without the mesh cache, with an empty cache (cold), and with a filled cache (warm).
+Run from the project root with: python -m benchmarks.mesh_cache
+"""
+
+import glob
+import os
+import tempfile
+import numpy as np
+from scripts.render.vbo_handler import ModelVBO
+from scripts.file_manager.mesh_cache import MeshCache
+from benchmarks.common import create_context, timeit
+
+
+def main(paths: list=None) -> None:
+    paths = paths or sorted(glob.glob('models/*.obj'))
+    ctx = create_context()
+
+    with tempfile.TemporaryDirectory() as directory:
+        cache = MeshCache(directory)
+
+        def load(path, cache):
+            ModelVBO(ctx, path, cache=cache).release()
+        def cold(path):
+            cache.clear()
+            load(path, cache)
+
+        print(f'{"model":>10} {"vertices":>9} {"no cache (s)":>13} {"cold (s)":>9} {"warm (s)":>9} {"speedup":>8}')
+        total = np.zeros(3)
+        for path in paths:
+            times = (timeit(lambda: load(path, None), repeat=3), timeit(lambda: cold(path), repeat=3), timeit(lambda: load(path, cache), repeat=5))
+            total += times
+
+            # The cached vertex data must match a fresh load exactly
+            fresh, cached = ModelVBO(ctx, path, cache=None), ModelVBO(ctx, path, cache=cache)
+            assert np.array_equal(fresh.vertex_data, cached.vertex_data) and np.array_equal(fresh.index_data, cached.index_data)
+            assert np.array_equal(fresh.mesh_indicies, cached.mesh_indicies)
+            assert fresh.vbo.read() == cached.vbo.read() and fresh.ibo.read() == cached.ibo.read()
+            fresh.release(); cached.release()
+
+            name = os.path.splitext(os.path.basename(path))[0]
+            print(f'{name:>10} {len(fresh.vertex_data):>9} {times[0]:>13.4f} {times[1]:>9.4f} {times[2]:>9.4f} {times[0] / times[2]:>7.0f}x')
+        print(f'{"total":>10} {"":>9} {total[0]:>13.4f} {total[1]:>9.4f} {total[2]:>9.4f} {total[0] / total[2]:>7.0f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""
+Measures the simplified levels of detail of meshes and of chunks far from the camera.
+Reports the time to simplify each mesh, the verticies drawn and render time of a grid of chunks with and without levels of detail,
+and the chunks rebuilt while the camera moves back and forth over the distance where chunks change level, with and without hysteresis.
+Renders into a 1x1 framebuffer so that the vertex stage is most of the frame.
+Run from the project root with: python -m benchmarks.mesh_lod
+"""
+
+import time
+import glm
+import numpy as np
+from scripts.camera import Camera
+from scripts.model_handler import CHUNK_SIZE
+from scripts.render.vbo_handler import ModelVBO
+from scripts.generic.simplify import get_lods
+from scripts.generic.profiler import profiler
+from benchmarks.common import create_scene, timeit
+
+
+def render(scene, frames: int) -> tuple:
+    """
+    Returns the average time in seconds to render the chunks, and the verticies drawn per frame
+    """
+
+    model_handler = scene.model_handler
+    profiler.enable()
+    profiler.new_frame()
+    model_handler.render()
+    profiler.new_frame()
+    vertices = profiler.history[-1]['counters'].get('vertices', 0)
+    profiler.disable()
+    profiler.clear()
+
+    scene.ctx.finish()
+    start = time.perf_counter()
+    for _ in range(frames):
+        model_handler.render()
+        scene.ctx.finish()
+    return (time.perf_counter() - start) / frames, vertices
+
+
+def oscillate(scene, frames: int, amplitude: float) -> int:
+    """
+    Moves the camera amplitude units back and forth along x each frame. Returns the number of chunks rebuilt
+    """
+
+    model_handler = scene.model_handler
+    start = glm.vec3(scene.camera.position)
+    rebuilt = 0
+    for frame in range(frames):
+        scene.camera.position = start + glm.vec3(amplitude if frame % 2 else -amplitude, 0, 0)
+        model_handler.update()
+        rebuilt += model_handler.rebatch_stats['rebatched']
+    scene.camera.position = start
+    return rebuilt
+
+
+def main(grid: int=9, models_per_chunk: int=20, frames: int=20) -> None:
+    print(f'{"mesh":>10} {"triangles":>10} {"levels":>20} {"simplify (ms)":>14}')
+    for mesh in ('bunny', 'sphere', 'monkey', 'donut'):
+        vertex_data, index_data, unique_points, mesh_indicies, _, _, _ = ModelVBO.read_mesh(f'models/{mesh}.obj')
+        vertex_data = vertex_data[index_data]
+        seconds = timeit(lambda: get_lods(vertex_data, unique_points, mesh_indicies), 3)
+        _, counts = get_lods(vertex_data, unique_points, mesh_indicies)
+        print(f'{mesh:>10} {len(mesh_indicies) // 3:>10} {str((counts // 3).tolist()):>20} {seconds * 1000:>14.1f}')
+
+    scene = create_scene(meshes=('bunny', 'sphere'))
+    model_handler = scene.model_handler
+    model_handler.batch_workers = 0
+    model_handler.rebatch_budget = None
+
+    # Camera in the middle of a grid x grid layer of chunks, slightly off the center of its chunk
+    center = grid // 2 * CHUNK_SIZE + CHUNK_SIZE / 2
+    scene.camera = Camera(scene.engine, position=(center - 10, CHUNK_SIZE / 2, center))
+    scene.camera.yaw, scene.camera.pitch = 90, -10  # Looking across half of the grid, so chunks at every distance are in view
+    scene.camera.update_camera_vectors()
+    scene.camera.m_view = scene.camera.get_view_matrix()
+
+    rng = np.random.default_rng(0)
+    chunks = np.stack(np.meshgrid(np.arange(grid), 0, np.arange(grid)), axis=-1).reshape(-1, 3)
+    positions = (np.repeat(chunks, models_per_chunk, axis=0) + rng.uniform(.1, .9, (len(chunks) * models_per_chunk, 3))) * CHUNK_SIZE
+    model_handler.add_many(positions, vbo=['bunny', 'sphere'] * (len(positions) // 2))
+
+    framebuffer = scene.ctx.framebuffer([scene.ctx.renderbuffer((1, 1), components=4)])
+    framebuffer.use()
+
+    print(f'\n{len(positions)} models in {len(chunks)} chunks')
+    print(f'{"lod":>6} {"verticies":>10} {"render (ms)":>12}')
+    for lod_distances in (None, model_handler.lod_distances):
+        model_handler.lod_distances = lod_distances
+        model_handler.rebatch_queue.update(model_handler.chunks)
+        model_handler.update()
+        seconds, vertices = render(scene, frames)
+        print(f'{"on" if lod_distances else "off":>6} {vertices:>10} {seconds * 1000:>12.2f}')
+
+    print(f'\n{"hysteresis":>11} {"chunks rebuilt in " + str(frames * 3) + " frames":>28}')
+    for hysteresis in (0, model_handler.lod_hysteresis):
+        model_handler.lod_hysteresis = hysteresis
+        print(f'{hysteresis:>11} {oscillate(scene, frames * 3, CHUNK_SIZE * .1):>28}')
+
+
+if __name__ == '__main__':
+    main()
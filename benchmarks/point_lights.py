@@ -0,0 +1,68 @@
+"""
+Measures the frame time of the batch shader with increasing numbers of point lights, with clustered light culling and with a single cluster holding every light.
+Also checks that both give the same image.
+Run from the project root with: python -m benchmarks.point_lights
+"""
+
+import time
+import numpy as np
+from scripts.camera import Camera
+from scripts.model_handler import ModelHandler
+from scripts.render.material_handler import MaterialHandler
+from scripts.render.light_handler import LightHandler, CLUSTER_COUNT
+from benchmarks.common import create_scene, populate
+
+
+def render(scene, cluster_count: tuple, frames: int) -> tuple:
+    """
+    Returns the average time in seconds to bin the lights and render, and the last frame
+    """
+
+    scene.light_handler.cluster_count = cluster_count
+    # The first frame is not timed
+    for frame in range(frames + 1):
+        if frame == 1: start = time.perf_counter()
+        scene.light_handler.uploaded = None  # Bin every frame, as if the camera moved
+        scene.light_handler.write('batch', dir=False)
+        scene.framebuffer.clear()
+        scene.model_handler.render()
+        scene.ctx.finish()
+    return (time.perf_counter() - start) / frames, np.frombuffer(scene.framebuffer.read(), dtype='u1')
+
+
+def main(counts: tuple=(0, 10, 100, 500), n_models: int=300, frames: int=3) -> None:
+    scene = create_scene(win_size=(640, 360), textures=True)
+    scene.camera = Camera(scene.engine, position=(20, 20, 70))
+    scene.material_handler = MaterialHandler(scene)
+    scene.material_handler.add('base')
+    scene.model_handler = ModelHandler(scene)
+    scene.light_handler = LightHandler(scene)
+    populate(scene, n_models, n_chunks=1)
+    scene.model_handler.update()
+    scene.model_handler.finish_batches()
+
+    scene.vao_handler.shader_handler.set_camera(scene.camera)
+    scene.vao_handler.shader_handler.write_all_uniforms()
+    scene.material_handler.write('batch')
+    scene.light_handler.write('batch', dir=False)
+    scene.framebuffer = scene.ctx.framebuffer([scene.ctx.texture((640, 360), 4)], scene.ctx.depth_renderbuffer((640, 360)))
+    scene.framebuffer.use()
+
+    rng = np.random.default_rng(0)
+    print(f'{"lights":>7} {"single (ms)":>12} {"clustered (ms)":>15} {"speedup":>8} {"pairs":>7} {"max per cluster":>16}')
+    for count in counts:
+        lights = scene.light_handler.point_lights
+        lights.clear()
+        for _ in range(count):
+            scene.light_handler.add_point_light(pos=tuple(rng.uniform(0, 40, 3)), color=tuple(rng.uniform(0, 1, 3)), ambient=1.0, linear=0.35, quadratic=0.44)
+
+        single, single_frame = render(scene, (1, 1, 1), frames)
+        clustered, clustered_frame = render(scene, CLUSTER_COUNT, frames)
+        assert np.array_equal(single_frame, clustered_frame)
+
+        stats = scene.light_handler.light_stats
+        print(f'{count:>7} {single * 1000:>12.2f} {clustered * 1000:>15.2f} {single / clustered:>7.2f}x {stats["pairs"]:>7} {stats["max_per_cluster"]:>16}')
+
+
+if __name__ == '__main__':
+    main()
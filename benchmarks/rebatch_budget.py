@@ -0,0 +1,63 @@
+"""
+Moves every model of a scene into the next row of chunks at once, then measures the updates until all the chunks are rebuilt.
+Compares rebuilding every dirty chunk in the same update with limiting the rebuilds to a budget of milliseconds per frame.
+Chunks are built on the main thread so that the update times include all of the work.
+Run from the project root with: python -m benchmarks.rebatch_budget
+"""
+
+import time
+from scripts.camera import Camera
+from scripts.model_handler import CHUNK_SIZE
+from benchmarks.common import create_scene, populate
+
+
+def settle(scene) -> dict:
+    """
+    Updates the model handler until the rebatch queue is empty.
+    Returns the number of frames, the slowest update, the largest overrun of the budget, and the frame the camera's chunk was rebuilt on.
+    """
+
+    model_handler = scene.model_handler
+    camera_chunk = model_handler.get_camera_chunk()
+    results = {'frames' : 0, 'worst' : 0, 'overrun' : 0, 'camera chunk' : None}
+
+    while True:
+        start = time.perf_counter()
+        model_handler.update()
+        elapsed = time.perf_counter() - start
+
+        results['frames'] += 1
+        results['worst'] = max(results['worst'], elapsed)
+        results['overrun'] = max(results['overrun'], model_handler.rebatch_stats['overrun'])
+        if results['camera chunk'] is None and camera_chunk in model_handler.batches and camera_chunk not in model_handler.rebatch_queue:
+            results['camera chunk'] = results['frames']
+        if not model_handler.rebatch_queue: break
+
+    return results
+
+
+def main(n_models: int=2000, n_chunks: int=9, budgets: tuple=(None, 16, 4)) -> None:
+    scene = create_scene(meshes=('cow', 'sphere'))
+    scene.camera = Camera(scene.engine, position=(n_chunks * CHUNK_SIZE / 2, 20, CHUNK_SIZE * 1.5))
+    model_handler = scene.model_handler
+    model_handler.batch_workers = 0
+    model_handler.instance_threshold = 2 ** 31  # Batch every mesh, which is the slowest to rebuild
+
+    print(f'{n_models} models in {n_chunks} chunks')
+    print(f'{"budget (ms)":>12} {"frames":>7} {"worst update (ms)":>18} {"worst overrun (ms)":>19} {"camera chunk frame":>19}')
+    for budget in budgets:
+        model_handler.clear()
+        model_handler.rebatch_budget = None
+        populate(scene, n_models, n_chunks=n_chunks)
+        model_handler.update()
+
+        # Move every model one chunk along z, which empties every chunk and fills a new row
+        for model in model_handler.models: model.position.z = model.z + CHUNK_SIZE
+        model_handler.rebatch_budget = budget
+
+        results = settle(scene)
+        print(f'{str(budget):>12} {results["frames"]:>7} {results["worst"] * 1000:>18.2f} {results["overrun"]:>19.2f} {results["camera chunk"]:>19}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""
+Measures the time to save and load scenes with increasing numbers of models, and the size of the saved file.
+Compares the old text glTF path, which wrote one indented JSON object per node and added each node as its own model,
+to the current text glTF path and to binary glTF, which stores the nodes as packed arrays.
+Run from the project root with: python -m benchmarks.save_scene
+"""
+
+import os
+import json
+import time
+import tempfile
+import numpy as np
+from scripts.file_manager.save_scene import save_scene, save_buffers, save_images, save_materials
+from scripts.file_manager.load_scene import load_scene, load_assets, load_materials
+from benchmarks.common import create_scene, populate
+
+
+def legacy_save_scene(scene, path: str) -> None:
+    """
+    The node saving of save_scene before binary files, kept for comparison.
+    It read a node_handler that no longer exists, so it reads the models the same way, one attribute at a time.
+    """
+
+    scene_data = {"asset": {"version": "2.0"}, "scene": 0, "buffers": [], "meshes": [], "images": [], "textures": [], "materials": [], "nodes": [], "scenes": [{}]}
+    buffer_indices = save_buffers(scene, scene_data)
+    image_indices, texture_indices = save_images(scene, scene_data)
+    mtl_indices = save_materials(scene, scene_data, texture_indices)
+
+    mtl_names = list(scene.material_handler.material_ids.keys())
+    for model in scene.model_handler.models:
+        scene_data["nodes"].append({})
+        scene_data["nodes"][-1]["name"] = model.vbo
+
+        scene_data["nodes"][-1]["translation"] = model.position.x, model.position.y, model.position.z
+        scene_data["nodes"][-1]["scale"]       = model.scale.x, model.scale.y, model.scale.z
+        scene_data["nodes"][-1]["rotation"]    = model.rotation.x, model.rotation.y, model.rotation.z
+
+        if model.vbo == "cube": scene_data["nodes"][-1]["mesh"] = "cube"
+        else: scene_data["nodes"][-1]["mesh"] = buffer_indices[model.vbo]
+        scene_data["nodes"][-1]["material"] = mtl_indices[mtl_names[model.material]]
+
+    with open(path, 'w') as file:
+        json.dump(scene_data, file, ensure_ascii=False, indent=4)
+
+
+def legacy_load_scene(scene, path: str) -> None:
+    """
+    The node loading of load_scene before binary files, which added each node with ModelHandler.add
+    """
+
+    with open(path) as file:
+        scene_data = json.load(file)
+
+    load_assets(scene, scene_data)
+    load_materials(scene, scene_data)
+
+    scene.model_handler.clear()
+    for node in scene_data["nodes"]:
+        kwargs = {}
+
+        if "translation" in node: kwargs["position"] = node["translation"]
+        if "rotation" in node: kwargs["rotation"] = node["rotation"]
+        if "scale" in node: kwargs["scale"] = node["scale"]
+
+        if "mesh" in node:
+            if node["mesh"] == "cube": kwargs["vbo"] = "cube"
+            else: kwargs["vbo"] = scene_data["buffers"][node["mesh"]]["uri"][:-4]
+
+        if "material" in node:
+            kwargs["material"] = scene_data["materials"][node["material"]]["name"]
+        scene.model_handler.add(**kwargs)
+
+
+def get_models(scene) -> tuple:
+    """
+    Returns the object data and vbo names of the scene's models, in order
+    """
+
+    model_handler = scene.model_handler
+    return model_handler.object_data[model_handler.get_slots(model_handler.models)].copy(), [model.vbo for model in model_handler.models]
+
+
+def main(counts: tuple=(1000, 10000, 100000)) -> None:
+    scene = create_scene(meshes=(), textures=True)
+    methods = (('legacy', 'gltf', legacy_save_scene, legacy_load_scene),
+               ('gltf',   'gltf', lambda scene, path: save_scene(scene, abs_file_path=path), lambda scene, path: load_scene(scene, abs_file_path=path)),
+               ('glb',    'glb',  lambda scene, path: save_scene(scene, abs_file_path=path), lambda scene, path: load_scene(scene, abs_file_path=path)))
+
+    with tempfile.TemporaryDirectory() as directory:
+        # Load once so the meshes and textures are imported, and cached, before timing
+        save_scene(scene, abs_file_path=os.path.join(directory, 'empty.glb'))
+        load_scene(scene, abs_file_path=os.path.join(directory, 'empty.glb'))
+
+        print(f'{"models":>7} {"method":>7} {"save (s)":>9} {"load (s)":>9} {"size (MB)":>10}')
+        for count in counts:
+            scene.model_handler.clear()
+            populate(scene, count, n_chunks=8)
+            models = get_models(scene)
+
+            for name, extension, save, load in methods:
+                path = os.path.join(directory, f'{name}.{extension}')
+
+                start = time.perf_counter()
+                save(scene, path)
+                saved = time.perf_counter()
+                load(scene, path)
+                loaded = time.perf_counter()
+
+                # Every method must give back the same models
+                object_data, vbos = get_models(scene)
+                assert np.array_equal(object_data, models[0]) and vbos == models[1]
+
+                print(f'{count:>7} {name:>7} {saved - start:>9.3f} {loaded - saved:>9.3f} {os.path.getsize(path) / 2**20:>10.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,15 @@
+#version 330 core
+
+// Consumes every output of the batch vertex shaders so none of their work is optimized out
+
+layout (location = 0) out vec4 fragColor;
+
+in vec2 uv;
+flat in int materialID;
+in vec3 normal;
+in vec3 position;
+in mat3 TBN;
+
+void main() {
+    fragColor = vec4(normal + position + TBN[0] + TBN[1] + TBN[2], uv.x + float(materialID));
+}
\ No newline at end of file
@@ -0,0 +1,59 @@
+"""
+Flies the camera along a long row of chunks and measures the GPU memory held by chunk buffers and the time spent in ModelHandler.update.
+Compares batching every chunk up front with streaming chunks in range of the camera under a byte budget.
+Run from the project root with: python -m benchmarks.stream_chunks
+"""
+
+import time
+import glm
+from scripts.camera import Camera
+from scripts.model_handler import CHUNK_SIZE
+from benchmarks.common import create_scene, populate
+
+
+def fly(scene, n_chunks: int, steps: int) -> dict:
+    """
+    Moves the camera from the first chunk to the last in steps, updating the model handler at each step.
+    Returns the first update time, the slowest later update time, the peak resident bytes, and the total evictions and rebuilds.
+    """
+
+    model_handler = scene.model_handler
+    results = {'first' : 0, 'worst' : 0, 'peak' : 0, 'evictions' : 0, 'rebuilds' : 0}
+
+    for step in range(steps):
+        scene.camera.position = glm.vec3(step / (steps - 1) * n_chunks * CHUNK_SIZE, 20, 20)
+
+        start = time.perf_counter()
+        model_handler.update()
+        elapsed = time.perf_counter() - start
+
+        if step: results['worst'] = max(results['worst'], elapsed)
+        else: results['first'] = elapsed
+        results['peak'] = max(results['peak'], model_handler.stream_stats['resident_bytes'])
+        results['evictions'] += model_handler.stream_stats['evictions']
+        results['rebuilds']  += model_handler.stream_stats['rebuilds']
+
+    return results
+
+
+def main(n_models: int=4000, n_chunks: int=200, steps: int=100, budget: int=64 * 2**20) -> None:
+    scene = create_scene(meshes=('cow', 'sphere'))
+    scene.camera = Camera(scene.engine, position=(0, 20, 20))
+    model_handler = scene.model_handler
+    model_handler.batch_workers = 0  # Build chunks during the update so their time is included in the update times
+    model_handler.rebatch_budget = None  # Build every chunk that comes in range on the same update
+
+    print(f'{n_models} models in {n_chunks} chunks, {budget / 2**20:.0f} MB budget')
+    print(f'{"mode":>9} {"first (s)":>10} {"worst (ms)":>11} {"peak (MB)":>10} {"evictions":>10} {"rebuilds":>9}')
+    for mode, margin, gpu_budget in (('eager', n_chunks, None), ('streamed', 1, budget)):
+        model_handler.clear()
+        model_handler.stream_margin = margin
+        model_handler.gpu_budget = gpu_budget
+        populate(scene, n_models, n_chunks=n_chunks)
+
+        results = fly(scene, n_chunks, steps)
+        print(f'{mode:>9} {results["first"]:>10.3f} {results["worst"] * 1000:>11.2f} {results["peak"] / 2**20:>10.1f} {results["evictions"]:>10} {results["rebuilds"]:>9}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,217 @@
+"""
+Times the engine's hot paths on synthetic scenes and saves the results as JSON, so that changes can be checked for regressions.
+Each case reports the best time in seconds of several runs. The other benchmarks in this folder compare approaches in more detail.
+Run from the project root with: python -m benchmarks.suite [-o results.json] [--compare baseline.json] [--threshold 0.1] [--only name ...]
+Comparing prints the change of each case against the baseline and exits with status 1 if any case is slower by more than the threshold.
+A benchmark that raises is recorded under failures in the results, the others still run, and the exit status is 1.
+"""
+
+import argparse
+import glob
+import json
+import os
+import platform
+import sys
+import tempfile
+import traceback
+import numpy as np
+import moderngl as mgl
+from scripts.camera import Camera
+from scripts.model_handler import CHUNK_SIZE
+from scripts.render.vbo_handler import ModelVBO
+from scripts.render.texture_handler import TextureHandler
+from scripts.generic.math_functions import get_frustum_planes
+from scripts.file_manager.save_scene import save_scene
+from scripts.file_manager.load_scene import load_scene
+from benchmarks.common import create_scene, populate, timeit
+
+
+def model_scene(n_models: int, n_chunks: int, **kwargs):
+    """
+    Creates a scene with a camera and n_models models across n_chunks chunks. Chunks are built on the main thread without a budget, so they are done when update returns
+    """
+
+    scene = create_scene(**kwargs)
+    scene.camera = Camera(scene.engine, position=(0, 20, 20))
+    scene.model_handler.batch_workers = 0
+    scene.model_handler.rebatch_budget = None
+    populate(scene, n_models, n_chunks=n_chunks)
+    return scene
+
+
+def bench_model_handler(repeat: int) -> dict:
+    """
+    Batching a chunk, and updating after a tenth of the models are moved
+    """
+
+    scene = model_scene(2000, 4)
+    model_handler = scene.model_handler
+    model_handler.update()
+    rng = np.random.default_rng(0)
+    moved = model_handler.models[::10]
+
+    def move():
+        for model, offset in zip(moved, rng.uniform(-5, 5, len(moved)).tolist()): model.position.x = model.x + offset
+        model_handler.update()
+
+    return {'model_handler.batch_chunk' : timeit(lambda: model_handler.batch_chunk((0, 0, 0)), repeat),
+            'model_handler.update'      : timeit(move, repeat)}
+
+
+def bench_visible_chunks(repeat: int) -> dict:
+    """
+    Frustum culling of the chunks in range of the camera
+    """
+
+    scene = model_scene(0, 1, meshes=('sphere',))
+    model_handler = scene.model_handler
+
+    # One model in each chunk of a 9 x 3 x 9 grid around the camera
+    grid = np.stack(np.meshgrid(np.arange(-4, 5), np.arange(-1, 2), np.arange(-4, 5)), axis=-1).reshape(-1, 3)
+    model_handler.add_many((grid + .5) * CHUNK_SIZE, vbo='sphere')
+    model_handler.update()
+
+    planes = get_frustum_planes(scene.camera.m_proj * scene.camera.m_view)
+    return {'model_handler.get_visible_chunks' : timeit(lambda: model_handler.get_visible_chunks(planes), repeat * 20)}
+
+
+def bench_load_models(repeat: int) -> dict:
+    """
+    Parsing each file in the models folder into a ModelVBO, without the mesh cache
+    """
+
+    ctx = create_scene(meshes=()).ctx
+    return {f'model_vbo.{os.path.basename(path)[:-4]}' : timeit(lambda: ModelVBO(ctx, path, cache=None).release(), repeat)
+            for path in sorted(glob.glob('models/*.obj'))}
+
+
+def bench_load_textures(repeat: int) -> dict:
+    """
+    Loading the textures folder into texture arrays, without the texture cache
+    """
+
+    scene = create_scene(meshes=())
+    texture_handler = TextureHandler(scene.engine, scene.vao_handler, cache=None)
+    return {'texture_handler.load_directory' : timeit(texture_handler.load_directory, repeat)}
+
+
+def bench_scene_files(repeat: int) -> dict:
+    """
+    Saving and loading a scene as text and binary glTF
+    """
+
+    scene = create_scene(textures=True)
+    populate(scene, 10000, n_chunks=8)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for extension in ('gltf', 'glb'):
+            path = os.path.join(directory, f'scene.{extension}')
+            results[f'save_scene.{extension}'] = timeit(lambda: save_scene(scene, abs_file_path=path), repeat)
+            results[f'load_scene.{extension}'] = timeit(lambda: load_scene(scene, abs_file_path=path), repeat)
+
+    return results
+
+
+def bench_headless(repeat: int, n_models: int=2000, meshes: tuple=('bunny', 'sphere')) -> dict:
+    """
+    Updating and rendering a scene of n_models models with the headless engine, per frame
+    """
+
+    from headless import HeadlessEngine
+
+    # An empty scene filled with the same synthetic models as the other cases
+    engine = HeadlessEngine(win_size=(640, 360))
+    scene = engine.project.current_scene
+    for mesh in meshes:
+        scene.vao_handler.vbo_handler.vbos[mesh] = ModelVBO(engine.ctx, f'models/{mesh}.obj')
+    for i in range(1, 4): scene.material_handler.add(f'material_{i}')
+    populate(scene, n_models, n_chunks=4)
+    engine.run(5)  # Compile the shaders and batch the chunks
+
+    frames = 30
+    results = {'headless.frame' : timeit(lambda: engine.run(frames), repeat) / frames,
+               'headless.frame_readback' : timeit(lambda: engine.run(frames, lambda index, pixels: None), repeat) / frames}
+    engine.release()
+    return results
+
+
+BENCHMARKS = {'model_handler' : bench_model_handler, 'visible_chunks' : bench_visible_chunks, 'load_models' : bench_load_models,
+              'load_textures' : bench_load_textures, 'scene_files' : bench_scene_files, 'headless' : bench_headless}
+
+
+def get_environment() -> dict:
+    """
+    Describes the machine the results were taken on, as results are only comparable on the same one
+    """
+
+    ctx = create_scene(meshes=()).ctx
+    return {'python' : platform.python_version(), 'numpy' : np.__version__, 'moderngl' : mgl.__version__,
+            'platform' : platform.platform(), 'cpus' : os.cpu_count(), 'renderer' : ctx.info['GL_RENDERER']}
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """
+    Prints the change of each case from the baseline.
+    Returns the names of the cases that are slower than the baseline by more than the threshold, as a fraction.
+    """
+
+    if baseline['environment'] != results['environment']:
+        print('Warning: the baseline was taken in a different environment')
+
+    regressions = []
+    print(f'{"case":>34} {"baseline (ms)":>14} {"current (ms)":>13} {"change":>8}')
+    for name, seconds in results['results'].items():
+        if name not in baseline['results']: continue
+
+        change = seconds / baseline['results'][name] - 1
+        flag = ''
+        if change > threshold:
+            regressions.append(name)
+            flag = 'slower'
+        elif change < -threshold: flag = 'faster'
+
+        print(f'{name:>34} {baseline["results"][name] * 1000:>14.3f} {seconds * 1000:>13.3f} {change:>+8.1%} {flag}')
+
+    return regressions
+
+
+def main(argv: list=None) -> int:
+    parser = argparse.ArgumentParser(description='Times the engine hot paths')
+    parser.add_argument('-o', '--output', help='JSON file to write the results to')
+    parser.add_argument('--compare', help='JSON results to compare against')
+    parser.add_argument('--threshold', type=float, default=0.1, help='Fraction a case can be slower than the baseline before it is a regression')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs of each case. The best is kept')
+    parser.add_argument('--only', nargs='+', choices=list(BENCHMARKS), help='Benchmarks to run')
+    args = parser.parse_args(argv)
+
+    # A benchmark that fails is recorded and the others still run. Results are written after each one, so they are kept if the run is stopped
+    results = {'environment' : get_environment(), 'results' : {}, 'failures' : {}}
+    for name in args.only or BENCHMARKS:
+        try:
+            for case, seconds in BENCHMARKS[name](args.repeat).items():
+                results['results'][case] = seconds
+                print(f'{case:>34} {seconds * 1000:>12.3f} ms')
+        except Exception as error:
+            results['failures'][name] = ''.join(traceback.format_exception_only(error)).strip()
+            print(f'{name:>34} failed: {results["failures"][name]}')
+
+        if args.output:
+            with open(args.output, 'w') as file:
+                json.dump(results, file, indent=4)
+
+    if results['failures']: print(f'{len(results["failures"])} benchmarks failed: {", ".join(results["failures"])}')
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f'{len(regressions)} regressions: {", ".join(regressions)}')
+            return 1
+
+    return 1 if results['failures'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,68 @@
+"""
+Compares the vertex stage cost of the original batch shader, which builds the model matrix and its inverse per vertex,
+with the current one, which reads rotations precomputed on the CPU.
+Renders into a 1x1 framebuffer so that the fragment stage is negligible.
+Run from the project root with: python -m benchmarks.vertex_stage
+"""
+
+import time
+from benchmarks.common import create_scene
+from benchmarks.batch_chunk import legacy_batch_data
+from scripts.render.chunk_batch import BATCH_FORMAT, BATCH_ATTRIBS
+
+LEGACY_FORMAT = '3f 2f 3f 3f 3f 3f 3f 3f 1f'
+
+
+def time_frames(ctx, vao, frames: int) -> float:
+    """
+    Returns the average time in seconds to render the vao, waiting for the GPU to finish each frame
+    """
+
+    vao.render()
+    ctx.finish()
+
+    start = time.perf_counter()
+    for _ in range(frames):
+        vao.render()
+        ctx.finish()
+    return (time.perf_counter() - start) / frames
+
+
+def main(meshes: tuple=('bunny', 'sphere'), n_models: int=200, frames: int=20) -> None:
+    scene = create_scene(meshes=meshes)
+    ctx = scene.ctx
+
+    current_shader = scene.vao_handler.shader_handler.preprocess('batch.vert', ())
+    with open('benchmarks/shaders/batch_euler.vert') as file: legacy_shader = file.read()
+    with open('benchmarks/shaders/vertex_stage.frag') as file: fragment_shader = file.read()
+
+    current_program = ctx.program(vertex_shader=current_shader, fragment_shader=fragment_shader)
+    legacy_program  = ctx.program(vertex_shader=legacy_shader,  fragment_shader=fragment_shader)
+
+    framebuffer = ctx.framebuffer([ctx.renderbuffer((1, 1), components=4)])
+    framebuffer.use()
+
+    print(f'{"mesh":>8} {"verticies":>10} {"legacy (ms)":>12} {"current (ms)":>13} {"speedup":>8}')
+    for mesh in meshes:
+        scene.model_handler.clear()
+        scene.model_handler.add_many([(0, 0, 0)] * n_models, vbo=mesh)
+        models = scene.model_handler.models
+
+        # Expanded by the indices so both shaders run once per triangle corner
+        current_data, index_data, _, _ = scene.model_handler.get_batch_data(models)
+        current_data = current_data[index_data]
+        current_vbo = ctx.buffer(current_data)
+        legacy_vbo  = ctx.buffer(legacy_batch_data(scene.model_handler, models))
+
+        current_vao = ctx.vertex_array(current_program, [(current_vbo, BATCH_FORMAT, *BATCH_ATTRIBS)], skip_errors=True)
+        legacy_vao  = ctx.vertex_array(legacy_program,  [(legacy_vbo,  LEGACY_FORMAT, *BATCH_ATTRIBS)], skip_errors=True)
+
+        legacy  = time_frames(ctx, legacy_vao,  frames)
+        current = time_frames(ctx, current_vao, frames)
+        print(f'{mesh:>8} {len(current_data):>10} {legacy * 1000:>12.2f} {current * 1000:>13.2f} {legacy / current:>7.2f}x')
+
+        for obj in (current_vao, legacy_vao, current_vbo, legacy_vbo): obj.release()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+import os
+import argparse
+import time
+from collections import defaultdict
+import moderngl as mgl
+import pygame as pg
+from scripts.project import Project
+from scripts.camera import ScriptedCamera
+from scripts.render.frame_reader import FrameReader
+from scripts.generic.profiler import profiler
+
+class HeadlessEngine:
+    """
+    Instance of the engine without a window. Renders the current project offscreen with a standalone GL context,
+    so it can run on machines without a display, such as CI or CPU only render boxes.
+    The camera follows a scripted path and frames are read back asynchronously.
+    """
+    def __init__(self, win_size: tuple=(800, 800), backend: str='egl', dt: float=1 / 60, frames_in_flight: int=3, camera_path: list=None, complete_chunks: bool=True, save: str=None) -> None:
+        """
+        Initialize the GL context and project
+        Args:
+            backend: str
+                Backend of the standalone context. 'egl' works without a display, and uses llvmpipe when there is no GPU. None for the platform default
+            dt: float
+                Fixed time step of each frame in seconds, so that runs are repeatable
+            frames_in_flight: int
+                Number of frames being read back at once
+            camera_path: list
+                Keyframes of the camera. See ScriptedCamera. Orbits the origin by default
+            complete_chunks: bool
+                Rebuilds and uploads every dirty chunk before each frame is rendered, so the frames do not depend on how long chunks take to build
+            save: str
+                Name of a save in the saves folder, or the path of a glTF or binary glTF file, to render. The scene is empty if None
+        """
+        # Window size, used as the size of the rendered frames
+        self.win_size = win_size
+        # MGL context
+        self.ctx = mgl.create_standalone_context(backend=backend) if backend else mgl.create_standalone_context()
+        # Basic Gl setup
+        self.ctx.enable(flags=mgl.DEPTH_TEST | mgl.CULL_FACE)
+        # Time variables
+        self.time = 0
+        self.dt = dt
+        # There are no inputs, so no keys are ever pressed
+        self.keys = defaultdict(bool)
+        # Project handler
+        self.project = Project(self, save)
+        # Replace the free cam of each scene with the scripted one
+        self.camera_path = camera_path or ScriptedCamera.orbit()
+        self.complete_chunks = complete_chunks
+        for scene in self.project.scenes.values():
+            scene.camera = ScriptedCamera(self, self.camera_path)
+            if complete_chunks: scene.model_handler.rebatch_budget = None
+        self.project.current_scene.use()
+        # Reads frames back while the next ones render
+        self.frame_reader = FrameReader(self.ctx, self.win_size, frames_in_flight)
+
+    def update(self) -> None:
+        """
+        Advances time by one fixed step and updates the project
+        """
+        self.time += self.dt
+        self.project.update(self.dt)
+        # Wait for the chunks being built on worker threads
+        if self.complete_chunks: self.project.current_scene.model_handler.finish_batches()
+
+    def render(self) -> None:
+        """
+        Renders the current project into the scene framebuffer
+        """
+        self.project.render(display=False)
+
+    def run(self, frames: int, on_frame=None) -> dict:
+        """
+        Updates and renders frames as fast as possible.
+        Returns the number of frames, the total time, and the frames per second.
+        Args:
+            frames: int
+                Number of frames to render
+            on_frame: callable
+                Called with the index and pixels of each frame once it has been read back, in order. Pixels are a (height, width, 4) uint8 array.
+                Frames are not read back if this is None
+        """
+        start = time.perf_counter()
+        for index in range(frames):
+            profiler.new_frame()
+            self.update()
+            self.render()
+            if on_frame:
+                for frame in self.frame_reader.read(self.project.vao_handler.framebuffer, index): on_frame(*frame)
+
+        # Wait for the last frames
+        if on_frame:
+            for frame in self.frame_reader.flush(): on_frame(*frame)
+        else: self.ctx.finish()
+
+        elapsed = time.perf_counter() - start
+        return {'frames' : frames, 'seconds' : elapsed, 'fps' : frames / elapsed if elapsed else 0}
+
+    def release(self) -> None:
+        """
+        Collects all GL garbage in the project
+        """
+        self.frame_reader.release()
+        self.project.release()
+        self.ctx.release()
+
+def save_frame(directory: str, index: int, pixels) -> None:
+    """
+    Saves a frame read back by the headless engine as a png
+    """
+    surface = pg.image.frombuffer(pixels.tobytes(), (pixels.shape[1], pixels.shape[0]), 'RGBA')
+    pg.image.save(surface, os.path.join(directory, f'frame_{index:05}.png'))
+
+if __name__ == '__main__':
+    # Usage: python headless.py [frames] [output directory] [--scene save]
+    parser = argparse.ArgumentParser(description='Renders frames without a window')
+    parser.add_argument('frames', type=int, nargs='?', default=120, help='Number of frames to render')
+    parser.add_argument('directory', nargs='?', help='Folder to save the frames to as pngs. Frames are not read back if not given')
+    parser.add_argument('--scene', help='Name of a save in the saves folder, or the path of a glTF or binary glTF file. Renders an empty scene if not given')
+    args = parser.parse_args()
+    frames, directory = args.frames, args.directory
+    if directory: os.makedirs(directory, exist_ok=True)
+
+    # Creates an engine without a window
+    engine = HeadlessEngine(save=args.scene)
+    # Renders the frames, saving them if there is an output directory
+    stats = engine.run(frames, (lambda index, pixels: save_frame(directory, index, pixels)) if directory else None)
+    print(f"Rendered {stats['frames']} frames in {stats['seconds']:.2f} s ({stats['fps']:.1f} FPS)")
+    engine.release()
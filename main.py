@@ -1,7 +1,10 @@
+import os
 import sys
+import time
 import pygame as pg
 import moderngl as mgl
 from scripts.project import Project
+from scripts.generic.profiler import profiler
 import glm
 import cudart
 
@@ -37,6 +40,7 @@ class Engine:
         # Project handler
         self.project = Project(self)
 
+    @profiler.timed('engine.update')
     def update(self) -> None:
         """
         Updates pygame events and checks for window events
@@ -44,7 +48,8 @@ class Engine:
         # Update time
         self.dt = self.clock.tick() / 1000
         self.time += self.dt
-        pg.display.set_caption(f"FPS: {round(self.clock.get_fps())} | Models: {len(self.project.current_scene.model_handler.models)}")
+        model_handler = self.project.current_scene.model_handler
+        pg.display.set_caption(f"FPS: {round(self.clock.get_fps())} | Models: {len(model_handler.models)} | Chunks: {model_handler.cull_stats['chunks_visible']}/{len(model_handler.batches)} | GPU: {model_handler.stream_stats['resident_bytes'] / 2**20:.1f} MB | Rebatch queue: {model_handler.rebatch_stats['queued']}" + (f" | {profiler.get_summary()}" if profiler.enabled else ""))
         # Pygame events
         self.events = pg.event.get()
         self.keys = pg.key.get_pressed()
@@ -65,6 +70,12 @@ class Engine:
                     # Unlock mouse
                     pg.event.set_grab(False)
                     pg.mouse.set_visible(True)
+                if event.key == pg.K_F3:
+                    # Start or stop profiling
+                    profiler.toggle(self.ctx)
+                if event.key == pg.K_F4:
+                    # Save the profiled frames
+                    self.export_profile()
             if event.type == pg.MOUSEBUTTONUP:
                 # Lock mouse
                 pg.event.set_grab(True)
@@ -83,7 +94,7 @@ class Engine:
         # Render project
         self.project.render()
         # Flip display buffer
-        pg.display.flip()
+        with profiler.section('display.flip'): pg.display.flip()
 
     def start(self) -> None:
         """
@@ -95,6 +106,7 @@ class Engine:
         self.dt = self.clock.tick() / 1000
         # Main loop
         while self.run:
+            profiler.new_frame()
             self.update()
             self.render()
 
@@ -103,6 +115,16 @@ class Engine:
         pg.quit()
         sys.exit()
 
+    def export_profile(self, directory: str='profiles') -> None:
+        """
+        Saves the frames recorded by the profiler as a Chrome trace and a CSV
+        """
+        os.makedirs(directory, exist_ok=True)
+        name = os.path.join(directory, time.strftime('profile_%Y%m%d_%H%M%S'))
+        profiler.export_chrome_trace(f'{name}.json')
+        profiler.export_csv(f'{name}.csv')
+        print(f'Saved profile to {name}.json and {name}.csv')
+
     def release(self) -> None:
         """
         Collects all GL garbage in the project
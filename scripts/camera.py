@@ -123,4 +123,54 @@ class StaticCamera(Camera):
         pass
     
     def move(self):
-        pass
\ No newline at end of file
+        pass
+
+class ScriptedCamera(Camera):
+    """
+    Camera that follows a path of keyframes instead of the keyboard and mouse. Used when there is no window to take input from
+    Args:
+        keyframes: list
+            (time, position, yaw, pitch) tuples sorted by time in seconds. The camera is interpolated between them, and holds the last one once the path ends
+    """
+    def __init__(self, engine, keyframes: list):
+        self.keyframes = [(time, glm.vec3(position), yaw, pitch) for time, position, yaw, pitch in keyframes]
+        self.time = 0
+        super().__init__(engine, *self.keyframes[0][1:])
+
+    def move(self):
+        """
+        Advances along the path by the engine's frame time
+        """
+        self.time += self.engine.dt
+        self.position, self.yaw, self.pitch = self.get_keyframe(self.time)
+
+    def rotate(self):
+        pass  # Rotation is set by move along with the position
+
+    def get_keyframe(self, time: float) -> tuple:
+        """
+        Returns the position, yaw, and pitch at a time along the path
+        """
+        # Find the keyframes on either side of the time
+        for i in range(1, len(self.keyframes)):
+            if self.keyframes[i][0] >= time: break
+        else: return self.keyframes[-1][1:]
+
+        start, end = self.keyframes[i - 1], self.keyframes[i]
+        t = min(max((time - start[0]) / max(end[0] - start[0], 1e-9), 0), 1)
+        return glm.mix(start[1], end[1], t), start[2] + (end[2] - start[2]) * t, start[3] + (end[3] - start[3]) * t
+
+    @staticmethod
+    def orbit(center=(0, 0, 0), radius: float=30, height: float=10, duration: float=10, steps: int=32) -> list:
+        """
+        Returns keyframes circling a point once over duration seconds, looking at the point
+        """
+        keyframes = []
+        for i in range(steps + 1):
+            angle = 2 * glm.pi() * i / steps
+            position = glm.vec3(center) + glm.vec3(glm.cos(angle) * radius, height, glm.sin(angle) * radius)
+            # Yaw and pitch that point the forward vector at the center
+            yaw = glm.degrees(angle) + 180
+            pitch = glm.degrees(glm.atan(-height, radius))
+            keyframes.append((duration * i / steps, position, yaw, pitch))
+        return keyframes
@@ -0,0 +1,92 @@
+import os
+import json
+import hashlib
+import numpy as np
+
+
+class FileCache:
+    """
+    Base for caches that store processed versions of asset files on disk so that files which have not changed are not processed again.
+    Entries are named by a hash of the file contents. An index of path, size, and modification time avoids rehashing unchanged files.
+    """
+
+    # Bump in a subclass when the layout of its entries changes so that old entries are rebuilt
+    version = 1
+
+    def __init__(self, directory: str) -> None:
+        # The folder containing the cached entries and the index
+        self.directory = directory
+        self.index_path = os.path.join(self.directory, 'index.json')
+        # Maps file paths to their size, modification time, and content hash when last seen
+        self.index = None
+
+        # Counts of cache lookups, used for reporting
+        self.hits = 0
+        self.misses = 0
+
+    def load_index(self) -> dict:
+        """
+        Reads the index from disk the first time it is needed
+        """
+
+        if self.index is None:
+            try:
+                with open(self.index_path) as file: self.index = json.load(file)
+            except (FileNotFoundError, ValueError):
+                self.index = {}
+        return self.index
+
+    def save_index(self) -> None:
+        """
+        Writes the index to disk. Written to a temporary file first so an interrupted write does not corrupt it.
+        """
+
+        os.makedirs(self.directory, exist_ok=True)
+        temp_path = f'{self.index_path}.{os.getpid()}.tmp'
+        with open(temp_path, 'w') as file: json.dump(self.index, file, indent=1)
+        os.replace(temp_path, self.index_path)
+
+    def get_key(self, path: str) -> str:
+        """
+        Returns the content hash used to name the cache entry of a file.
+        The file is only read and hashed if its size or modification time changed since it was last seen.
+        Args:
+            path: str
+                Path to the asset file
+        """
+
+        index = self.load_index()
+        stat = os.stat(path)
+        entry = index.get(os.path.abspath(path))
+        if entry and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime_ns:
+            return entry['hash']
+
+        digest = hashlib.blake2b(f'{type(self).__name__} {self.version}'.encode(), digest_size=16)
+        with open(path, 'rb') as file:
+            for block in iter(lambda: file.read(1 << 20), b''): digest.update(block)
+        key = digest.hexdigest()
+
+        index[os.path.abspath(path)] = {'size' : stat.st_size, 'mtime' : stat.st_mtime_ns, 'hash' : key}
+        self.save_index()
+        return key
+
+    @staticmethod
+    def save_array(path: str, array) -> None:
+        """
+        Saves an array as a .npy file. Written to a temporary file first so other processes never read a partial entry.
+        """
+
+        # np.save only adds the extension if it is missing, so keep .npy at the end of the temporary name
+        temp_path = f'{path[:-4]}.{os.getpid()}.tmp.npy'
+        np.save(temp_path, np.ascontiguousarray(array))
+        os.replace(temp_path, path)
+
+    def clear(self) -> None:
+        """
+        Deletes all cached entries and the index
+        """
+
+        if os.path.isdir(self.directory):
+            for file in os.listdir(self.directory):
+                if file.endswith('.npy') or file == 'index.json': os.remove(os.path.join(self.directory, file))
+        self.index = {}
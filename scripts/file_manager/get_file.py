@@ -3,13 +3,13 @@ from tkinter.filedialog import askopenfilename, asksaveasfile
 
 def save_file_selector():
     Tk().withdraw() 
-    file = asksaveasfile(initialfile = "Untitled.gltf", filetypes=[("GLTF files","*.gltf")], initialdir="saves")
+    file = asksaveasfile(initialfile = "Untitled.gltf", filetypes=[("GLTF files","*.gltf"), ("Binary GLTF files","*.glb")], initialdir="saves")
     if not file: return None
-    if not file.name.endswith('.gltf'): return file.name + ".gltf"
+    if not file.name.endswith(('.gltf', '.glb')): return file.name + ".gltf"
     return file.name
 
 def load_file_selector():
     Tk().withdraw() 
-    file = askopenfilename(filetypes=[("GLTF files","*.gltf")], initialdir="saves")
+    file = askopenfilename(filetypes=[("GLTF files","*.gltf *.glb")], initialdir="saves")
     if not file: return None
     return file
\ No newline at end of file
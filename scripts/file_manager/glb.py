@@ -0,0 +1,116 @@
+import json
+import struct
+import numpy as np
+
+
+# Header and chunk identifiers of the binary glTF container
+GLB_MAGIC   = b'glTF'
+GLB_VERSION = 2
+CHUNK_JSON  = b'JSON'
+CHUNK_BIN   = b'BIN\x00'
+
+# glTF accessor component types and element sizes used for node arrays
+COMPONENT_TYPES = {np.dtype('f4') : 5126, np.dtype('u4') : 5125}
+COMPONENT_DTYPES = {code : dtype for dtype, code in COMPONENT_TYPES.items()}
+ELEMENT_TYPES = {1 : 'SCALAR', 2 : 'VEC2', 3 : 'VEC3', 4 : 'VEC4'}
+ELEMENT_SIZES = {name : size for size, name in ELEMENT_TYPES.items()}
+
+
+def is_glb(path: str) -> bool:
+    """
+    Checks the first bytes of a file for the binary glTF magic
+    """
+
+    with open(path, 'rb') as file:
+        return file.read(4) == GLB_MAGIC
+
+
+def write_glb(path: str, scene_data: dict, binary: bytes) -> None:
+    """
+    Writes a binary glTF file with a JSON chunk and a BIN chunk.
+    Both chunks are padded to 4 bytes, the JSON with spaces and the binary with zeros.
+    """
+
+    json_chunk = json.dumps(scene_data, ensure_ascii=False, separators=(',', ':')).encode()
+    json_chunk += b' ' * (-len(json_chunk) % 4)
+    binary = bytes(binary) + b'\x00' * (-len(binary) % 4)
+
+    length = 12 + 8 + len(json_chunk) + (8 + len(binary) if binary else 0)
+    with open(path, 'wb') as file:
+        file.write(struct.pack('<4sII', GLB_MAGIC, GLB_VERSION, length))
+        file.write(struct.pack('<I4s', len(json_chunk), CHUNK_JSON))
+        file.write(json_chunk)
+        if binary:
+            file.write(struct.pack('<I4s', len(binary), CHUNK_BIN))
+            file.write(binary)
+
+
+def read_glb(path: str) -> tuple:
+    """
+    Reads a binary glTF file.
+    Returns the parsed JSON chunk and a memoryview of the BIN chunk, which is empty if the file has none.
+    """
+
+    with open(path, 'rb') as file:
+        data = memoryview(file.read())
+
+    magic, version, length = struct.unpack_from('<4sII', data, 0)
+    if magic != GLB_MAGIC or version != GLB_VERSION: raise ValueError(f'{path} is not a version {GLB_VERSION} binary glTF file')
+
+    scene_data, binary = None, b''
+    offset = 12
+    while offset < length:
+        chunk_length, chunk_type = struct.unpack_from('<I4s', data, offset)
+        chunk = data[offset + 8 : offset + 8 + chunk_length]
+        if chunk_type == CHUNK_JSON: scene_data = json.loads(bytes(chunk))
+        elif chunk_type == CHUNK_BIN: binary = chunk
+        offset += 8 + chunk_length
+
+    if scene_data is None: raise ValueError(f'{path} has no JSON chunk')
+    return scene_data, binary
+
+
+def add_accessor(scene_data: dict, binary: bytearray, array: np.ndarray) -> int:
+    """
+    Appends an array to the binary buffer and adds a buffer view and an accessor for it.
+    The array must be float32 or uint32 with shape (n,) or (n, 2 to 4).
+    Returns the index of the accessor.
+    Args:
+        scene_data: dict
+            The glTF JSON. Buffer 0 must be the binary chunk
+        binary: bytearray
+            Contents of the binary chunk, which the array is appended to
+        array: np.ndarray
+            Data of the accessor
+    """
+
+    array = np.ascontiguousarray(array)
+    elements = 1 if array.ndim == 1 else array.shape[1]
+
+    # Views start on 4 byte boundaries
+    binary.extend(b'\x00' * (-len(binary) % 4))
+    scene_data.setdefault("bufferViews", []).append({"buffer" : 0, "byteOffset" : len(binary), "byteLength" : array.nbytes})
+    binary.extend(array.tobytes())
+    scene_data["buffers"][0]["byteLength"] = len(binary)
+
+    accessor = {"bufferView" : len(scene_data["bufferViews"]) - 1, "componentType" : COMPONENT_TYPES[array.dtype], "count" : len(array), "type" : ELEMENT_TYPES[elements]}
+    scene_data.setdefault("accessors", []).append(accessor)
+    return len(scene_data["accessors"]) - 1
+
+
+def read_accessor(scene_data: dict, binary, index: int) -> np.ndarray:
+    """
+    Returns the data of an accessor as a read only array viewing the binary chunk, without copying.
+    Only tightly packed accessors, as written by add_accessor, are supported.
+    """
+
+    accessor = scene_data["accessors"][index]
+    view = scene_data["bufferViews"][accessor["bufferView"]]
+    if view.get("byteStride"): raise ValueError('Interleaved accessors are not supported')
+
+    dtype = np.dtype(COMPONENT_DTYPES[accessor["componentType"]]).newbyteorder('<')
+    elements = ELEMENT_SIZES[accessor["type"]]
+    offset = view.get("byteOffset", 0) + accessor.get("byteOffset", 0)
+
+    array = np.frombuffer(binary, dtype=dtype, count=accessor["count"] * elements, offset=offset)
+    return array if elements == 1 else array.reshape(-1, elements)
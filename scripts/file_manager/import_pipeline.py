@@ -0,0 +1,83 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from scripts.render.vbo_handler import ModelVBO
+from scripts.render.texture_handler import TextureHandler
+from scripts.file_manager.mesh_cache import MeshCache, mesh_cache
+
+
+def import_assets(scene, meshes: dict, images: list, cache: MeshCache=mesh_cache, max_workers: int=None) -> tuple:
+    """
+    Loads the meshes and textures of a scene in two phases.
+    Model files are parsed, and images decoded and rescaled, in a pool of worker processes.
+    The GL objects are then created on the main thread as each file finishes.
+    Returns the lists of mesh paths and image files that could not be found.
+    Args:
+        meshes: dict
+            Maps VBO names to model file paths
+        images: list
+            Texture files as given to TextureHandler.load_texture
+        cache: MeshCache
+            Cache of processed vertex data. None to always parse the model files
+        max_workers: int
+            Number of worker processes. Defaults to the number of cores. Files are loaded on the main thread if this is 1
+    """
+
+    vbos = scene.vao_handler.vbo_handler.vbos
+    texture_handler = scene.project.texture_handler
+    missing_meshes, missing_images = [], []
+
+    # Jobs for the workers. Keys are (kind, name), values are the function and its arguments
+    jobs = {}
+    for name, path in meshes.items():
+        # Cached meshes are memory mapped, which is faster than sending them back from a worker
+        try: mesh = cache.load(path) if cache else None
+        except FileNotFoundError:
+            missing_meshes.append(path)
+            continue
+        if mesh is not None: vbos[name] = ModelVBO(scene.ctx, path, cache, mesh)
+        else: jobs[('mesh', name)] = (ModelVBO.read_mesh, path, cache)
+
+    for file in images:
+        path, texture_cache = texture_handler.get_path(file), texture_handler.cache
+        # Cached images are memory mapped as well
+        try: image = texture_cache.load(path, texture_handler.sizes) if texture_cache else None
+        except FileNotFoundError:
+            missing_images.append(file)
+            continue
+        if image is not None: texture_handler.create_texture(file, image)
+        else: jobs[('image', file)] = (TextureHandler.read_texture, path, texture_handler.sizes, texture_cache)
+
+    def create(key, result):
+        """
+        Creates the GL object for the result of a job. Textures are added to the texture arrays when they are next generated
+        """
+
+        kind, name = key
+        if kind == 'mesh': vbos[name] = ModelVBO(scene.ctx, jobs[key][1], cache, result)
+        else: texture_handler.create_texture(name, result)
+
+    def report(key):
+        """
+        Records a file that could not be found
+        """
+
+        kind, name = key
+        if kind == 'mesh': missing_meshes.append(jobs[key][1])
+        else: missing_images.append(name)
+
+    max_workers = min(max_workers or os.cpu_count() or 1, len(jobs))
+
+    # A pool costs more to start than it saves with a single worker
+    if max_workers <= 1:
+        for key, (function, *args) in jobs.items():
+            try: create(key, function(*args))
+            except FileNotFoundError: report(key)
+        return missing_meshes, missing_images
+
+    with ProcessPoolExecutor(max_workers) as executor:
+        futures = {executor.submit(function, *args) : key for key, (function, *args) in jobs.items()}
+        for future in as_completed(futures):
+            try: create(futures[future], future.result())
+            except FileNotFoundError: report(futures[future])
+
+    return missing_meshes, missing_images
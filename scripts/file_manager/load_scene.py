@@ -1,43 +1,59 @@
 import json
-from scripts.render.vbo_handler import ModelVBO
+import numpy as np
+from scripts.file_manager.import_pipeline import import_assets
+from scripts.file_manager.glb import is_glb, read_glb, read_accessor
 
 
 def load_scene(scene, local_file_name=None, abs_file_path=None):
-    if local_file_name:
-        with open(f'saves/{local_file_name}.gltf') as file:
-            scene_data = json.load(file)
+    """
+    Loads a glTF scene. Binary glTF (.glb) files are detected by their header.
+    """
+
+    path = f'saves/{local_file_name}.gltf' if local_file_name else abs_file_path
+
+    if is_glb(path):
+        scene_data, binary = read_glb(path)
     else:
-        with open(abs_file_path) as file:
+        with open(path) as file:
             scene_data = json.load(file)
-    
-    vbos = scene.vao_handler.vbo_handler.vbos
-    for buffer in scene_data["buffers"]:
-        obj_file = f"models/{buffer['uri']}"
-        try:
-            vbos[buffer["uri"][:-4]] = ModelVBO(scene.ctx, obj_file)
-        except FileNotFoundError:
-            print(f"Attempted to load {obj_file} for the scene, but it was not in the models folder")
-
-    for image in scene_data["images"]:
-        try:
-            scene.project.texture_handler.load_texture(image['uri'][:-4], '/' + image['uri'])
-        except FileNotFoundError:
-            print(f"Attempted to load {image['uri']} for the scene, but it was not in the textures folder")
-
-    scene.material_handler.materials.clear()
+        binary = b''
+
+    load_assets(scene, scene_data)
+    load_materials(scene, scene_data)
+
+    scene.model_handler.clear()
+    positions, rotations, scales, vbos, materials = load_nodes(scene_data, binary)
+    scene.model_handler.add_many(positions, rotations, scales, vbo=vbos, material=materials)
+
+
+def load_assets(scene, scene_data):
+    # Parse model files and decode images in parallel, then make the buffers and textures
+    # Buffers without a uri hold binary data rather than a model file
+    meshes = {buffer["uri"][:-4] : f"models/{buffer['uri']}" for buffer in scene_data["buffers"] if "uri" in buffer}
+    images = ['/' + image['uri'] for image in scene_data["images"]]
+    missing_meshes, missing_images = import_assets(scene, meshes, images)
+
+    for obj_file in missing_meshes:
+        print(f"Attempted to load {obj_file} for the scene, but it was not in the models folder")
+    for image in missing_images:
+        print(f"Attempted to load {image[1:]} for the scene, but it was not in the textures folder")
+
+
+def load_materials(scene, scene_data):
+    scene.material_handler.clear()
     for mtl in scene_data["materials"]:
         kwargs = {}
         kwargs["name"] = mtl["name"]
         if "pbrMetallicRoughness" in mtl:
-            if "baseColorFactor" in mtl["pbrMetallicRoughness"]: 
+            if "baseColorFactor" in mtl["pbrMetallicRoughness"]:
                 kwargs["color"] = mtl["pbrMetallicRoughness"]["baseColorFactor"][:3]
                 kwargs["alpha"] = mtl["pbrMetallicRoughness"]["baseColorFactor"][3]
-            
+
             if "metallicFactor" in mtl["pbrMetallicRoughness"]:
                 kwargs["specular"] = mtl["pbrMetallicRoughness"]["metallicFactor"]
             if "roughnessFactor" in mtl["pbrMetallicRoughness"]:
                 kwargs["specular_exponent"] = mtl["pbrMetallicRoughness"]["roughnessFactor"]
-            
+
             if "baseColorTexture" in mtl["pbrMetallicRoughness"]:
                 texture = mtl["pbrMetallicRoughness"]["baseColorTexture"]["index"]
                 texture = scene_data["textures"][texture]["sampler"]
@@ -52,23 +68,40 @@ def load_scene(scene, local_file_name=None, abs_file_path=None):
 
         scene.material_handler.add(**kwargs)
 
-    scene.model_handler.models.clear()
-    scene.model_handler.chunks.clear()
-    scene.model_handler.batches.clear()
-    for node in scene_data["nodes"]:
-        kwargs = {}
 
-        if "translation" in node:
-            kwargs["position"] = node["translation"]
-        if "rotation" in node:
-            kwargs["rotation"] = node["rotation"]
-        if "scale" in node:
-            kwargs["scale"] = node["scale"]
+def get_mesh_name(scene_data, mesh) -> str:
+    """
+    Returns the vbo name of a node's mesh reference, which is a buffer index or "cube"
+    """
+
+    if mesh == "cube": return "cube"
+    return scene_data["buffers"][mesh]["uri"][:-4]
+
+
+def load_nodes(scene_data, binary) -> tuple:
+    """
+    Reads the nodes of a scene for ModelHandler.add_many.
+    Returns the positions, rotations, and scales as arrays, and arrays of each node's vbo and material name.
+    Binary files store the nodes as packed accessors listed in extras.nodes, which are read without copying.
+    """
+
+    material_names = np.array([mtl["name"] for mtl in scene_data["materials"]])
+    packed = scene_data.get("extras", {}).get("nodes")
+
+    if packed:
+        vbo_names = np.array([get_mesh_name(scene_data, mesh) for mesh in packed["meshes"]] or [''])
+        return (read_accessor(scene_data, binary, packed["translation"]),
+                read_accessor(scene_data, binary, packed["rotation"]),
+                read_accessor(scene_data, binary, packed["scale"]),
+                vbo_names[read_accessor(scene_data, binary, packed["mesh"])],
+                material_names[read_accessor(scene_data, binary, packed["material"])])
 
-        if "mesh" in node:
-            if node["mesh"] == "cube": kwargs["vbo"] = "cube"
-            else: kwargs["vbo"] = scene_data["buffers"][node["mesh"]]["uri"][:-4]
+    # Nodes of text files, filling in the defaults of ModelHandler.add for missing values
+    nodes = scene_data["nodes"]
+    positions = [node.get("translation", (0, 0, 0)) for node in nodes]
+    rotations = [node.get("rotation", (0, 0, 0)) for node in nodes]
+    scales    = [node.get("scale", (1, 1, 1)) for node in nodes]
+    vbos      = [get_mesh_name(scene_data, node["mesh"]) if "mesh" in node else "cube" for node in nodes]
+    materials = [material_names[node["material"]] if "material" in node else "base" for node in nodes]
 
-        if "material" in node:
-            kwargs["material"] = scene_data["materials"][node["material"]]["name"]
-        scene.model_handler.add(**kwargs)
\ No newline at end of file
+    return positions, rotations, scales, vbos, materials
@@ -0,0 +1,79 @@
+import os
+import numpy as np
+from scripts.file_manager.file_cache import FileCache
+
+
+# Arrays stored for each mesh. Each one is saved as its own .npy file so that it can be memory mapped
+CACHE_ARRAYS = ('vertex_data', 'index_data', 'unique_points', 'mesh_indicies', 'lod_data', 'lod_indices', 'lod_counts')
+
+
+class MeshCache(FileCache):
+    """
+    Stores the processed vertex data of model files on disk so that files which have not changed are not parsed again.
+    """
+
+    # Entries hold the mesh's levels of detail since version 2, and are indexed since version 3
+    version = 3
+
+    def __init__(self, directory: str='cache/meshes') -> None:
+        super().__init__(directory)
+
+    def get_paths(self, key: str) -> dict:
+        """
+        Returns the path of each cached array of an entry
+        """
+
+        return {name : os.path.join(self.directory, f'{key}.{name}.npy') for name in CACHE_ARRAYS}
+
+    def load(self, path: str) -> tuple | None:
+        """
+        Returns the cached arrays of a model file in the order of CACHE_ARRAYS as read only memory maps.
+        Returns None if the file has no valid cache entry.
+        Args:
+            path: str
+                Path to the model file
+        """
+
+        paths = self.get_paths(self.get_key(path))
+        try:
+            arrays = tuple(np.load(paths[name], mmap_mode='r') for name in CACHE_ARRAYS)
+        except (FileNotFoundError, ValueError, OSError):
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return arrays
+
+    def save(self, path: str, vertex_data: np.ndarray, index_data: np.ndarray, unique_points: np.ndarray, mesh_indicies: np.ndarray,
+             lod_data: np.ndarray, lod_indices: np.ndarray, lod_counts: np.ndarray) -> None:
+        """
+        Stores the processed arrays of a model file
+        Args:
+            path: str
+                Path to the model file
+            vertex_data: np.ndarray
+                Unique verticies exactly as they are uploaded to the VBO
+            index_data: np.ndarray
+                Indices of the triangles into vertex_data, exactly as they are uploaded to the IBO
+            unique_points: np.ndarray
+                Unique vertex positions of the mesh
+            mesh_indicies: np.ndarray
+                Index of each triangle corner into unique_points
+            lod_data: np.ndarray
+                Unique verticies of each simplified level of the mesh, stacked
+            lod_indices: np.ndarray
+                Indices of each level into its own verticies, stacked
+            lod_counts: np.ndarray
+                Number of verticies and indices in each level
+        """
+
+        os.makedirs(self.directory, exist_ok=True)
+        paths = self.get_paths(self.get_key(path))
+        arrays = {'vertex_data' : vertex_data, 'index_data' : index_data, 'unique_points' : unique_points, 'mesh_indicies' : mesh_indicies,
+                  'lod_data' : lod_data, 'lod_indices' : lod_indices, 'lod_counts' : lod_counts}
+
+        for name in CACHE_ARRAYS: self.save_array(paths[name], arrays[name])
+
+
+# Cache shared by all ModelVBOs unless another one is given
+mesh_cache = MeshCache()
@@ -1,8 +1,19 @@
 import os
 import json
+import numpy as np
+from scripts.file_manager.glb import write_glb, add_accessor
 
 
-def save_scene(scene, local_file_name=None, abs_file_path=None):
+def save_scene(scene, local_file_name=None, abs_file_path=None, binary=False):
+    """
+    Saves the scene as glTF. Files ending in .glb, or local files saved with binary set, are written as binary glTF.
+    Binary files store the nodes as packed arrays instead of one JSON object per node.
+    """
+
+    if local_file_name: path = f'saves\{local_file_name}.{"glb" if binary else "gltf"}'
+    else: path = abs_file_path
+    binary = path.endswith('.glb')
+
     scene_data = {}
 
     scene_data["asset"] = {"version": "2.0"}
@@ -15,26 +26,30 @@ def save_scene(scene, local_file_name=None, abs_file_path=None):
     scene_data["nodes"] = []
     scene_data["scenes"] = [{}]
 
+    # The first buffer of a binary file is its BIN chunk
+    if binary: scene_data["buffers"].append({"byteLength": 0})
+
     buffer_indices = save_buffers(scene, scene_data)
     image_indices, texture_indices = save_images(scene, scene_data)
     mtl_indices = save_materials(scene, scene_data, texture_indices)
-    save_nodes(scene, scene_data, mtl_indices, buffer_indices)
 
-    if local_file_name:
-        with open(f'saves\{local_file_name}.gltf', 'w') as file:
-            json.dump(scene_data, file, ensure_ascii=False, indent=4)
+    if binary:
+        data = bytearray()
+        save_node_arrays(scene, scene_data, data, mtl_indices, buffer_indices)
+        write_glb(path, scene_data, data)
     else:
-        with open(abs_file_path, 'w') as file:
+        save_nodes(scene, scene_data, mtl_indices, buffer_indices)
+        with open(path, 'w') as file:
             json.dump(scene_data, file, ensure_ascii=False, indent=4)
 
 def save_buffers(scene, scene_data):
     buffer_indices = {}
     buffer_file_path = "models"
 
-    for i, file in enumerate(os.listdir(buffer_file_path)):
+    for file in os.listdir(buffer_file_path):
+        buffer_indices[file[:-4]] = len(scene_data["buffers"])
         scene_data["buffers"].append({})
         scene_data["buffers"][-1]["uri"] = file
-        buffer_indices[file[:-4]] = i
 
     return buffer_indices
 
@@ -96,20 +111,58 @@ def save_materials(scene, scene_data, texture_indices):
     return mtl_indices
 
 
+def get_node_arrays(scene, mtl_indices, buffer_indices) -> tuple:
+    """
+    Gets the data of every model in the scene as arrays.
+    Returns the positions, rotations, and scales, the index of each model's mesh in a list of mesh references,
+    that list, and the index of each model's material in the saved materials.
+    Meshes are referenced by buffer index, or by name for the built in cube.
+    """
+
+    model_handler = scene.model_handler
+    slots = model_handler.get_slots(model_handler.models)
+
+    meshes = ["cube" if vbo == "cube" else buffer_indices[vbo] for vbo in model_handler.vbo_names]
+
+    # Maps the handler's material ids to the index of the saved material
+    material_ids = scene.material_handler.material_ids
+    mtl_lookup = np.zeros(shape=(max(material_ids.values(), default=0) + 1,), dtype='u4')
+    for name, id in material_ids.items(): mtl_lookup[id] = mtl_indices.get(name, 0)
+
+    materials = mtl_lookup[model_handler.materials[slots].astype('i4')]
+    return model_handler.positions[slots], model_handler.rotations[slots], model_handler.scales[slots], model_handler.vbo_ids[slots].astype('u4'), meshes, materials
+
+
 def save_nodes(scene, scene_data, mtl_indices, buffer_indices):
-    mtl_names = list(scene.material_handler.material_ids.keys())
-    for node in scene.node_handler.nodes:
+    positions, rotations, scales, mesh_ids, meshes, materials = get_node_arrays(scene, mtl_indices, buffer_indices)
+    vbo_names = scene.model_handler.vbo_names
+
+    for position, rotation, scale, mesh, material in zip(positions.tolist(), rotations.tolist(), scales.tolist(), mesh_ids.tolist(), materials.tolist()):
         scene_data["nodes"].append({})
-        scene_data["nodes"][-1]["name"] = node.name
+        scene_data["nodes"][-1]["name"] = vbo_names[mesh]
 
-        scene_data["nodes"][-1]["translation"] = node.position.x, node.position.y, node.position.z
-        scene_data["nodes"][-1]["scale"]       = node.scale.x, node.scale.y, node.scale.z
-        scene_data["nodes"][-1]["rotation"]    = node.rotation.x, node.rotation.y, node.rotation.z
+        scene_data["nodes"][-1]["translation"] = position
+        scene_data["nodes"][-1]["scale"]       = scale
+        scene_data["nodes"][-1]["rotation"]    = rotation
 
-        if node.model.vbo == "cube":
-            scene_data["nodes"][-1]["mesh"] = "cube"
-        elif node.model.vbo:
-            scene_data["nodes"][-1]["mesh"] = buffer_indices[node.model.vbo]
-        
-        if node.model.material !=  None:
-            scene_data["nodes"][-1]["material"] = mtl_indices[mtl_names[node.model.material]]
\ No newline at end of file
+        scene_data["nodes"][-1]["mesh"]     = meshes[mesh]
+        scene_data["nodes"][-1]["material"] = material
+
+
+def save_node_arrays(scene, scene_data, data: bytearray, mtl_indices, buffer_indices):
+    """
+    Saves the nodes as packed accessors in the binary chunk. The accessors are listed in extras.nodes.
+    Mesh accessor values index the extras.nodes.meshes list, and material accessor values index the materials.
+    """
+
+    positions, rotations, scales, mesh_ids, meshes, materials = get_node_arrays(scene, mtl_indices, buffer_indices)
+
+    scene_data["extras"] = {"nodes": {
+        "count"       : len(positions),
+        "meshes"      : meshes,
+        "translation" : add_accessor(scene_data, data, positions),
+        "rotation"    : add_accessor(scene_data, data, rotations),
+        "scale"       : add_accessor(scene_data, data, scales),
+        "mesh"        : add_accessor(scene_data, data, mesh_ids),
+        "material"    : add_accessor(scene_data, data, materials)
+    }}
@@ -0,0 +1,51 @@
+import os
+import numpy as np
+from scripts.file_manager.file_cache import FileCache
+
+
+class TextureCache(FileCache):
+    """
+    Stores images on disk already rescaled to their size bucket and flipped, as raw RGB bytes, so that files which have not changed are not decoded again.
+    """
+
+    def __init__(self, directory: str='cache/textures') -> None:
+        super().__init__(directory)
+
+    def get_path(self, key: str, sizes: tuple) -> str:
+        """
+        Returns the path of an entry. The size buckets are part of the name since they decide how the image was rescaled.
+        """
+
+        return os.path.join(self.directory, f'{key}.{"_".join(map(str, sizes))}.npy')
+
+    def load(self, path: str, sizes: tuple) -> np.ndarray | None:
+        """
+        Returns the cached (size, size, 3) RGB data of an image as a read only memory map.
+        Returns None if the file has no valid cache entry.
+        Args:
+            path: str
+                Path to the image file
+            sizes: tuple
+                Size buckets the image is rescaled to
+        """
+
+        try:
+            data = np.load(self.get_path(self.get_key(path), sizes), mmap_mode='r')
+        except (FileNotFoundError, ValueError, OSError):
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return data
+
+    def save(self, path: str, sizes: tuple, data: np.ndarray) -> None:
+        """
+        Stores the rescaled and flipped RGB data of an image
+        """
+
+        os.makedirs(self.directory, exist_ok=True)
+        self.save_array(self.get_path(self.get_key(path), sizes), data)
+
+
+# Cache shared by all TextureHandlers unless another one is given
+texture_cache = TextureCache()
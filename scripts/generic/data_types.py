@@ -1,11 +1,45 @@
-class vec3(list):
-    def __init__(self, iterable, update_func=None):
-        self.update_func = update_func
-        super().__init__(item for item in iterable)
+class vec3:
+    """
+    View of three values in a row of an owner's object_data array.
+    Values are stored first and then the row is flagged in the owner's dirty array, so the owner can process all changes at once.
+    """
+
+    __slots__ = ('owner', 'row', 'offset', 'flag')
+
+    def __init__(self, owner, row: int, offset: int, flag: int):
+        """
+        Args:
+            owner:
+                Object with an object_data array and a dirty array of flags for each row
+            row: int
+                Row of object_data holding the vector
+            offset: int
+                Column of object_data where the vector starts
+            flag: int
+                Bit set in the owner's dirty array when the vector is written
+        """
+
+        self.owner = owner
+        self.row = row
+        self.offset = offset
+        self.flag = flag
+
+    def __getitem__(self, index):
+        values = self.owner.object_data[self.row, self.offset : self.offset + 3][index]
+        return values.tolist()
 
     def __setitem__(self, index, item):
-        if self.update_func: self.update_func()
-        super().__setitem__(index, item)
+        self.owner.object_data[self.row, self.offset : self.offset + 3][index] = item
+        self.owner.dirty[self.row] |= self.flag
+
+    def __iter__(self):
+        return iter(self[:])
+
+    def __len__(self):
+        return 3
+
+    def __repr__(self):
+        return f'vec3({self.x}, {self.y}, {self.z})'
     
     @property
     def x(self):
@@ -25,4 +59,4 @@ class vec3(list):
         self[1] = value
     @z.setter
     def z(self, value):
-        self[2] = value
\ No newline at end of file
+        self[2] = value
@@ -1,4 +1,5 @@
 import glm
+import numpy as np
 from math import sin, cos
 
 # getting support points
@@ -47,6 +48,38 @@ def get_rotation_matrix(rotation) -> glm.mat3x3:
         -sin(rotation[1])            , cos(rotation[1]) * sin(rotation[0])                                       , cos(rotation[1]) * cos(rotation[0])                                       ,
     )
 
+def get_quaternions(rotations:np.ndarray) -> np.ndarray:
+    """gets the (x, y, z, w) quaternions of many euler rotations at once. matches the rotation of get_model_matrix"""
+    rotations = np.asarray(rotations, dtype='f4').reshape(-1, 3)
+    # half angle sines and cosines. each axis is rotated in the negative direction
+    s, c = np.sin(-rotations / 2), np.cos(-rotations / 2)
+    sx, sy, sz = s[:,0], s[:,1], s[:,2]
+    cx, cy, cz = c[:,0], c[:,1], c[:,2]
+    # x rotation * y rotation * z rotation
+    return np.stack([sx * cy * cz + cx * sy * sz,
+                     cx * sy * cz - sx * cy * sz,
+                     cx * cy * sz + sx * sy * cz,
+                     cx * cy * cz - sx * sy * sz], axis=1)
+
 # collision formulas  
 def get_aabb_collision(top_right1, bottom_left1, top_right2, bottom_left2, epsilon:float=1) -> bool:
-    return all(bottom_left1[i] <= top_right2[i] + epsilon and epsilon + top_right1[i] >= bottom_left2[i] for i in range(3))
\ No newline at end of file
+    return all(bottom_left1[i] <= top_right2[i] + epsilon and epsilon + top_right1[i] >= bottom_left2[i] for i in range(3))
+
+# frustum culling
+def get_frustum_planes(m_proj_view) -> np.ndarray:
+    """gets the six normalized planes (a, b, c, d) of a view frustum from a projection * view matrix. normals point inwards"""
+    matrix = np.array(m_proj_view)
+    planes = np.array([matrix[3] + matrix[0], matrix[3] - matrix[0],  # left, right
+                       matrix[3] + matrix[1], matrix[3] - matrix[1],  # bottom, top
+                       matrix[3] + matrix[2], matrix[3] - matrix[2]]) # near, far
+    return planes / np.linalg.norm(planes[:,:3], axis=1)[:,None]
+
+def get_aabbs_in_frustum(planes:np.ndarray, bottom_lefts:np.ndarray, top_rights:np.ndarray) -> np.ndarray:
+    """gets a mask of the aabbs that are at least partly inside the frustum. aabbs are given as (n, 3) arrays of corners"""
+    # corner of each aabb that is furthest along each plane normal
+    corners = np.where(planes[None,:,:3] >= 0, top_rights[:,None,:], bottom_lefts[:,None,:])
+    return np.all(np.einsum('npi,pi->np', corners, planes[:,:3]) + planes[:,3] >= 0, axis=1)
+
+def get_spheres_in_frustum(planes:np.ndarray, centers:np.ndarray, radii:np.ndarray) -> np.ndarray:
+    """gets a mask of the bounding spheres that are at least partly inside the frustum"""
+    return np.all(centers @ planes[:,:3].T + planes[:,3] >= -radii[:,None], axis=1)
@@ -0,0 +1,140 @@
+import numpy as np
+
+# Number of vertices the post transform cache is assumed to hold when ordering triangles
+CACHE_SIZE = 16
+
+
+def index_vertices(vertex_data: np.ndarray) -> tuple:
+    """gets the unique rows of a triangle list and the index of each of its vertices into them.
+    vertices that differ in position, uv, or normal, such as at a hard edge or uv seam, are kept separate.
+    tangents and bitangents are made per triangle by the obj loader, so they are averaged over the triangles sharing a vertex instead"""
+    vertex_data = np.ascontiguousarray(vertex_data, dtype='f4') + np.float32(0)  # -0.0 and 0.0 are the same vertex
+    keys = np.ascontiguousarray(vertex_data[:,:8])
+    rows = keys.view(np.dtype((np.void, keys.dtype.itemsize * keys.shape[1]))).reshape(-1)
+    _, first, inverse = np.unique(rows, return_index=True, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    vertices = vertex_data[first]
+
+    if vertex_data.shape[1] > 8:
+        summed = np.stack([np.bincount(inverse, vertex_data[:,i], minlength=len(first)) for i in range(8, vertex_data.shape[1])], axis=1)
+        normals = vertices[:,5:8].astype('f8')
+        for start in range(0, summed.shape[1], 3):
+            vectors = summed[:,start:start + 3]
+            if start == 0: vectors = vectors - normals * np.sum(normals * vectors, axis=1)[:,None]  # keep the tangent perpendicular to the normal
+            lengths = np.linalg.norm(vectors, axis=1)
+            # tangents that cancel out keep the first triangle's
+            valid = lengths > 1e-6
+            vertices[valid, 8 + start:11 + start] = vectors[valid] / lengths[valid,None]
+
+    return vertices, inverse.astype('u4')
+
+def get_adjacency(triangles: np.ndarray, n_vertices: int) -> tuple:
+    """gets the triangles using each vertex as offsets into a flat array of triangle indices"""
+    corners = triangles.reshape(-1)
+    order = np.argsort(corners, kind='stable')
+    offsets = np.zeros(n_vertices + 1, dtype='i8')
+    np.cumsum(np.bincount(corners, minlength=n_vertices), out=offsets[1:])
+    return offsets, order // 3
+
+def tipsify(triangles: np.ndarray, n_vertices: int, cache_size: int=CACHE_SIZE) -> tuple:
+    """orders triangles for the post transform vertex cache (Sander, Nehab, and Barczak, Fast Triangle Reordering for Vertex Locality and Reduced Overdraw).
+    triangles are emitted as fans around a vertex, and the next vertex is the one still in the cache with the most triangles left.
+    returns the new order of the triangles and the indices in that order where the cache had to start over, which split the mesh into clusters"""
+    offsets, adjacent = get_adjacency(triangles, n_vertices)
+    offsets, adjacent, triangle_list = offsets.tolist(), adjacent.tolist(), triangles.tolist()
+
+    live = np.diff(offsets).tolist()  # triangles not yet emitted using each vertex
+    stamps = [0] * n_vertices  # time each vertex last entered the cache
+    emitted = [False] * len(triangle_list)
+    dead_ends = []  # vertices of emitted triangles, to restart from when a fan has no good next vertex
+    order, clusters = [], [0]
+
+    fan, time, cursor = 0, cache_size + 1, 0
+    while fan >= 0:
+        candidates = []
+        for triangle in adjacent[offsets[fan]:offsets[fan + 1]]:
+            if emitted[triangle]: continue
+            emitted[triangle] = True
+            order.append(triangle)
+            for vertex in triangle_list[triangle]:
+                candidates.append(vertex)
+                dead_ends.append(vertex)
+                live[vertex] -= 1
+                if time - stamps[vertex] > cache_size:
+                    stamps[vertex] = time
+                    time += 1
+
+        # the candidate that will still be in the cache after its remaining triangles are emitted, and has been in it longest
+        fan, best = -1, -1
+        for vertex in candidates:
+            if not live[vertex]: continue
+            priority = time - stamps[vertex] if time - stamps[vertex] + 2 * live[vertex] <= cache_size else 0
+            if priority > best: fan, best = vertex, priority
+
+        if fan >= 0: continue
+
+        # dead end. restart from a recent vertex with triangles left, or the next one in the mesh
+        while dead_ends and fan < 0:
+            vertex = dead_ends.pop()
+            if live[vertex]: fan = vertex
+        while fan < 0 and cursor < n_vertices:
+            if live[cursor]: fan = cursor
+            cursor += 1
+        if fan >= 0 and len(order) < len(triangle_list): clusters.append(len(order))
+
+    return np.array(order, dtype='i8'), np.array(clusters, dtype='i8')
+
+def sort_clusters(points: np.ndarray, triangles: np.ndarray, clusters: np.ndarray) -> np.ndarray:
+    """orders clusters of triangles to reduce overdraw, independent of the view.
+    clusters facing away from the center of the mesh are drawn first, as they are the most likely to cover the rest.
+    returns the new order of the triangles"""
+    p0, p1, p2 = points[triangles[:,0]], points[triangles[:,1]], points[triangles[:,2]]
+    normals = np.cross(p1 - p0, p2 - p0)  # area weighted
+    areas = np.linalg.norm(normals, axis=1)
+    centroids = (p0 + p1 + p2) / 3
+    center = np.sum(centroids * areas[:,None], axis=0) / max(np.sum(areas), 1e-12)
+
+    # area weighted center and normal of each cluster
+    cluster_ids = np.repeat(np.arange(len(clusters)), np.diff(np.r_[clusters, len(triangles)]))
+    cluster_areas = np.maximum(np.bincount(cluster_ids, areas, minlength=len(clusters)), 1e-12)
+    cluster_centers = np.stack([np.bincount(cluster_ids, centroids[:,i] * areas, minlength=len(clusters)) for i in range(3)], axis=1) / cluster_areas[:,None]
+    cluster_normals = np.stack([np.bincount(cluster_ids, normals[:,i], minlength=len(clusters)) for i in range(3)], axis=1)
+
+    facing = np.sum((cluster_centers - center) * cluster_normals, axis=1) / cluster_areas
+    cluster_order = np.argsort(-facing, kind='stable')
+    return np.argsort(np.argsort(cluster_order)[cluster_ids], kind='stable')
+
+def reorder_vertices(vertices: np.ndarray, indices: np.ndarray) -> tuple:
+    """renumbers vertices in the order the indices first use them, so that vertex fetches move through the buffer in order"""
+    _, first = np.unique(indices, return_index=True)
+    order = np.asarray(indices)[np.sort(first)]
+    remap = np.empty(len(vertices), dtype='u4')
+    remap[order] = np.arange(len(order), dtype='u4')
+    return vertices[order], remap[indices]
+
+def optimize_mesh(vertex_data: np.ndarray, cache_size: int=CACHE_SIZE) -> tuple:
+    """turns a triangle list into an indexed mesh ordered for the vertex cache, then for overdraw, then for vertex fetch.
+    returns the unique vertices and the indices of the triangles as a flat uint32 array"""
+    vertices, indices = index_vertices(vertex_data)
+    if not len(indices): return vertices, indices
+
+    triangles = indices.reshape(-1, 3)
+    order, clusters = tipsify(triangles, len(vertices), cache_size)
+    triangles = triangles[order]
+    triangles = triangles[sort_clusters(vertices[:,:3].astype('f8'), triangles, clusters)]
+
+    return reorder_vertices(vertices, triangles.reshape(-1))
+
+def get_acmr(indices: np.ndarray, cache_size: int=CACHE_SIZE) -> float:
+    """gets the average number of vertices shaded per triangle with a first in first out post transform cache of cache_size vertices.
+    3 for a mesh with no reuse, and about 0.5 at best for a regular grid"""
+    if not len(indices): return 0
+    cache, misses = [], 0
+    in_cache = set()
+    for vertex in np.asarray(indices).tolist():
+        if vertex in in_cache: continue
+        misses += 1
+        cache.append(vertex)
+        in_cache.add(vertex)
+        if len(cache) > cache_size: in_cache.discard(cache.pop(0))
+    return misses / (len(indices) / 3)
@@ -0,0 +1,237 @@
+import csv
+import json
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+
+
+class Profiler:
+    """
+    Opt in timing of the engine's subsystems.
+    Records CPU time of named sections, GPU time of render passes, and counters such as draw calls for each frame,
+    and keeps the last frames for an on screen summary and for export as a Chrome trace or CSV.
+    Nothing is recorded while disabled, and sections cost one attribute check.
+    """
+
+    def __init__(self, history: int=300, gpu_latency: int=3) -> None:
+        """
+        Args:
+            history: int
+                Number of frames kept for the summary and exports
+            gpu_latency: int
+                Frames to wait before reading a GPU timer, so that reading it does not stall for the GPU to finish
+        """
+
+        self.enabled = False
+        self.ctx = None
+        self.gpu_latency = gpu_latency
+
+        self.history = deque(maxlen=history)  # Records of the finished frames, oldest first
+        self.frame = None  # Record of the current frame. A dict of its index, start, sections, counters, and GPU times
+        self.frame_index = 0
+        self.start_time = time.perf_counter()
+
+        self.pending_queries = deque()  # (frame, name, query) of the GPU timers not read yet
+        self.query_pool = []  # Timer queries that have been read and can be reused
+
+    def enable(self, ctx=None) -> None:
+        """
+        Starts recording from the next new_frame. GPU passes are only timed if a context is given
+        """
+
+        self.enabled = True
+        self.ctx = ctx
+
+    def disable(self) -> None:
+        """
+        Stops recording. The recorded frames are kept for export
+        """
+
+        self.read_queries(wait=True)
+        self.enabled = False
+        self.frame = None
+
+    def toggle(self, ctx=None) -> None:
+        if self.enabled: self.disable()
+        else: self.enable(ctx)
+
+    def new_frame(self) -> None:
+        """
+        Ends the current frame and starts recording the next. Called once at the start of each engine update
+        """
+
+        if not self.enabled: return
+
+        now = time.perf_counter()
+        if self.frame:
+            self.frame['duration'] = now - self.frame['start']
+            self.history.append(self.frame)
+
+        self.frame_index += 1
+        self.frame = {'index' : self.frame_index, 'start' : now, 'duration' : 0, 'sections' : [], 'counters' : {}, 'gpu' : {}}
+        self.read_queries()
+
+    def section(self, name: str, **args):
+        """
+        Context manager that times a block of CPU work as a section of the current frame.
+        Args:
+            name: str
+                Name of the section. Sections with the same name are added together in the summary
+            args:
+                Extra values saved with the section in the trace, such as the chunk being built
+        """
+
+        if not self.enabled or not self.frame: return nullcontext()
+        return self.record_section(name, args)
+
+    @contextmanager
+    def record_section(self, name: str, args: dict):
+        frame = self.frame
+        start = time.perf_counter()
+        try: yield
+        finally: frame['sections'].append((name, start, time.perf_counter() - start, args))
+
+    def timed(self, name: str):
+        """
+        Decorator that times every call of a function as a section
+        """
+
+        def decorator(function):
+            @wraps(function)
+            def wrapper(*args, **kwargs):
+                if not self.enabled: return function(*args, **kwargs)
+                with self.section(name): return function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def gpu_section(self, name: str):
+        """
+        Context manager that times the GPU work of a render pass with a timer query.
+        The time is read gpu_latency frames later and added to the frame the pass was in. Passes cannot be nested
+        """
+
+        if not self.enabled or not self.ctx or not self.frame: return nullcontext()
+
+        query = self.query_pool.pop() if self.query_pool else self.ctx.query(time=True)
+        self.pending_queries.append((self.frame, name, query))
+        return query
+
+    def count(self, name: str, n: int=1) -> None:
+        """
+        Adds n to a counter of the current frame
+        """
+
+        if not self.enabled or not self.frame: return
+        self.frame['counters'][name] = self.frame['counters'].get(name, 0) + n
+
+    def read_queries(self, wait: bool=False) -> None:
+        """
+        Reads the GPU timers of frames at least gpu_latency frames old, or every timer if wait is set
+        """
+
+        while self.pending_queries:
+            frame, name, query = self.pending_queries[0]
+            if not wait and self.frame_index - frame['index'] < self.gpu_latency: break
+
+            self.pending_queries.popleft()
+            frame['gpu'][name] = frame['gpu'].get(name, 0) + query.elapsed / 1e9
+            self.query_pool.append(query)
+
+    def get_averages(self) -> tuple:
+        """
+        Returns dicts of the average CPU seconds of each section, GPU seconds of each pass, and value of each counter per frame over the kept frames
+        """
+
+        cpu, gpu, counters = {}, {}, {}
+        frames = len(self.history) or 1
+        for frame in self.history:
+            for name, start, duration, args in frame['sections']:
+                cpu[name] = cpu.get(name, 0) + duration / frames
+            for name, duration in frame['gpu'].items():
+                gpu[name] = gpu.get(name, 0) + duration / frames
+            for name, value in frame['counters'].items():
+                counters[name] = counters.get(name, 0) + value / frames
+
+        return cpu, gpu, counters
+
+    def get_summary(self, sections: tuple=None) -> str:
+        """
+        Returns a one line summary of the average milliseconds of each section and pass, and the average counters.
+        Args:
+            sections: tuple
+                Names of the CPU sections to include. All sections if None
+        """
+
+        if not self.history: return 'Profiling...'
+
+        cpu, gpu, counters = self.get_averages()
+        frame = sum(frame['duration'] for frame in self.history) / len(self.history)
+
+        parts = [f'frame {frame * 1000:.1f}']
+        parts += [f'{name} {cpu[name] * 1000:.2f}' for name in (sections or cpu) if name in cpu]
+        parts += [f'gpu {name} {duration * 1000:.2f}' for name, duration in gpu.items()]
+        parts += [f'{name} {value:.0f}' for name, value in counters.items()]
+        return ' | '.join(parts)
+
+    def export_chrome_trace(self, path: str) -> None:
+        """
+        Writes the kept frames as a Chrome trace, which can be opened in chrome://tracing or Perfetto.
+        CPU sections are on one track, GPU passes on another starting at their frame, and counters are counter tracks.
+        """
+
+        self.read_queries(wait=True)
+
+        events = []
+        for frame in self.history:
+            frame_start = (frame['start'] - self.start_time) * 1e6
+            events.append({'name' : 'frame', 'ph' : 'X', 'pid' : 0, 'tid' : 0, 'ts' : frame_start, 'dur' : frame['duration'] * 1e6, 'args' : {'index' : frame['index']}})
+            for name, start, duration, args in frame['sections']:
+                events.append({'name' : name, 'ph' : 'X', 'pid' : 0, 'tid' : 0, 'ts' : (start - self.start_time) * 1e6, 'dur' : duration * 1e6, 'args' : args})
+
+            # GPU passes only have a duration, so they are laid end to end from the start of their frame
+            gpu_start = frame_start
+            for name, duration in frame['gpu'].items():
+                events.append({'name' : name, 'ph' : 'X', 'pid' : 0, 'tid' : 1, 'ts' : gpu_start, 'dur' : duration * 1e6})
+                gpu_start += duration * 1e6
+
+            if frame['counters']:
+                events.append({'name' : 'counters', 'ph' : 'C', 'pid' : 0, 'tid' : 0, 'ts' : frame_start, 'args' : frame['counters']})
+
+        metadata = [{'name' : 'thread_name', 'ph' : 'M', 'pid' : 0, 'tid' : 0, 'args' : {'name' : 'CPU'}},
+                    {'name' : 'thread_name', 'ph' : 'M', 'pid' : 0, 'tid' : 1, 'args' : {'name' : 'GPU'}}]
+
+        with open(path, 'w') as file:
+            json.dump({'traceEvents' : metadata + events, 'displayTimeUnit' : 'ms'}, file)
+
+    def export_csv(self, path: str) -> None:
+        """
+        Writes one row per kept frame with the frame time, the total milliseconds of each section and pass, and each counter
+        """
+
+        self.read_queries(wait=True)
+
+        cpu, gpu, counters = self.get_averages()
+        columns = list(cpu) + [f'gpu {name}' for name in gpu] + list(counters)
+
+        with open(path, 'w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(['frame', 'frame ms'] + [f'{column} ms' if column not in counters else column for column in columns])
+            for frame in self.history:
+                row = dict.fromkeys(columns, 0)
+                for name, start, duration, args in frame['sections']: row[name] += duration * 1000
+                for name, duration in frame['gpu'].items(): row[f'gpu {name}'] += duration * 1000
+                row.update(frame['counters'])
+                writer.writerow([frame['index'], round(frame['duration'] * 1000, 4)] + [round(row[column], 4) for column in columns])
+
+    def clear(self) -> None:
+        """
+        Drops the recorded frames
+        """
+
+        self.read_queries(wait=True)
+        self.history.clear()
+
+
+# Shared profiler that the engine and handlers record to
+profiler = Profiler()
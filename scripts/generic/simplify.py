@@ -0,0 +1,142 @@
+import numpy as np
+
+# Fraction of the full mesh's triangles kept by each level of detail after the first
+LOD_RATIOS = (0.5, 0.25, 0.1)
+# Levels are not made with fewer triangles than this
+MIN_LOD_TRIANGLES = 32
+# Weight of the planes that keep open edges of a mesh in place, relative to the faces
+BOUNDARY_WEIGHT = 10
+
+
+def get_planes(points: np.ndarray, triangles: np.ndarray) -> tuple:
+    """gets the unit normal and plane (a, b, c, d) of each triangle, and twice its area"""
+    p0, p1, p2 = points[triangles[:,0]], points[triangles[:,1]], points[triangles[:,2]]
+    normals = np.cross(p1 - p0, p2 - p0)
+    areas = np.linalg.norm(normals, axis=1)
+    normals /= np.maximum(areas, 1e-12)[:,None]
+    return normals, np.hstack([normals, -np.sum(normals * p0, axis=1)[:,None]]), areas
+
+def get_edges(triangles: np.ndarray) -> tuple:
+    """gets each edge of a triangle list once as a sorted (a, b) pair, with the triangle it first appears in and the number of triangles using it"""
+    edges = np.sort(triangles[:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2), axis=1)
+    edges, first, counts = np.unique(edges, axis=0, return_index=True, return_counts=True)
+    return edges, first // 3, counts
+
+def get_quadrics(points: np.ndarray, triangles: np.ndarray) -> np.ndarray:
+    """gets the error quadric of each point, the sum of the area weighted squared distance to the planes of its triangles.
+    open edges also add a plane through the edge perpendicular to its triangle so the outline of the mesh is kept"""
+    normals, planes, areas = get_planes(points, triangles)
+    face_quadrics = areas[:,None,None] * planes[:,:,None] * planes[:,None,:]
+
+    quadrics = np.zeros(shape=(len(points), 4, 4), dtype='f8')
+    for corner in range(3): np.add.at(quadrics, triangles[:,corner], face_quadrics)
+
+    edges, faces, counts = get_edges(triangles)
+    edges, faces = edges[counts == 1], faces[counts == 1]
+    if len(edges):
+        directions = points[edges[:,1]] - points[edges[:,0]]
+        lengths = np.linalg.norm(directions, axis=1)
+        edge_normals = np.cross(directions, normals[faces])
+        edge_normals /= np.maximum(np.linalg.norm(edge_normals, axis=1), 1e-12)[:,None]
+        edge_planes = np.hstack([edge_normals, -np.sum(edge_normals * points[edges[:,0]], axis=1)[:,None]])
+        edge_quadrics = BOUNDARY_WEIGHT * lengths[:,None,None] ** 2 * edge_planes[:,:,None] * edge_planes[:,None,:]
+        for end in range(2): np.add.at(quadrics, edges[:,end], edge_quadrics)
+
+    return quadrics
+
+def get_collapses(points: np.ndarray, quadrics: np.ndarray, edges: np.ndarray) -> tuple:
+    """gets the cost and position of collapsing each edge to a single point.
+    the position minimizes the summed quadric if it is well conditioned, otherwise the best of the two ends and the midpoint is used"""
+    q = quadrics[edges[:,0]] + quadrics[edges[:,1]]
+    a, b = points[edges[:,0]], points[edges[:,1]]
+    candidates = [a, b, (a + b) / 2]
+
+    # optimal position where the 3x3 part can be inverted
+    solvable = np.abs(np.linalg.det(q[:,:3,:3])) > 1e-10
+    if np.any(solvable):
+        optimal = (a + b) / 2
+        optimal[solvable] = np.linalg.solve(q[solvable,:3,:3], -q[solvable,:3,3:4])[:,:,0]
+        candidates.append(optimal)
+
+    costs = []
+    for position in candidates:
+        homogeneous = np.hstack([position, np.ones(shape=(len(position), 1))])
+        costs.append(np.einsum('ei,eij,ej->e', homogeneous, q, homogeneous))
+    costs = np.array(costs)
+    best = np.argmin(costs, axis=0)
+
+    return costs[best, np.arange(len(edges))], np.array(candidates)[best, np.arange(len(edges))]
+
+def simplify(points: np.ndarray, triangles: np.ndarray, target: int) -> tuple:
+    """reduces a mesh to about target triangles by quadric error edge collapses.
+    many edges that share no points are collapsed per pass so each pass is a few array operations.
+    returns the moved points and, for each remaining triangle, its point indices and the index of the triangle it came from"""
+    points = np.array(points, dtype='f8')
+    quadrics = get_quadrics(points, triangles)
+    face_ids = np.arange(len(triangles))
+
+    while len(triangles) > target:
+        edges, _, _ = get_edges(triangles)
+        costs, positions = get_collapses(points, quadrics, edges)
+
+        # each point picks its cheapest edge, and edges picked by both of their points are collapsed. ranks break ties
+        order = np.argsort(costs, kind='stable')
+        ranks = np.empty_like(order)
+        ranks[order] = np.arange(len(order))
+        best = np.full(len(points), len(edges))
+        for end in range(2): np.minimum.at(best, edges[:,end], ranks)
+        chosen = np.flatnonzero((best[edges[:,0]] == ranks) & (best[edges[:,1]] == ranks))
+
+        # each collapse removes about two triangles, so only collapse the cheapest edges needed to reach the target
+        chosen = chosen[np.argsort(ranks[chosen])][:max((len(triangles) - target) // 2, 1)]
+
+        # drop collapses that would flip a triangle over, then retry with the rest
+        for _ in range(4):
+            remap = np.arange(len(points))
+            remap[edges[chosen,1]] = edges[chosen,0]
+            moved = points.copy()
+            moved[edges[chosen,0]] = positions[chosen]
+
+            new_triangles = remap[triangles]
+            kept = (new_triangles[:,0] != new_triangles[:,1]) & (new_triangles[:,1] != new_triangles[:,2]) & (new_triangles[:,2] != new_triangles[:,0])
+            old_normals = get_planes(points, triangles[kept])[0]
+            new_normals = get_planes(moved, new_triangles[kept])[0]
+            flipped = np.sum(old_normals * new_normals, axis=1) < 0.2
+            if not np.any(flipped): break
+
+            # edges with a point in a flipped triangle
+            bad = np.zeros(len(points), dtype=bool)
+            bad[triangles[kept][flipped].reshape(-1)] = True
+            chosen = chosen[~(bad[edges[chosen,0]] | bad[edges[chosen,1]])]
+        else: chosen = chosen[:0]
+
+        if not len(chosen): break
+
+        quadrics[edges[chosen,0]] += quadrics[edges[chosen,1]]
+        points = moved
+        triangles, face_ids = new_triangles[kept], face_ids[kept]
+
+    return points, triangles, face_ids
+
+def get_lods(vertex_data: np.ndarray, unique_points: np.ndarray, mesh_indicies: np.ndarray, ratios: tuple=LOD_RATIOS) -> tuple:
+    """gets simplified versions of a mesh for each ratio, each made from the one before.
+    vertex_data is the triangle list of the mesh and mesh_indicies the index of each of its vertices into unique_points.
+    the triangles of a level keep the uvs, normals, and tangents of the triangle they came from, with the positions moved.
+    returns the levels' vertex data stacked, and the number of vertices in each level"""
+    triangles = np.asarray(mesh_indicies).reshape(-1, 3)
+    points, face_ids = unique_points, np.arange(len(triangles))
+
+    levels = []
+    for ratio in ratios:
+        target = int(len(mesh_indicies) // 3 * ratio)
+        if target < MIN_LOD_TRIANGLES: break
+
+        points, triangles, level_ids = simplify(points, triangles, target)
+        face_ids = face_ids[level_ids]
+
+        level = np.array(vertex_data[(face_ids * 3)[:,None] + np.arange(3)], dtype='f4')
+        level[:,:,:3] = points[triangles]
+        levels.append(level.reshape(-1, vertex_data.shape[1]))
+
+    if not levels: return np.zeros(shape=(0, vertex_data.shape[1]), dtype='f4'), np.zeros(shape=(0,), dtype='i4')
+    return np.vstack(levels), np.array([len(level) for level in levels], dtype='i4')
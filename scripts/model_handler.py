@@ -1,5 +1,11 @@
+import time
 import numpy as np
-from scripts.model import Model
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from scripts.model import Model, POSITION, MATERIAL, VBO
+from scripts.render.chunk_batch import ChunkBatch, InstanceBatch, INSTANCE_FLOATS, VERTEX_FLOATS, INDEX_DTYPE
+from scripts.generic.profiler import profiler
+from scripts.generic.math_functions import get_frustum_planes, get_aabbs_in_frustum, get_spheres_in_frustum, get_quaternions
 
 CHUNK_SIZE = 40
 
@@ -10,127 +16,776 @@ class ModelHandler:
         self.scene =       scene
         self.ctx   =       scene.ctx
         self.vbos  =       scene.vao_handler.vbo_handler.vbos
-        self.program =     scene.vao_handler.shader_handler.programs['batch']
+        self.shader_handler = scene.vao_handler.shader_handler
         self.texture_ids = scene.project.texture_handler.texture_ids
 
         self.view_distance = 4  # In chunks
+        self.stream_margin = 1  # Chunks this many past the view distance are also batched, so they are ready before they come into view
+        self.gpu_budget = 256 * 2 ** 20  # Bytes of chunk buffers kept for chunks out of range before the least recently used are released. None to keep all
+        self.instance_threshold = 65536  # Meshes whose vertex count x instance count in a chunk reaches this are instanced instead of batched
+        self.cull_models = 64  # Batches with at least this many models are also culled per model. None to disable
+        self.lod_distances = (1.5, 2.5, 3.5)  # Distance in chunks from the camera to a chunk's center past which each simpler level of detail is used. None to always use the full meshes
+        self.lod_hysteresis = 0.25  # Chunks this many chunks either side of a distance keep their level, so chunks on a boundary are not rebuilt every frame
 
         self.models = []  # List containig all models
+        # Model data is stored in arrays indexed by each model's slot. Models are handles to their slot
+        self.object_data = np.zeros(shape=(0, 10), dtype='f4')  # Position, rotation, scale, and material of each slot
+        self.vbo_ids     = np.zeros(shape=(0,), dtype='i4')     # Index of each slot's vbo in vbo_names
+        self.chunk_keys  = np.zeros(shape=(0, 3), dtype='i4')   # Chunk each slot is in
+        self.dirty       = np.zeros(shape=(0,), dtype='u1')     # Flags of the attributes written since the last update
+        self.handles     = []  # The Model using each slot, or None if the slot is free
+        self.free_slots  = []  # Slots of removed models that can be reused
+        self.vbo_names = []  # Name of the vbo of each vbo id
+        self.vbo_radii = np.zeros(shape=(0,), dtype='f4')  # Bounding radius of each vbo id
+        self.resize(1024)
         self.chunks  = {}  # Contain lists with models positioned in a bounding box in space (Spatial partitioning)
-        self.batches = {}  # Contains VBOs for the chunk meshes
-
-        self.updated_chunks = set()  # Chunks that need to have their mesh updated on the next frame
-
+        self.batches = {}  # Contains dicts of each chunk's batches. Keyed by (features, None) for ChunkBatches and (features, vbo) for InstanceBatches
+
+        self.updated_chunks = set()  # Chunks that need to have their mesh rebuilt on the next frame
+        self.rebatch_queue = set()  # Chunks waiting to be rebuilt. Taken visible and nearest first, as many as fit in the budget each frame
+        self.rebatch_budget = 4  # Milliseconds per frame for building and uploading chunk meshes. At least one chunk is handled each frame. None for no limit
+        self.rebatch_stats = {'queued' : 0, 'pending' : 0, 'rebatched' : 0, 'installed' : 0, 'time' : 0, 'overrun' : 0}  # From the last update. Times in milliseconds
+        self.removed_models = set()  # (chunk, model) pairs of models that have left a chunk since the last frame
+        self.batch_scratch = np.empty(shape=(0, VERTEX_FLOATS), dtype='f4')  # Reused buffer for building single model meshes on the main thread
+
+        # Chunk meshes are assembled by a pool of worker threads. The GL buffers are made on the main thread once a job finishes
+        self.batch_workers = 2  # 0 to build chunks on the main thread
+        self.executor = None
+        self.jobs = {}  # Pending job of each chunk. Dicts of the future, the chunk bounds, and the models written since the job was submitted
+        self.buffer_pool = []  # Buffers that worker jobs assemble chunk meshes in, returned once the mesh is uploaded
+
+        self.chunk_lods = {}  # Level of detail each chunk was last batched with
+        self.chunk_bounds = {}  # (bottom left, top right) corners of the space taken up by each chunk's models
+        self.bounds_array = None  # Chunk keys and bounds stacked for culling. Cleared whenever the bounds change
+        self.cull_stats = {'chunks_visible' : 0, 'chunks_culled' : 0, 'models_visible' : 0, 'models_culled' : 0}  # Counts from the last render
+
+        self.resident = OrderedDict()  # Bytes of the buffers of each batched chunk, from least to most recently in range
+        self.resident_bytes = 0  # Total of resident
+        self.stream_center = None  # Camera chunk and range that the chunks in range were last found for
+        self.stream_stats = {'resident_bytes' : 0, 'resident_chunks' : 0, 'pending_chunks' : 0, 'evictions' : 0, 'rebuilds' : 0}  # Evictions and rebuilds are counts from the last update
+
+    @profiler.timed('model_handler.render')
     def render(self) -> None:
         """
-        Renders all the chunk batches in the camera's range
-        Includes some view culling, but not frustum culling. 
+        Renders all the chunk batches in the camera's view frustum.
+        Batches with many models are also culled per model.
         """
         
-        # Gets a rectanglur prism of chunks in the cameras view
-        render_range_x, render_range_y, render_range_z = self.get_render_range()
-
-        # Loop through all chunks in view and render
-        for x in range(*render_range_x):
-            for y in range(*render_range_y):
-                for z in range(*render_range_z):
-                    chunk = (x, y, z)  # Key of the chunk
-                    
-                    if chunk not in self.batches: continue  # Dont render non-existent chunks
+        # Planes of the camera's view frustum
+        planes = get_frustum_planes(self.scene.camera.m_proj * self.scene.camera.m_view)
 
-                    self.batches[chunk][1].render()
+        self.cull_stats['models_visible'] = 0
+        self.cull_stats['models_culled']  = 0
 
+        # Loop through all chunks in view and render
+        for chunk in self.get_visible_chunks(planes):
+            for key, batch in self.batches[chunk].items():
+                if key[1] is None and self.cull_models and len(batch.ranges) >= self.cull_models:
+                    batch.render(self.get_visible_runs(batch, planes))
+                else:
+                    batch.render()
+
+    @profiler.timed('model_handler.update')
     def update(self) -> None:           
         """
-        Batches all the chunks that have been updated since the last frame. 
+        Writes the models that have changed since the last frame into their chunk meshes.
+        Chunks are only rebuilt when they are new, out of space, or need compaction.
+        Rebuilt chunks are assembled in the background and replace the chunk's batches on a later update.
+        Uploading and rebuilding chunks is limited to rebatch_budget milliseconds, visible and nearby chunks first. The rest waits for the next frame.
         """ 
-        # Loop through the set of updated chunk keys and batch the chunk
-        for chunk in self.updated_chunks:
-            self.batch_chunk(chunk)
-
-        # Clears the set of updated chunks so that they are batched unless they are updated again
+        start = time.perf_counter()
+        deadline = None if self.rebatch_budget is None else start + self.rebatch_budget / 1000
+        planes = get_frustum_planes(self.scene.camera.m_proj * self.scene.camera.m_view)
+
+        # Upload the chunks that finished assembling since the last frame
+        self.rebatch_stats['installed'] = 0
+        for chunk in self.prioritize_chunks([chunk for chunk, job in self.jobs.items() if job['future'].done()], planes):
+            if self.rebatch_stats['installed'] and deadline and time.perf_counter() > deadline: break
+            with profiler.section('model_handler.install_chunk', chunk=chunk): self.install_chunk(chunk)
+            self.rebatch_stats['installed'] += 1
+
+        # Chunks with models of materials that gained or lost a texture map are rebuilt with the new shader permutation
+        changed = self.scene.material_handler.changed_features
+        if changed:
+            slots = np.flatnonzero(np.isin(self.materials[:len(self.handles)], list(changed)))
+            self.updated_chunks.update(self.handles[slot].chunk for slot in slots.tolist() if self.handles[slot])
+            changed.clear()
+
+        # Find every model written since the last frame and clear the flags
+        slots = np.flatnonzero(self.dirty[:len(self.handles)])
+        flags = self.dirty[slots]
+        self.dirty[slots] = 0
+
+        # Move models to their new chunks. All chunk keys are computed at once
+        moved = slots[flags & POSITION != 0]
+        chunk_keys = (self.positions[moved] // CHUNK_SIZE).astype('i4')
+        changed = np.flatnonzero(np.any(chunk_keys != self.chunk_keys[moved], axis=1))
+        for slot, prev_chunk, chunk in zip(moved[changed].tolist(), self.chunk_keys[moved[changed]].tolist(), chunk_keys[changed].tolist()):
+            self.move(self.handles[slot], tuple(prev_chunk), tuple(chunk))
+        self.chunk_keys[moved] = chunk_keys
+
+        # Models with a new mesh no longer fit their range, so they are removed from their batch and added again
+        for slot in slots[flags & VBO != 0].tolist():
+            self.removed_models.add((self.handles[slot].chunk, self.handles[slot]))
+
+        # Models given a material that needs another shader permutation move to a batch of that permutation
+        for slot in slots[flags & MATERIAL != 0].tolist():
+            model = self.handles[slot]
+            features = self.get_features(model)
+            if not any(key[0] == features and model in batch.ranges for key, batch in self.batches.get(model.chunk, {}).items()):
+                self.removed_models.add((model.chunk, model))
+
+        # Free the ranges of models that have left their chunk
+        for chunk, model in self.removed_models:
+            if chunk in self.jobs: self.jobs[chunk]['late'].add(model)
+            if chunk not in self.batches: continue
+            for batch in self.batches[chunk].values():
+                batch.remove(model)
+                if batch.needs_compaction(): self.updated_chunks.add(chunk)
+
+        # Rewrite or append each updated model in place
+        for model in [self.handles[slot] for slot in slots.tolist()]:
+            if model.chunk in self.updated_chunks or model.chunk in self.rebatch_queue: continue  # Chunk is being rebuilt anyways
+
+            # A job being assembled has the model's old data, so the model is written again when the job is installed
+            if model.chunk in self.jobs:
+                self.jobs[model.chunk]['late'].add(model)
+                if model.chunk not in self.batches: continue
+
+            if not self.write_model(model): self.updated_chunks.add(model.chunk)
+
+        # Queue the updated chunks, and the chunks that came in range of the camera
+        center = self.get_camera_chunk()
+        self.rebatch_queue.update(self.updated_chunks)
+        self.stream(center)
+        self.update_lods()
+
+        # Clears the sets so that they are only processed again if they are updated again
         self.updated_chunks.clear()
+        self.removed_models.clear()
+
+        # Chunks out of range are released instead, and batched again when the camera comes back
+        for chunk in [chunk for chunk in self.rebatch_queue if not self.in_stream_range(chunk, center)]:
+            self.rebatch_queue.discard(chunk)
+            self.release_chunk(chunk)
+
+        # Rebuild the queued chunks in range of the camera until the budget runs out
+        self.rebatch_stats['rebatched'] = 0
+        for chunk in self.prioritize_chunks(list(self.rebatch_queue), planes):
+            if self.rebatch_stats['rebatched'] and deadline and time.perf_counter() > deadline: break
+            self.rebatch_queue.discard(chunk)
+            with profiler.section('model_handler.batch_chunk', chunk=chunk): self.batch_chunk(chunk)
+            self.rebatch_stats['rebatched'] += 1
+
+        self.evict(center)
+        self.stream_stats['resident_bytes']  = self.resident_bytes
+        self.stream_stats['resident_chunks'] = len(self.resident)
+        self.stream_stats['pending_chunks']  = len(self.jobs)
+
+        elapsed = (time.perf_counter() - start) * 1000
+        self.rebatch_stats['queued']  = len(self.rebatch_queue)
+        self.rebatch_stats['pending'] = len(self.jobs)
+        self.rebatch_stats['time']    = elapsed
+        self.rebatch_stats['overrun'] = 0 if self.rebatch_budget is None else max(elapsed - self.rebatch_budget, 0)
+
+    def prioritize_chunks(self, chunk_keys: list, planes: np.ndarray) -> list:
+        """
+        Sorts chunk keys for rebuilding. Chunks in the view frustum come first, then chunks nearer to the camera.
+        Args:
+            chunk_keys: list
+                Keys of the chunks to sort
+            planes: np.ndarray
+                The frustum planes from get_frustum_planes
+        """
+
+        if len(chunk_keys) < 2: return chunk_keys
+
+        corners = np.array(chunk_keys) * CHUNK_SIZE
+        visible = get_aabbs_in_frustum(planes, corners, corners + CHUNK_SIZE)
+
+        position = self.scene.camera.position
+        distances = np.linalg.norm(corners + CHUNK_SIZE / 2 - (position.x, position.y, position.z), axis=1)
+
+        return [chunk_keys[i] for i in np.lexsort((distances, ~visible)).tolist()]
+
+    def get_chunk_distances(self, chunk_keys: list) -> np.ndarray:
+        """
+        Returns the distance in chunks from the camera to the center of each chunk
+        """
+
+        position = self.scene.camera.position
+        centers = (np.array(chunk_keys, dtype='f4').reshape(-1, 3) + .5) * CHUNK_SIZE
+        return np.linalg.norm(centers - (position.x, position.y, position.z), axis=1) / CHUNK_SIZE
+
+    def select_lods(self, distances: np.ndarray, current: np.ndarray=None) -> np.ndarray:
+        """
+        Returns the level of detail for chunks at each distance.
+        Args:
+            distances: np.ndarray
+                Distances in chunks from get_chunk_distances
+            current: np.ndarray
+                Levels the chunks have now. A chunk only changes level once it is lod_hysteresis past a distance, so it does not switch back and forth at the boundary
+        """
+
+        if not self.lod_distances: return np.zeros(len(distances), dtype='i4')
+        thresholds = np.array(self.lod_distances)
+
+        if current is None: return np.sum(distances[:,None] > thresholds, axis=1).astype('i4')
+
+        # Lowest and highest level the chunk may have with the margin on either side of each distance
+        coarsest = np.sum(distances[:,None] > thresholds - self.lod_hysteresis, axis=1)
+        finest   = np.sum(distances[:,None] > thresholds + self.lod_hysteresis, axis=1)
+        return np.clip(current, finest, coarsest).astype('i4')
+
+    def update_lods(self) -> None:
+        """
+        Queues the batched chunks whose level of detail has changed since they were batched to be rebuilt
+        """
+
+        chunk_keys = [chunk for chunk in self.chunk_lods if chunk not in self.rebatch_queue]
+        if not chunk_keys: return
+
+        current = np.array([self.chunk_lods[chunk] for chunk in chunk_keys])
+        levels = self.select_lods(self.get_chunk_distances(chunk_keys), current)
+        self.rebatch_queue.update(chunk_keys[i] for i in np.flatnonzero(levels != current).tolist())
+
+    def stream(self, center: tuple) -> None:
+        """
+        Queues the chunks that have come in range of the camera to be batched.
+        Chunks in range are only searched for when the camera enters another chunk.
+        Args:
+            center: tuple
+                The chunk the camera is in
+        """
+
+        self.stream_stats['rebuilds'] = 0
+
+        distance = self.view_distance + self.stream_margin
+        if (center, distance) != self.stream_center and self.chunks:
+            self.stream_center = (center, distance)
+
+            keys = list(self.chunks)
+            in_range = np.flatnonzero(np.all(np.abs(np.array(keys) - center) <= distance, axis=1))
+            for chunk in [keys[i] for i in in_range.tolist()]:
+                if chunk in self.resident:
+                    self.resident.move_to_end(chunk)
+                elif chunk not in self.jobs and chunk not in self.rebatch_queue:
+                    self.rebatch_queue.add(chunk)
+                    self.stream_stats['rebuilds'] += 1
+
+    def evict(self, center: tuple) -> None:
+        """
+        Releases the least recently used chunks out of range of the camera while over the GPU budget.
+        Args:
+            center: tuple
+                The chunk the camera is in
+        """
+
+        # Release chunks out of range, least recently used first
+        self.stream_stats['evictions'] = 0
+        if self.gpu_budget is not None and self.resident_bytes > self.gpu_budget:
+            for chunk in list(self.resident):
+                if self.resident_bytes <= self.gpu_budget: break
+                if self.in_stream_range(chunk, center): continue
+                self.release_chunk(chunk)
+                self.stream_stats['evictions'] += 1
+
+    def get_camera_chunk(self) -> tuple:
+        """
+        Returns the key of the chunk the camera is in
+        """
+
+        position = self.scene.camera.position
+        return tuple(int(value // CHUNK_SIZE) for value in (position.x, position.y, position.z))
+
+    def in_stream_range(self, chunk: tuple, center: tuple) -> bool:
+        """
+        Checks if a chunk is within the view distance and stream margin of the center chunk
+        """
+
+        return max(abs(a - b) for a, b in zip(chunk, center)) <= self.view_distance + self.stream_margin
+
+    def release_chunk(self, chunk_key: tuple) -> None:
+        """
+        Releases the batches of a chunk and drops any job assembling new ones. The chunk's models are kept, so it can be batched again
+        """
+
+        if chunk_key in self.jobs: self.jobs.pop(chunk_key)['future'].cancel()
+        self.chunk_lods.pop(chunk_key, None)
+        if chunk_key not in self.batches: return
+
+        for batch in self.batches[chunk_key].values(): batch.release()
+        del self.batches[chunk_key]
+        del self.chunk_bounds[chunk_key]
+        self.bounds_array = None
+        self.resident_bytes -= self.resident.pop(chunk_key)
 
     def batch_chunk(self, chunk_key: tuple) -> None:
         """
         Combines all the verticies of the chunk's models into a single VBO.
         This mesh can render the whole chunk in just on render call.
+        Meshes that would take up too much of the batch are instead drawn with an InstanceBatch.
+        Models are batched separately for each shader permutation their materials need.
+        The meshes are assembled by the worker pool and uploaded by install_chunk. The chunk's current batches are drawn until then.
         Args:
             chunk_key: tuple = (x, y, z)
                 The position of the chunk. Used as the key in the chunks and batches dicts
         """
-        
+
         # Get the chunks from key
-        if chunk_key not in self.chunks: return
+        if chunk_key not in self.chunks:
+            self.release_chunk(chunk_key)
+            return
         chunk = self.chunks[chunk_key]
 
-        # Empty list to contain all vertex data of models in the chunk
-        batch_data = []
+        # If there are no models, delete the chunk
+        if not len(chunk):
+            self.release_chunk(chunk_key)
+            del self.chunks[chunk_key]
+            return
 
-        # Loop through each model in the chunk, adding the model's mesh to batch_data
-        for model in chunk:
-            # Get all needed information from the vbo and the model
-            vertex_data = np.copy(self.vbos[model.vbo].vertex_data)
-            model_data = np.array([*model.position, *model.rotation, *model.scale, model.material])
+        # Meshes are simplified with distance from the camera. Keeps the chunk's level unless it is past the hysteresis margin
+        current = np.array([self.chunk_lods[chunk_key]]) if chunk_key in self.chunk_lods else None
+        lod = int(self.select_lods(self.get_chunk_distances([chunk_key]), current)[0])
 
-            # Create an empty array to hold the model's mesh data
-            object_data = np.zeros(shape=(vertex_data.shape[0], 24), dtype='f4')
+        # The worker only reads copies of the models' data, so the main thread can keep writing to the model arrays
+        groups = self.get_chunk_groups(chunk, lod)
 
-            # Add the vbo and object information to the mesh
-            object_data[:,:14] = vertex_data
-            object_data[:,14:] = model_data
+        # Bounds of the chunk, which may extend past the chunk if models are large or near the edges
+        centers, radii = self.get_model_spheres(chunk)
+        bounds = np.array([np.min(centers - radii[:,None], axis=0), np.max(centers + radii[:,None], axis=0)])
 
-            # Store the mesh
-            batch_data.append(object_data)
+        # A newer job replaces any job already assembling the chunk
+        if chunk_key in self.jobs: self.jobs[chunk_key]['future'].cancel()
 
-        # Combine all meshes into a single array
-        if len(batch_data) > 1: batch_data = np.vstack(batch_data)
-        else: batch_data = np.array(batch_data, dtype='f4')
+        if self.batch_workers:
+            if not self.executor: self.executor = ThreadPoolExecutor(max_workers=self.batch_workers, thread_name_prefix='batch')
+            future = self.executor.submit(self.assemble_chunk, groups)
+        else:
+            future = Future()
+            future.set_result(self.assemble_chunk(groups))
 
-        # If there are no verticies, delete the chunk
-        if len(batch_data) == 0:
-            if chunk_key in self.batches: del self.batches[chunk_key]
-            if chunk_key in self.chunks: del self.chunks[chunk_key]
-            return
+        self.jobs[chunk_key] = {'future' : future, 'bounds' : bounds, 'late' : set(), 'lod' : lod}
+        self.chunk_lods[chunk_key] = lod
+        if not self.batch_workers: self.install_chunk(chunk_key)
 
-        # Release any existing vbo and vaos for the chunk
-        if chunk_key in self.batches:
-            self.batches[chunk_key][0].release()
-            self.batches[chunk_key][1].release()
+    def get_chunk_groups(self, models: list, lod: int=0) -> list:
+        """
+        Groups a chunk's models by the shader features of their materials, then by vbo.
+        Returns a list of (features, vbo, (vertex data, index data), models, object data) with a copy of each group's object data.
+        The mesh data is the vbo's level of detail lod.
+        """
+
+        groups = []
+        for features, feature_models in self.group_features(models).items():
+            for vbo, group in self.group_models(feature_models).items():
+                groups.append((features, vbo, self.vbos[vbo].get_lod(lod), group, self.object_data[self.get_slots(group)]))
+
+        return groups
+
+    def assemble_chunk(self, groups: list) -> list:
+        """
+        Builds the buffer data of a chunk's batches from get_chunk_groups. Only uses NumPy, so it runs on the worker threads.
+        Returns a list of (key, data, ranges, index data, index ranges, pool buffer) for each batch. Instanced batches have no index data of their own.
+        The pool buffer holding a mesh is returned to the pool once it is uploaded.
+        """
+
+        batches = []
+        batched_groups = {}
+
+        # Instance the meshes that are repeated enough, and batch the rest
+        for features, vbo, mesh, models, object_data in groups:
+            if not self.is_instanced(len(mesh[0]), len(models)):
+                if features not in batched_groups: batched_groups[features] = []
+                batched_groups[features].append((mesh, models, object_data))
+                continue
+
+            ranges = {model : (i, 1) for i, model in enumerate(models)}
+            batches.append(((features, vbo), self.pack_instance_data(object_data), ranges, None, None, None))
+
+        # Build the combined vertex and index data of all batched models with the same features
+        for features, feature_groups in batched_groups.items():
+            n_verticies, n_indices = self.get_batch_size(feature_groups)
+            buffer = self.take_buffer(n_verticies)
+            batch_data, index_data, ranges, index_ranges = self.write_batch_data(feature_groups, buffer, np.empty(shape=(n_indices,), dtype=INDEX_DTYPE))
+            batches.append(((features, None), batch_data, ranges, index_data, index_ranges, buffer))
+
+        return batches
+
+    def install_chunk(self, chunk_key: tuple) -> None:
+        """
+        Creates the GL buffers of a finished chunk job and replaces the chunk's batches with them.
+        Models written since the job was submitted are then written again.
+        """
 
-        # Create the vbo and the vao from mesh data
-        vbo = self.ctx.buffer(batch_data)
-        # vao = self.ctx.vertex_array(self.program, [(vbo, '3f 2f 3f 3f 3f 3f 1f', *['in_position', 'in_uv', 'in_normal', 'obj_position', 'obj_rotation', 'obj_scale', 'obj_material'])], skip_errors=True)
-        vao = self.ctx.vertex_array(self.program, [(vbo, '3f 2f 3f 3f 3f 3f 3f 3f 1f', *['in_position', 'in_uv', 'in_normal', 'in_tangent', 'in_bitangent', 'obj_position', 'obj_rotation', 'obj_scale', 'obj_material'])], skip_errors=True)
+        job = self.jobs.pop(chunk_key)
+        results = job['future'].result()
+
+        # Release the chunk's current batches
+        self.release_chunk(chunk_key)
+        self.chunk_lods[chunk_key] = job['lod']
+
+        batches = {}
+        for key, data, ranges, index_data, index_ranges, buffer in results:
+            program = self.shader_handler.get_program('batch', key[0])
+            if key[1] is None: batches[key] = ChunkBatch(self.ctx, program, data, ranges, job['lod'], index_data, index_ranges)
+            else: batches[key] = InstanceBatch(self.ctx, program, self.vbos[key[1]], data, ranges, job['lod'])
+            if buffer is not None: self.give_buffer(buffer)
 
         # Store batched chunk mesh in the batches dict
-        self.batches[chunk_key] = (vbo, vao)
+        self.batches[chunk_key] = batches
+        self.resident[chunk_key] = sum(batch.get_bytes() for batch in batches.values())
+        self.resident_bytes += self.resident[chunk_key]
+        self.chunk_bounds[chunk_key] = job['bounds']
+        self.bounds_array = None
+
+        # Bring the models that changed during the job up to date
+        for model in job['late']:
+            alive = self.handles[model.slot] is model and model.chunk == chunk_key
+            batch = self.get_model_batch(model)[0] if alive else None
+            for other in batches.values():
+                if other is not batch: other.remove(model)
+            if alive and not self.write_model(model): self.updated_chunks.add(chunk_key)
+
+    def finish_batches(self) -> None:
+        """
+        Waits for every chunk job and uploads the results. Used when the next frame must show every chunk, such as before reading it back
+        """
 
-    def get_render_range(self) -> tuple:
+        for chunk in list(self.jobs):
+            self.jobs[chunk]['future'].result()
+            self.install_chunk(chunk)
+
+    def get_model_batch(self, model) -> tuple:
         """
-        Returns a rectangluar prism of chunks that are in the camera's view.
-        Tuple return is in form ((x1, x2), (y1, y2), (z1, z2))
+        Returns the batch of the model's chunk for the model's features and vbo, and whether it is an InstanceBatch.
+        The batch is None if the chunk has none for the model.
         """
-        
-        cam_position = self.scene.camera.position  # glm.vec3(x, y, z)
-        fov = 40  # The range in which a direction will not be culled
 
-        # Default to a cube of chunks around the camera extending view_distance chunks in each direction
-        render_range_x = [int(cam_position.x // CHUNK_SIZE - self.view_distance), int(cam_position.x // CHUNK_SIZE + self.view_distance + 1)]
-        render_range_y = [int(cam_position.y // CHUNK_SIZE - self.view_distance), int(cam_position.y // CHUNK_SIZE + self.view_distance + 1)]
-        render_range_z = [int(cam_position.z // CHUNK_SIZE - self.view_distance), int(cam_position.z // CHUNK_SIZE + self.view_distance + 1)]
+        batches = self.batches.get(model.chunk, {})
+        features = self.get_features(model)
 
-        # Remove chunks that the play is facing away from
-        render_range_x[1] -= self.view_distance * (180 - fov < self.scene.camera.yaw < 180 + fov) - 1
-        render_range_x[0] += self.view_distance * (-fov < self.scene.camera.yaw < fov or self.scene.camera.yaw > 360 - fov) - 1
+        if (features, model.vbo) in batches: return batches[(features, model.vbo)], True
+        return batches.get((features, None)), False
+
+    def write_model(self, model) -> bool:
+        """
+        Rewrites or appends a model in its chunk's batch and grows the chunk bounds to contain it.
+        Returns False if the chunk has no batch for the model or it does not fit, in which case the chunk must be rebuilt.
+        """
+
+        batch, instanced = self.get_model_batch(model)
+        if not batch: return False
+
+        # Instanced meshes only need the model's per object data
+        index_data = None
+        if instanced: model_data, _ = self.get_instance_data([model])
+        else: model_data, index_data, _, _ = self.get_batch_data([model], batch.lod)
+        if not batch.write(model, model_data, index_data): return False
+
+        # Grow the chunk bounds to contain the model
+        centers, radii = self.get_model_spheres([model])
+        bounds = self.chunk_bounds[model.chunk]
+        bounds[0] = np.minimum(bounds[0], centers[0] - radii[0])
+        bounds[1] = np.maximum(bounds[1], centers[0] + radii[0])
+        self.bounds_array = None
+        return True
+
+    def is_instanced(self, n_verticies: int, n_models: int) -> bool:
+        """
+        Determines if n_models of a mesh with n_verticies in the same chunk should be instanced rather than batched
+        """
 
-        render_range_y[0] += self.view_distance * (self.scene.camera.pitch > 25) - 1
-        render_range_y[1] -= self.view_distance * (self.scene.camera.pitch < -25) - 1
+        return n_models > 1 and n_verticies * n_models >= self.instance_threshold
+
+    def group_models(self, models: list) -> dict:
+        """
+        Groups a list of models by their vbo
+        """
+
+        groups = {}
+        for model in models:
+            if model.vbo not in groups: groups[model.vbo] = []
+            groups[model.vbo].append(model)
+
+        return groups
+
+    def group_features(self, models: list) -> dict:
+        """
+        Groups a list of models by the shader feature keys of their materials
+        """
+
+        ids, inverse = np.unique(self.materials[self.get_slots(models)].astype('i4'), return_inverse=True)
+        features = [self.scene.material_handler.get_features(id) for id in ids.tolist()]
+
+        groups = {}
+        for model, i in zip(models, inverse.tolist()):
+            if features[i] not in groups: groups[features[i]] = []
+            groups[features[i]].append(model)
+
+        return groups
+
+    def get_features(self, model) -> tuple:
+        """
+        Returns the shader feature keys of a model's material
+        """
+
+        return self.scene.material_handler.get_features(model.material)
+
+    def get_instance_data(self, models: list) -> tuple:
+        """
+        Gets the per object data (position, rotation, scale, material) of each model.
+        Returns the data and a dict mapping each model to its (offset, count) in rows.
+        """
+
+        instance_data = self.pack_instance_data(self.object_data[self.get_slots(models)])
+        ranges = {model : (i, 1) for i, model in enumerate(models)}
+
+        return instance_data, ranges
+
+    @staticmethod
+    def pack_instance_data(object_data: np.ndarray) -> np.ndarray:
+        """
+        Converts rows of object data to the instance layout.
+        Rotations are converted to quaternions for all rows at once so the shader does not need to build matrices per vertex.
+        """
+
+        instance_data = np.empty(shape=(len(object_data), INSTANCE_FLOATS), dtype='f4')
+        instance_data[:,0:3]  = object_data[:,0:3]
+        instance_data[:,3:7]  = get_quaternions(object_data[:,3:6])
+        instance_data[:,7:11] = object_data[:,6:10]
+
+        return instance_data
+
+    def get_batch_data(self, models: list, lod: int=0) -> tuple:
+        """
+        Builds the vertex and index data for a list of models in a single preallocated array.
+        Models are grouped by vbo so that each mesh is written with one broadcast per group.
+        Returns the vertex data, the index data, and dicts mapping each model to its (offset, count) in verticies and its (first, count) in indices.
+        The returned vertex array is a view of a scratch buffer that is reused between calls,
+        so it is only valid until the next call. Only for use on the main thread.
+        Args:
+            models: list
+                The models whose meshes will be combined
+            lod: int
+                Level of detail of the meshes
+        """
 
-        render_range_z[1] -= self.view_distance * (270 - fov < self.scene.camera.yaw < 270 + fov) - 1
-        render_range_z[0] += self.view_distance * (90 - fov < self.scene.camera.yaw < 90 + fov) - 1
+        # Group the models by their mesh
+        groups = [(self.vbos[vbo].get_lod(lod), group, self.object_data[self.get_slots(group)]) for vbo, group in self.group_models(models).items()]
 
-        return (render_range_x, render_range_y, render_range_z)
+        n_verticies, n_indices = self.get_batch_size(groups)
+        return self.write_batch_data(groups, self.get_scratch_buffer(n_verticies), np.empty(shape=(n_indices,), dtype=INDEX_DTYPE))
+
+    @staticmethod
+    def get_batch_size(groups: list) -> tuple:
+        """
+        Returns the number of verticies and indices in a list of ((vertex data, index data), models, object data) groups
+        """
+
+        n_verticies = sum(len(mesh[0]) * len(models) for mesh, models, _ in groups)
+        n_indices   = sum(len(mesh[1]) * len(models) for mesh, models, _ in groups)
+        return n_verticies, n_indices
+
+    @staticmethod
+    def write_batch_data(groups: list, batch_data: np.ndarray, index_data: np.ndarray) -> tuple:
+        """
+        Writes each ((vertex data, index data), models, object data) group into its section of buffers large enough for all of them.
+        The indices of each model are offset to the rows its verticies are written to, so the batch is drawn with one index buffer.
+        Returns views of the used parts of the buffers and dicts mapping each model to its (offset, count) in verticies and its (first, count) in indices.
+        """
+
+        offset, first = 0, 0
+        ranges, index_ranges = {}, {}
+        for (vertex_data, mesh_indices), models, object_data in groups:
+            n_verticies, n_attributes = vertex_data.shape
+            n_indices = len(mesh_indices)
+            n_models = len(models)
+
+            # Per object data (position, rotation, scale, material) for each model in the group
+            model_data = ModelHandler.pack_instance_data(object_data)
+
+            # View the group's section as (model, vertex, attribute) so both parts can be broadcast
+            section = batch_data[offset : offset + n_verticies * n_models].reshape(n_models, n_verticies, VERTEX_FLOATS)
+            section[:, :, :n_attributes] = vertex_data
+            section[:, :, n_attributes:14] = 0  # Meshes without tangents
+            section[:, :, 14:] = model_data[:, None, :]
+
+            # Each model's copy of the indices starts at the first row of its verticies
+            bases = offset + np.arange(n_models, dtype=INDEX_DTYPE) * n_verticies
+            index_data[first : first + n_indices * n_models].reshape(n_models, n_indices)[:] = mesh_indices[None, :] + bases[:, None]
+
+            for i, model in enumerate(models):
+                ranges[model] = (offset + i * n_verticies, n_verticies)
+                index_ranges[model] = (first + i * n_indices, n_indices)
+
+            offset += n_verticies * n_models
+            first  += n_indices * n_models
+
+        return batch_data[:offset], index_data[:first], ranges, index_ranges
+
+    def get_scratch_buffer(self, size: int) -> np.ndarray:
+        """
+        Returns the scratch buffer used for building batches on the main thread, growing it if it cannot hold size verticies.
+        """
+
+        if len(self.batch_scratch) < size:
+            self.batch_scratch = np.empty(shape=(max(size, 2 * len(self.batch_scratch)), VERTEX_FLOATS), dtype='f4')
+
+        return self.batch_scratch
+
+    def take_buffer(self, size: int) -> np.ndarray:
+        """
+        Takes a buffer that can hold size verticies from the pool for a worker job, making a new one if none is large enough.
+        Each job has its own buffer, so a finished mesh is not overwritten by another job before it is uploaded.
+        """
+
+        try: buffer = self.buffer_pool.pop()
+        except IndexError: buffer = np.empty(shape=(0, VERTEX_FLOATS), dtype='f4')
+
+        if len(buffer) < size:
+            buffer = np.empty(shape=(max(size, 2 * len(buffer)), VERTEX_FLOATS), dtype='f4')
+
+        return buffer
+
+    def give_buffer(self, buffer: np.ndarray) -> None:
+        """
+        Returns an uploaded job's buffer to the pool. Only as many buffers as there are workers are kept
+        """
+
+        if len(self.buffer_pool) < max(self.batch_workers, 1): self.buffer_pool.append(buffer)
+
+    def get_model_spheres(self, models: list) -> tuple:
+        """
+        Gets the bounding sphere of each model.
+        Returns an array of centers and an array of radii.
+        """
+
+        slots = self.get_slots(models)
+        radii = self.vbo_radii[self.vbo_ids[slots]] * np.max(np.abs(self.scales[slots]), axis=1)
+
+        return self.positions[slots], radii
+
+    def get_visible_chunks(self, planes: np.ndarray) -> list:
+        """
+        Returns the keys of the chunks within view distance whose bounds intersect the view frustum.
+        All chunks are tested at once.
+        Args:
+            planes: np.ndarray
+                The frustum planes from get_frustum_planes
+        """
+
+        if not self.batches: return []
+
+        # Stack the chunk keys and bounds. Only redone when the bounds have changed
+        if self.bounds_array is None:
+            keys = list(self.batches)
+            self.bounds_array = (keys, np.array(keys), np.array([self.chunk_bounds[key] for key in keys]))
+        keys, key_array, bounds = self.bounds_array
+
+        # Chunks within the view distance of the camera's chunk
+        cam_position = self.scene.camera.position
+        cam_chunk = np.array([cam_position.x, cam_position.y, cam_position.z]) // CHUNK_SIZE
+        in_range = np.all(np.abs(key_array - cam_chunk) <= self.view_distance, axis=1)
+
+        # Chunks in the view frustum
+        visible = np.flatnonzero(in_range & get_aabbs_in_frustum(planes, bounds[:,0], bounds[:,1]))
+
+        self.cull_stats['chunks_visible'] = len(visible)
+        self.cull_stats['chunks_culled']  = len(keys) - len(visible)
+
+        return [keys[i] for i in visible]
+
+    def get_visible_runs(self, batch: ChunkBatch, planes: np.ndarray) -> list:
+        """
+        Culls the models of a batch individually.
+        Returns (first, count) runs of indices covering the visible models, merging models that are next to each other in the index buffer.
+        """
+
+        # Arrays of the index ranges and bounds of the batch's models, sorted by first index. Only redone when the batch has changed
+        if batch.cull_data is None:
+            models = list(batch.index_ranges)
+            ranges = np.array([batch.index_ranges[model] for model in models]).reshape(-1, 2)
+            centers, radii = self.get_model_spheres(models)
+            order = np.argsort(ranges[:,0])
+            batch.cull_data = (ranges[order], centers[order], radii[order])
+        ranges, centers, radii = batch.cull_data
+
+        visible = get_spheres_in_frustum(planes, centers, radii)
+        ranges = ranges[visible]
+
+        self.cull_stats['models_visible'] += len(ranges)
+        self.cull_stats['models_culled']  += len(visible) - len(ranges)
+
+        if not len(ranges): return []
+
+        # A new run starts wherever a range does not begin at the end of the previous one
+        ends = ranges[:,0] + ranges[:,1]
+        starts = np.flatnonzero(np.r_[True, ranges[1:,0] != ends[:-1]])
+        lasts  = np.r_[starts[1:], len(ranges)] - 1
+
+        return list(zip(ranges[starts,0].tolist(), (ends[lasts] - ranges[starts,0]).tolist()))
+
+    def resize(self, capacity: int) -> None:
+        """
+        Grows the model arrays to hold capacity models.
+        """
+
+        size = len(self.handles)
+
+        object_data = np.zeros(shape=(capacity, 10), dtype='f4')
+        object_data[:size] = self.object_data[:size]
+        self.object_data = object_data
+        vbo_ids = np.zeros(shape=(capacity,), dtype='i4')
+        vbo_ids[:size] = self.vbo_ids[:size]
+        self.vbo_ids = vbo_ids
+        chunk_keys = np.zeros(shape=(capacity, 3), dtype='i4')
+        chunk_keys[:size] = self.chunk_keys[:size]
+        self.chunk_keys = chunk_keys
+        dirty = np.zeros(shape=(capacity,), dtype='u1')
+        dirty[:size] = self.dirty[:size]
+        self.dirty = dirty
+
+        # Views of the object data for each attribute
+        self.positions = self.object_data[:,0:3]
+        self.rotations = self.object_data[:,3:6]
+        self.scales    = self.object_data[:,6:9]
+        self.materials = self.object_data[:,9]
+
+    def get_slots(self, models: list) -> np.ndarray:
+        """
+        Returns an array of the slots of the given models
+        """
+
+        return np.fromiter((model.slot for model in models), dtype='i4', count=len(models))
+
+    def get_vbo_id(self, vbo: str) -> int:
+        """
+        Gets the id of a vbo, assigning a new id the first time a vbo is used
+        """
+
+        if vbo not in self.vbo_names:
+            self.vbo_names.append(vbo)
+            self.vbo_radii = np.append(self.vbo_radii, np.float32(self.vbos[vbo].radius))
+
+        return self.vbo_names.index(vbo)
+
+    def allocate_slots(self, n: int) -> np.ndarray:
+        """
+        Returns n free slots. Slots of removed models are reused first.
+        """
+
+        # Reuse free slots
+        reused = self.free_slots[len(self.free_slots) - min(n, len(self.free_slots)):]
+        del self.free_slots[len(self.free_slots) - len(reused):]
+
+        # Add new slots to the end of the arrays
+        start = len(self.handles)
+        new = n - len(reused)
+        if start + new > len(self.object_data): self.resize(max(start + new, 2 * len(self.object_data)))
+        self.handles.extend([None] * new)
+
+        return np.array(reused + list(range(start, start + new)), dtype='i4')
 
     def add(self, vbo: str="cube", material: str="base", position: tuple=(0, 0, 0), rotation: tuple=(0, 0, 0), scale: tuple=(1, 1, 1)) -> Model:
         """
@@ -139,8 +794,8 @@ class ModelHandler:
         Args:
             vbo: str="cube":
                 The key of the vbo that the model will have. This is the model's model
-            texture: str="box":
-                Name of the models texture. Will be name of texture file (w/o extension)
+            material: str="base":
+                Name of the model's material
             position: tuple=(x, y, z):
                 Initial position of the model
             rotation: tuple=(x-axis, y-axis, z-axis):
@@ -149,23 +804,88 @@ class ModelHandler:
                 The length of the model in each direction
         """
 
+        # Write the model's data to a free slot
+        slot = int(self.allocate_slots(1)[0])
+        self.object_data[slot] = (*position, *rotation, *scale, self.scene.material_handler.material_ids[material])
+        self.vbo_ids[slot] = self.get_vbo_id(vbo)
+        self.chunk_keys[slot] = self.positions[slot] // CHUNK_SIZE
+
+        # Create a new model handle to the slot
+        new_model = Model(self, slot)
+        self.handles[slot] = new_model
+
         # The key of the chunk the model will be added to
-        chunk = (position[0] // CHUNK_SIZE, position[1] // CHUNK_SIZE, position[2] // CHUNK_SIZE)
+        chunk = new_model.chunk
 
         # Create empty list if the chunk does not already exist
         if chunk not in self.chunks:
             self.chunks[chunk] = []
 
-        # Create a new model from the given parameters
-        new_model = Model(self, vbo, material, position, rotation, scale)
-
         # Add the model to the models list and to its correct chunk list
         self.models.append(new_model)
         self.chunks[chunk].append(new_model)
-        self.updated_chunks.add(chunk)
+        self.dirty[slot] = POSITION
 
         return new_model
 
+    def add_many(self, positions, rotations=None, scales=None, vbo="cube", material="base") -> list:
+        """
+        Adds many models to the scene at once. Chunks are computed for all models together and each chunk is only marked once.
+        Returns a list of the model instances.
+        Args:
+            positions: array like (n, 3)
+                Position of each model
+            rotations: array like (n, 3)=None
+                Rotation of each model on each axis in radians. Defaults to no rotation
+            scales: array like (n, 3)=None
+                Scale of each model. Defaults to (1, 1, 1)
+            vbo: str | list="cube"
+                The key of the vbo of all models, or a list with a key for each model
+            material: str | list="base"
+                Name of the material of all models, or a list with a name for each model
+        """
+
+        positions = np.asarray(positions, dtype='f4').reshape(-1, 3)
+        n = len(positions)
+        if not n: return []
+
+        slots = self.allocate_slots(n)
+
+        # Write all model data to the slots
+        self.positions[slots] = positions
+        self.rotations[slots] = 0 if rotations is None else np.asarray(rotations, dtype='f4').reshape(-1, 3)
+        self.scales[slots]    = 1 if scales    is None else np.asarray(scales,    dtype='f4').reshape(-1, 3)
+
+        material_ids = self.scene.material_handler.material_ids
+        if isinstance(material, str): self.materials[slots] = material_ids[material]
+        else:
+            names, inverse = np.unique(np.asarray(material), return_inverse=True)
+            self.materials[slots] = np.array([material_ids[name] for name in names], dtype='f4')[inverse]
+
+        if isinstance(vbo, str): self.vbo_ids[slots] = self.get_vbo_id(vbo)
+        else:
+            names, inverse = np.unique(np.asarray(vbo), return_inverse=True)
+            self.vbo_ids[slots] = np.array([self.get_vbo_id(name) for name in names], dtype='i4')[inverse]
+
+        keys = positions // CHUNK_SIZE
+        self.chunk_keys[slots] = keys
+
+        # Create handles
+        new_models = [Model(self, slot) for slot in slots.tolist()]
+        for slot, model in zip(slots.tolist(), new_models): self.handles[slot] = model
+        self.models.extend(new_models)
+
+        # Add the models to their chunks, grouped by chunk key
+        order, starts = self.group_chunk_keys(self.chunk_keys[slots])
+        order, starts = order.tolist(), starts.tolist()
+        for start, end in zip(starts, starts[1:] + [n]):
+            chunk = new_models[order[start]].chunk
+            if chunk not in self.chunks: self.chunks[chunk] = []
+            self.chunks[chunk].extend([new_models[i] for i in order[start:end]])
+            self.updated_chunks.add(chunk)
+
+        return new_models
+
     def remove(self, model) -> None:
         """
         Removes an model from the scene
@@ -175,6 +895,92 @@ class ModelHandler:
         self.models.remove(model)
         if model in self.chunks[chunk]: self.chunks[chunk].remove(model)
 
-        self.updated_chunks.add(chunk)
+        self.removed_models.add((chunk, model))
+        if not len(self.chunks[chunk]): self.updated_chunks.add(chunk)
+
+        self.free(model)
+
+    def remove_many(self, models: list) -> None:
+        """
+        Removes many models from the scene at once. Each affected chunk is only marked once.
+        """
+
+        models = set(models)
+        if not models: return
+        slots = self.get_slots(models)
+
+        # Remove the models from each of their chunks, which will be rebuilt
+        order, starts = self.group_chunk_keys(self.chunk_keys[slots])
+        for chunk in map(tuple, self.chunk_keys[slots[order[starts]]].tolist()):
+            self.chunks[chunk] = [model for model in self.chunks[chunk] if model not in models]
+            self.updated_chunks.add(chunk)
+
+        self.models = [model for model in self.models if model not in models]
+
+        for model in models: self.free(model)
+
+    def group_chunk_keys(self, chunk_keys: np.ndarray) -> tuple:
+        """
+        Groups an array of chunk keys.
+        Returns the order that sorts the keys into groups and the index in that order where each group starts.
+        """
+
+        # Pack each key into a single integer so that they can be sorted in one pass
+        packed = chunk_keys.astype('i8') + 2 ** 20
+        packed = (packed[:,0] << 42) | (packed[:,1] << 21) | packed[:,2]
+
+        order = np.argsort(packed, kind='stable')
+        starts = np.flatnonzero(np.r_[True, packed[order][1:] != packed[order][:-1]])
+
+        return order, starts
+
+    def free(self, model) -> None:
+        """
+        Frees the slot of a removed model so that it can be reused
+        """
+
+        self.handles[model.slot] = None
+        self.dirty[model.slot] = 0
+        self.free_slots.append(model.slot)
+
+    def clear(self) -> None:
+        """
+        Removes all models and releases all chunk meshes
+        """
+
+        for batches in self.batches.values():
+            for batch in batches.values(): batch.release()
+        for job in self.jobs.values(): job['future'].cancel()
+
+        self.jobs.clear()
+        self.models.clear()
+        self.chunks.clear()
+        self.batches.clear()
+        self.chunk_bounds.clear()
+        self.chunk_lods.clear()
+        self.bounds_array = None
+        self.resident.clear()
+        self.resident_bytes = 0
+        self.stream_center = None
+
+        self.handles.clear()
+        self.free_slots.clear()
+
+        self.dirty[:] = 0
+        self.updated_chunks.clear()
+        self.rebatch_queue.clear()
+        self.removed_models.clear()
+
+    def move(self, model, prev_chunk: tuple, chunk: tuple) -> None:
+        """
+        Moves a model from one chunk to another.
+        """
+
+        if chunk not in self.chunks:
+            self.chunks[chunk] = []
+
+        self.chunks[chunk].append(model)
+        self.chunks[prev_chunk].remove(model)
 
-        del model
\ No newline at end of file
+        self.removed_models.add((prev_chunk, model))
+        if not len(self.chunks[prev_chunk]): self.updated_chunks.add(prev_chunk)
@@ -6,7 +6,12 @@ class Project:
     """
     Stores, loads, and saves scene data
     """
-    def __init__(self, engine) -> None:
+    def __init__(self, engine, save: str="lighting_test") -> None:
+        """
+        Args:
+            save: str
+                Save loaded into the first scene. See Scene
+        """
         # Stores the engine
         self.engine = engine
         self.ctx = engine.ctx
@@ -15,7 +20,7 @@ class Project:
         # Creates a texture handler
         self.texture_handler = TextureHandler(self.engine, self.vao_handler)
         # Creates scenes
-        self.scenes = {0 : Scene(self.engine, self)}
+        self.scenes = {0 : Scene(self.engine, self, save)}
         self.current_scene = self.scenes[0]
         # Use scene
         self.current_scene.use()
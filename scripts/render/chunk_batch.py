@@ -0,0 +1,201 @@
+import numpy as np
+from scripts.generic.profiler import profiler
+
+# Layout of the per object data of a model. Position, rotation quaternion, scale, and material
+INSTANCE_FORMAT  = '3f 4f 3f 1f/i'
+INSTANCE_ATTRIBS = ['obj_position', 'obj_rotation', 'obj_scale', 'obj_material']
+INSTANCE_FLOATS  = 11
+INSTANCE_SIZE    = INSTANCE_FLOATS * 4  # Bytes per instance
+
+# Layout of a vertex in a chunk batch. Mesh data followed by the per object data of its model
+BATCH_FORMAT  = '3f 2f 3f 3f 3f 3f 4f 3f 1f'
+BATCH_ATTRIBS = ['in_position', 'in_uv', 'in_normal', 'in_tangent', 'in_bitangent', *INSTANCE_ATTRIBS]
+VERTEX_FLOATS = 14 + INSTANCE_FLOATS
+VERTEX_SIZE   = VERTEX_FLOATS * 4  # Bytes per vertex
+
+# Layout of the index buffers. Indices of every model in a batch are offset to its rows, so the batch draws with one index buffer
+INDEX_DTYPE = 'u4'
+INDEX_SIZE  = 4  # Bytes per index
+
+# Extra space reserved in a chunk buffer so that added models do not force a new buffer
+GROWTH_FACTOR = 1.5
+MIN_CAPACITY  = 4096  # In rows
+MIN_INDEX_CAPACITY = 3 * MIN_CAPACITY  # In indices
+
+
+class ChunkBatch:
+    """
+    The VBO, IBO, and VAO holding the combined indexed mesh of a chunk.
+    Keeps the range of rows (verticies) and indices each model occupies so single models can be rewritten in place.
+    """
+
+    row_size = VERTEX_SIZE
+
+    def __init__(self, ctx, program, batch_data: np.ndarray, ranges: dict, lod: int=0, index_data: np.ndarray=None, index_ranges: dict=None) -> None:
+        """
+        Creates over allocated buffers holding batch_data and index_data.
+        Args:
+            batch_data: np.ndarray
+                The combined data of the chunk, one row per vertex
+            ranges: dict
+                Maps each model in the chunk to its (offset, count) in rows
+            lod: int
+                Level of detail of the meshes in the batch. 0 is the full mesh
+            index_data: np.ndarray
+                The triangles of the chunk as indices into the rows of batch_data
+            index_ranges: dict
+                Maps each model in the chunk to its (first, count) in indices
+        """
+
+        self.ctx = ctx
+        self.program = program
+        self.lod = lod
+
+        # Number of rows the buffer can hold and the number currently used
+        self.size     = len(batch_data)
+        self.capacity = max(int(self.size * GROWTH_FACTOR), MIN_CAPACITY)
+        # Rows that belong to models that have since left the chunk
+        self.garbage  = 0
+
+        self.ranges = dict(ranges)
+        # Arrays of the models' ranges and bounds used for per model culling. Cleared whenever the ranges change
+        self.cull_data = None
+
+        # Number of indices the index buffer can hold and the number currently used
+        self.index_size     = len(index_data) if index_data is not None else 0
+        self.index_capacity = max(int(self.index_size * GROWTH_FACTOR), MIN_INDEX_CAPACITY)
+        self.index_ranges   = dict(index_ranges or {})
+
+        # Create the vbo, ibo, and the vao from mesh data
+        self.vbo = self.ctx.buffer(reserve=self.capacity * self.row_size)
+        self.vbo.write(batch_data)
+        self.ibo = self.get_ibo(index_data)
+        self.vao = self.get_vao()
+        profiler.count('buffers_created', 2 if self.ibo else 1)
+
+    def get_ibo(self, index_data: np.ndarray):
+        ibo = self.ctx.buffer(reserve=self.index_capacity * INDEX_SIZE)
+        ibo.write(index_data)
+        return ibo
+
+    def get_vao(self):
+        return self.ctx.vertex_array(self.program, [(self.vbo, BATCH_FORMAT, *BATCH_ATTRIBS)], index_buffer=self.ibo, index_element_size=INDEX_SIZE, skip_errors=True)
+
+    def get_bytes(self) -> int:
+        """
+        Returns the size of the batch's buffers
+        """
+
+        return self.vbo.size + self.ibo.size
+
+    def write(self, model, model_data: np.ndarray, index_data: np.ndarray=None) -> bool:
+        """
+        Writes a model's data to the buffer. Rewrites the model's range if it has one, otherwise appends it.
+        The indices of an appended model are offset to the rows it is written to.
+        Returns False if the model does not fit in the buffer and the chunk must be rebuilt.
+        Args:
+            index_data: np.ndarray
+                Indices of the model's triangles into model_data
+        """
+
+        if model in self.ranges:
+            offset, count = self.ranges[model]
+            # A model whose mesh changed size cannot reuse its range
+            if count != len(model_data): return False
+        else:
+            offset, count = self.size, len(model_data)
+            if offset + count > self.capacity: return False
+            if self.ibo and not self.append_indices(model, index_data, offset): return False
+            self.ranges[model] = (offset, count)
+            self.size += count
+
+        self.vbo.write(model_data, offset=offset * self.row_size)
+        self.cull_data = None
+        return True
+
+    def append_indices(self, model, index_data: np.ndarray, offset: int) -> bool:
+        """
+        Appends a model's indices, offset to the row its verticies start at. Returns False if they do not fit
+        """
+
+        first, count = self.index_size, len(index_data)
+        if first + count > self.index_capacity: return False
+
+        self.ibo.write(np.asarray(index_data + offset, dtype=INDEX_DTYPE), offset=first * INDEX_SIZE)
+        self.index_ranges[model] = (first, count)
+        self.index_size += count
+        return True
+
+    def remove(self, model) -> None:
+        """
+        Frees the range of a model. The range is zeroed so its indices draw degenerate triangles until the chunk is compacted.
+        """
+
+        if model not in self.ranges: return
+        offset, count = self.ranges.pop(model)
+        self.index_ranges.pop(model, None)
+        self.vbo.write(bytes(count * self.row_size), offset=offset * self.row_size)
+        self.garbage += count
+        self.cull_data = None
+
+    def needs_compaction(self) -> bool:
+        """
+        True when most of the used rows belong to removed models
+        """
+
+        return self.garbage > self.size // 2
+
+    def render(self, runs: list=None) -> None:
+        """
+        Renders the batch.
+        Args:
+            runs: list=None
+                (first, count) pairs of indices to draw. Draws the whole batch if not given
+        """
+
+        if runs is None: runs = ((0, self.index_size),)
+        for first, count in runs:
+            self.vao.render(vertices=count, first=first)
+            profiler.count('draw_calls')
+            profiler.count('vertices', count)
+
+    def release(self) -> None:
+        self.vbo.release()
+        if self.ibo: self.ibo.release()
+        self.vao.release()
+        profiler.count('buffers_released', 2 if self.ibo else 1)
+
+
+class InstanceBatch(ChunkBatch):
+    """
+    Renders every model of a chunk that shares a mesh with a single instanced draw.
+    The mesh's VBO and IBO are shared, and the buffer only holds one row of per object data for each model.
+    """
+
+    row_size = INSTANCE_SIZE
+
+    def __init__(self, ctx, program, mesh, instance_data: np.ndarray, ranges: dict, lod: int=0) -> None:
+        """
+        Args:
+            mesh: BaseVBO
+                The VBO from the VBOHandler that every instance renders
+        """
+
+        self.mesh = mesh
+        super().__init__(ctx, program, instance_data, ranges, lod)
+
+    def get_ibo(self, index_data: np.ndarray):
+        return None
+
+    def get_vao(self):
+        vbo, ibo = self.mesh.get_lod_buffers(self.lod)
+        return self.ctx.vertex_array(self.program, [(vbo, self.mesh.format, *self.mesh.attribs), (self.vbo, INSTANCE_FORMAT, *INSTANCE_ATTRIBS)],
+                                     index_buffer=ibo, index_element_size=INDEX_SIZE, skip_errors=True)
+
+    def get_bytes(self) -> int:
+        return self.vbo.size
+
+    def render(self) -> None:
+        self.vao.render(instances=self.size)
+        profiler.count('draw_calls')
+        profiler.count('vertices', len(self.mesh.get_lod(self.lod)[1]) * self.size)
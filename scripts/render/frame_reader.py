@@ -0,0 +1,76 @@
+import numpy as np
+from scripts.generic.profiler import profiler
+
+
+class FrameReader:
+    """
+    Reads rendered frames back from the GPU without waiting for each frame to finish.
+    Each frame is copied into one of a ring of pixel buffers, and only read on the CPU once the ring comes back around to it,
+    so the copy runs while the following frames are rendered.
+    """
+
+    def __init__(self, ctx, size: tuple, frames_in_flight: int=3) -> None:
+        """
+        Args:
+            size: tuple
+                (width, height) of the frames
+            frames_in_flight: int
+                Number of pixel buffers. Frames are returned this many reads after they are requested
+        """
+
+        self.ctx = ctx
+        self.size = size
+        self.buffers = [ctx.buffer(reserve=size[0] * size[1] * 4) for _ in range(max(frames_in_flight, 1))]
+        profiler.count('buffers_created', len(self.buffers))
+        self.pending = []  # (frame index, buffer) of the copies not yet read, oldest first
+        self.next_buffer = 0
+
+    def read(self, framebuffer, index: int) -> list:
+        """
+        Starts copying the framebuffer's color attachment into the next pixel buffer.
+        Returns a list of (index, pixels) of the frames whose buffers are needed again, which is empty until the ring is full.
+        Pixels are (height, width, 4) uint8 arrays with the top row first.
+        Args:
+            framebuffer: mgl.Framebuffer
+                Framebuffer to read. Must be the size of the reader
+            index: int
+                Index of the frame, returned with its pixels
+        """
+
+        buffer = self.buffers[self.next_buffer]
+        self.next_buffer = (self.next_buffer + 1) % len(self.buffers)
+
+        # The buffer is about to be reused, so the frame it holds has to be read first
+        frames = []
+        if len(self.pending) == len(self.buffers): frames.append(self.get_frame(*self.pending.pop(0)))
+
+        framebuffer.read_into(buffer, components=4)
+        self.pending.append((index, buffer))
+
+        return frames
+
+    def flush(self) -> list:
+        """
+        Waits for and returns the (index, pixels) of every frame still being copied
+        """
+
+        frames = [self.get_frame(index, buffer) for index, buffer in self.pending]
+        self.pending.clear()
+        return frames
+
+    def get_frame(self, index: int, buffer) -> tuple:
+        """
+        Maps a pixel buffer and returns its frame flipped so the top row is first
+        """
+
+        pixels = np.frombuffer(buffer.read(), dtype='u1').reshape(self.size[1], self.size[0], 4)
+        return index, pixels[::-1]
+
+    def release(self) -> None:
+        """
+        Releases the pixel buffers
+        """
+
+        for buffer in self.buffers: buffer.release()
+        profiler.count('buffers_released', len(self.buffers))
+        self.pending.clear()
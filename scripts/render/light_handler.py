@@ -1,43 +1,245 @@
 import glm
 import random
 import math
+import numpy as np
+import moderngl as mgl
+from scripts.camera import NEAR, FAR
+from scripts.generic.profiler import profiler
+
+
+# Number of light clusters along the screen x, screen y, and view depth
+CLUSTER_COUNT = (16, 9, 24)
+# Width of the texture holding the light index lists. Indices wrap onto the next row
+INDEX_WIDTH = 4096
+# Texture units used for the point light textures
+LIGHT_UNIT, CLUSTER_UNIT, INDEX_UNIT = 10, 11, 12
 
 
 class LightHandler:
     def __init__(self, scene):
-        # Save reference to the scene and the programs
+        # Save reference to the scene and the shader handler
         self.scene = scene
-        self.programs = scene.vao_handler.shader_handler.programs
+        self.ctx = scene.ctx
+        self.shader_handler = scene.vao_handler.shader_handler
         
         # Create a directional light
         self.dir_light = DirectionalLight(ambient=.25, diffuse=0.75, specular=0.5)
         # Create random point lights
         # place_range = 30
         # self.point_lights = [PointLight(pos=(random.randrange(-place_range, place_range), random.randrange(-place_range, place_range), random.randrange(-place_range, place_range)), color=(random.uniform(0.0, 1.0), random.uniform(0.0, 1.0), random.uniform(0.0, 1.0))) for i in range(10)]
+        self.point_lights = []
 
-    def write(self, program, dir=True, point=False):
-        # Get the program
-        program = self.programs[program]
+        # Point lights are binned into view space clusters each frame. Each fragment only shades the lights of its cluster
+        self.cluster_count = CLUSTER_COUNT
+        # Textures holding the packed lights, the (offset, count) range of each cluster, and the light index lists
+        self.light_texture   = None
+        self.cluster_texture = None
+        self.index_texture   = None
+        # Rows allocated in the light and index textures
+        self.light_capacity = 0
+        self.index_capacity = 0
+        # Counts from the last binning, used for reporting
+        self.light_stats = {'point_lights' : 0, 'visible' : 0, 'pairs' : 0, 'max_per_cluster' : 0, 'uploads' : 0}
+        # Packed lights, cluster count, and camera matrices of the last upload. Binning is skipped while they are unchanged
+        self.uploaded = None
 
-        if dir:    # Write the dirctional light
-            program['dirLight.direction'].write(self.dir_light.dir)
+    def add_point_light(self, **kwargs):
+        """
+        Adds a point light to the scene. Takes the arguments of PointLight
+        """
+
+        light = PointLight(**kwargs)
+        self.point_lights.append(light)
+        return light
+
+    def write(self, program, dir=True, point=True):
+        if dir:    # Write the dirctional light. Skipped by the shader handler if it did not change
+            self.shader_handler.write_uniform(program, 'dirLight.direction', self.dir_light.dir)
             #program['dirLight.color'    ].write(self.dir_light.color)
             #program['dirLight.ambient'  ].write(self.dir_light.ambient)
             #program['dirLight.diffuse'  ].write(self.dir_light.diffuse)
             #program['dirLight.specular' ].write(self.dir_light.specular)
 
-        if point:  # Write all point lights
-            program[f'numPointLights'].write(glm.int32(len(self.point_lights)))  # Number of lights that need to be rendered
-            for i, light in enumerate(self.point_lights):  # Loop through all lights and write attributes
-                program[f'pointLights[{i}].position' ].write(light.pos)
-                program[f'pointLights[{i}].constant' ].write(light.constant)
-                program[f'pointLights[{i}].linear'   ].write(light.linear)
-                program[f'pointLights[{i}].quadratic'].write(light.quadratic)
-                program[f'pointLights[{i}].color'    ].write(light.color)
-                program[f'pointLights[{i}].ambient'  ].write(light.ambient)
-                program[f'pointLights[{i}].diffuse'  ].write(light.diffuse)
-                program[f'pointLights[{i}].specular' ].write(light.specular)
-                program[f'pointLights[{i}].radius'   ].write(light.radius)
+        if point:  # Bin and write all point lights
+            self.write_point_lights(program)
+
+    def pack_point_lights(self) -> np.ndarray:
+        """
+        Returns the lights as an (n, 16) array. Each light is a row of four RGBA texels in the light texture
+        """
+
+        data = np.zeros(shape=(len(self.point_lights), 16), dtype='f4')
+        for i, light in enumerate(self.point_lights):
+            data[i] = (*light.pos, light.radius.value, *light.color, light.constant.value,
+                       light.linear.value, light.quadratic.value, light.ambient.value, light.diffuse.value,
+                       light.specular.value, 0, 0, 0)
+        return data
+
+    def bin_point_lights(self, positions: np.ndarray, radii: np.ndarray, m_view: np.ndarray, m_proj: np.ndarray) -> tuple:
+        """
+        Finds the clusters each light's sphere overlaps, using the bounds of the sphere in screen space and view depth.
+        Returns the (offset, count) into the index list of each cluster and the index list, sorted by cluster.
+        Args:
+            positions: np.ndarray
+                (n, 3) world positions of the lights
+            radii: np.ndarray
+                (n,) radius of each light
+            m_view: np.ndarray
+                Row major view matrix
+            m_proj: np.ndarray
+                Row major projection matrix
+        """
+
+        n_x, n_y, n_z = self.cluster_count
+        n_clusters = n_x * n_y * n_z
+
+        # View space position. Depth is positive in front of the camera
+        view = positions @ m_view[:3, :3].T + m_view[:3, 3]
+        depth = -view[:, 2]
+        near, far = NEAR, FAR
+
+        # Depth range of each sphere, clipped to the view. Lights entirely outside it are dropped
+        d_min, d_max = np.maximum(depth - radii, near), np.minimum(depth + radii, far)
+        visible = d_min <= d_max
+
+        # Screen bounds of the sphere's bounding box. x / depth is extreme at either end of the depth range
+        def screen_range(center, scale, count):
+            low  = np.minimum((center - radii) / d_min, (center - radii) / d_max) * scale
+            high = np.maximum((center + radii) / d_min, (center + radii) / d_max) * scale
+            inside = (high >= -1) & (low <= 1)
+            first = np.clip(np.floor((low  + 1) / 2 * count), 0, count - 1).astype('i8')
+            last  = np.clip(np.floor((high + 1) / 2 * count), 0, count - 1).astype('i8')
+            return first, last, inside
+
+        x0, x1, inside_x = screen_range(view[:, 0], m_proj[0, 0], n_x)
+        y0, y1, inside_y = screen_range(view[:, 1], m_proj[1, 1], n_y)
+        visible &= inside_x & inside_y
+
+        # Depth slices are spaced exponentially, so slices are thin close to the camera
+        scale, bias = self.get_slice_parameters(near, far)
+        z0 = np.clip(np.floor(np.log(np.maximum(d_min, near)) * scale + bias), 0, n_z - 1).astype('i8')
+        z1 = np.clip(np.floor(np.log(np.maximum(d_max, near)) * scale + bias), 0, n_z - 1).astype('i8')
+
+        lights = np.flatnonzero(visible)
+        x0, y0, z0 = x0[lights], y0[lights], z0[lights]
+        size_x, size_y = x1[lights] - x0 + 1, y1[lights] - y0 + 1
+        volume = size_x * size_y * (z1[lights] - z0 + 1)
+
+        # Expand every light into one (cluster, light) pair for each cluster in its box
+        total = int(volume.sum())
+        local = np.arange(total) - np.repeat(np.cumsum(volume) - volume, volume)
+        size_x, size_y = np.repeat(size_x, volume), np.repeat(size_y, volume)
+        dz, rem = np.divmod(local, size_x * size_y)
+        dy, dx = np.divmod(rem, size_x)
+        clusters = ((np.repeat(z0, volume) + dz) * n_y + np.repeat(y0, volume) + dy) * n_x + np.repeat(x0, volume) + dx
+
+        # Group the pairs by cluster
+        order = np.argsort(clusters, kind='stable')
+        indices = np.repeat(lights, volume)[order].astype('u4')
+        counts = np.bincount(clusters, minlength=n_clusters)
+        ranges = np.stack([np.cumsum(counts) - counts, counts], axis=1).astype('u4')
+
+        self.light_stats['visible'] = len(lights)
+        self.light_stats['pairs'] = total
+        self.light_stats['max_per_cluster'] = int(counts.max(initial=0))
+        return ranges, indices
+
+    def get_slice_parameters(self, near: float=NEAR, far: float=FAR) -> tuple:
+        """
+        Returns the scale and bias giving the depth slice of a view depth d as log(d) * scale + bias
+        """
+
+        scale = self.cluster_count[2] / np.log(far / near)
+        return scale, -np.log(near) * scale
+
+    def write_point_lights(self, program) -> None:
+        """
+        Bins the point lights into clusters and writes the light, cluster, and index textures.
+        Binning and uploads are skipped when the lights and the camera's view and projection have not changed since the last write.
+        Textures are kept between frames and only remade when they run out of rows.
+        """
+
+        n_x, n_y, n_z = self.cluster_count
+        camera = self.scene.camera
+        write = self.shader_handler.write_uniform
+        self.light_stats['point_lights'] = len(self.point_lights)
+
+        # The shader skips point lights entirely when there are none
+        write(program, 'numPointLights', len(self.point_lights))
+        write(program, 'pointLightTexture', LIGHT_UNIT)
+        write(program, 'clusterTexture', CLUSTER_UNIT)
+        write(program, 'lightIndexTexture', INDEX_UNIT)
+        if not self.point_lights:
+            self.light_stats.update(visible=0, pairs=0, max_per_cluster=0)
+            self.uploaded = None
+            return
+
+        lights = self.pack_point_lights()
+        m_view, m_proj = np.array(camera.m_view), np.array(camera.m_proj)
+        key = (lights.tobytes(), self.cluster_count, m_view.tobytes(), m_proj.tobytes())
+        if key != self.uploaded:
+            self.upload_point_lights(lights, m_view, m_proj)
+            self.uploaded = key
+
+        # Values the shader needs to find the cluster of a fragment
+        scale, bias = self.get_slice_parameters()
+        win_size = self.scene.engine.win_size
+        write(program, 'clusterCount', glm.ivec3(self.cluster_count))
+        write(program, 'clusterTileSize', glm.vec2(win_size[0] / n_x, win_size[1] / n_y))
+        write(program, 'clusterDepth', glm.vec4(NEAR, FAR, scale, bias))
+
+        self.light_texture.use(location=LIGHT_UNIT)
+        self.cluster_texture.use(location=CLUSTER_UNIT)
+        self.index_texture.use(location=INDEX_UNIT)
+
+    def upload_point_lights(self, lights: np.ndarray, m_view: np.ndarray, m_proj: np.ndarray) -> None:
+        """
+        Bins packed lights into clusters and writes the light, cluster, and index textures
+        """
+
+        n_x, n_y, n_z = self.cluster_count
+        ranges, indices = self.bin_point_lights(lights[:, :3], lights[:, 3], m_view, m_proj)
+
+        # Grow the textures by doubling
+        if self.light_texture is None or len(lights) > self.light_capacity:
+            self.light_capacity = max(16, 1 << (len(lights) - 1).bit_length())
+            self.light_texture = self.make_texture(self.light_texture, (4, self.light_capacity), 4, 'f4')
+        rows = -(-len(indices) // INDEX_WIDTH)
+        if self.index_texture is None or rows > self.index_capacity:
+            self.index_capacity = max(1, 1 << (rows - 1).bit_length()) if rows else 1
+            self.index_texture = self.make_texture(self.index_texture, (INDEX_WIDTH, self.index_capacity), 1, 'u4')
+        if self.cluster_texture is None or self.cluster_texture.size != (n_x * n_y, n_z):
+            self.cluster_texture = self.make_texture(self.cluster_texture, (n_x * n_y, n_z), 2, 'u4')
+
+        self.light_texture.write(lights, viewport=(0, 0, 4, len(lights)))
+        if rows:
+            index_data = np.zeros(shape=rows * INDEX_WIDTH, dtype='u4')
+            index_data[:len(indices)] = indices
+            self.index_texture.write(index_data, viewport=(0, 0, INDEX_WIDTH, rows))
+        self.cluster_texture.write(ranges)
+        self.light_stats['uploads'] += 1
+
+    def make_texture(self, texture, size: tuple, components: int, dtype: str):
+        """
+        Releases a texture and makes a new one of the given size to replace it. Used for data read with texelFetch
+        """
+
+        if texture:
+            texture.release()
+            profiler.count('textures_released')
+        texture = self.ctx.texture(size, components=components, dtype=dtype)
+        texture.filter = (mgl.NEAREST, mgl.NEAREST)
+        profiler.count('textures_created')
+        return texture
+
+    def release(self) -> None:
+        """
+        Releases the point light textures
+        """
+
+        textures = [texture for texture in (self.light_texture, self.cluster_texture, self.index_texture) if texture]
+        [texture.release() for texture in textures]
+        profiler.count('textures_released', len(textures))
 
 
 class Light:
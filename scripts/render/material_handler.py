@@ -1,58 +1,162 @@
 import glm
 import numpy as np
+import moderngl as mgl
+from scripts.generic.profiler import profiler
 
 class MaterialHandler:
     def __init__(self, scene) -> None:
         self.scene          = scene
         self.texture_ids    = scene.project.texture_handler.texture_ids
-        self.programs       = scene.vao_handler.shader_handler.programs
+        self.shader_handler = scene.vao_handler.shader_handler
         self.materials      = {}
         self.material_ids   = {}
+
+        # Ids of materials changed since the last flush
+        self.dirty          = set()
+        # Packed data of every material, kept between flushes so only changed rows are written. See pack
+        self.table          = np.zeros(shape=(0, 12), dtype='f4')
+        self.mtl_texture    = None
+        # Counts of uploads, used to check that only changed materials are written
+        self.upload_stats   = {'flushes' : 0, 'materials' : 0, 'table_writes' : 0, 'tables_created' : 0}
+        # Shader feature keys of each material id, and the ids whose keys changed in a flush. See get_features
+        self.features         = {}
+        self.changed_features = set()
         
     def add(self, name="base", color: tuple=(1, 1, 1), specular: float=1, specular_exponent: float=32, alpha: float=1, texture=None, normal_map=None):
         mtl = Material(self, color, specular, specular_exponent, alpha, texture, normal_map)
-        self.material_ids[name] = len(self.materials)
+        # A material replacing one of the same name keeps its id
+        if name not in self.material_ids: self.material_ids[name] = len(self.materials)
         self.materials[name] = mtl
+        mtl.id = self.material_ids[name]
+        self.dirty.add(mtl.id)
+
+    def clear(self) -> None:
+        """
+        Removes every material, such as before a scene's materials are loaded. Ids start from 0 again. The table keeps its rows, so the texture is reused and the new materials are written to it on the next flush
+        """
+
+        self.materials.clear()
+        self.material_ids.clear()
+        self.dirty.clear()
+        self.features.clear()
+        self.changed_features.clear()
+        self.table[:] = 0
 
     def get(self, value):
         if type(value) == int:
             return self.materials[list(self.material_ids.keys())[value]]
 
+    def mark_dirty(self, mtl) -> None:
+        """
+        Queues a material to be written on the next flush
+        """
+
+        if mtl.id is not None: self.dirty.add(mtl.id)
+
     def write(self, program):
-        program = self.programs[program]
-        self.make_texture(program)
-        for mtl_name in list(self.materials.keys()):
-            mtl = self.materials[mtl_name]
-            mtl.write(program, self.texture_ids, self.material_ids[mtl_name])
+        """
+        Writes all materials to the program
+        """
 
-    def make_texture(self, program):
-        if not len(self.materials): return
+        self.dirty.update(range(len(self.materials)))
+        self.update(program)
+
+    def update(self, program='batch'):
+        """
+        Writes the materials changed since the last flush. Called once per frame by the scene
+        """
+
+        if not self.dirty: return
+
+        ids = sorted(self.dirty)
+        self.make_texture(program, ids)
+
+        # Materials that gained or lost a texture map need another shader permutation. The model handler rebatches their models
+        materials = list(self.materials.values())
+        for i in ids:
+            features = self.find_features(materials[i])
+            if self.features.get(i, features) != features: self.changed_features.add(i)
+            self.features[i] = features
 
-        # (3i, 1i, 1i, 1i, 3i, 3i)
-        texture_data = np.zeros(shape=(len(self.materials), 12), dtype="f")
+        self.dirty.clear()
 
-        texture_ids = self.scene.project.texture_handler.texture_ids
+        self.upload_stats['flushes'] += 1
+        self.upload_stats['materials'] += len(ids)
 
-        for i, mtl in enumerate(list(self.materials.values())):
-            texture_data[i][:3]  = mtl.color.x, mtl.color.y, mtl.color.z
-            texture_data[i][3]   = mtl.specular.value
-            texture_data[i][4]   = mtl.specular_exponent.value
-            texture_data[i][5]   = mtl.alpha.value
-            texture_data[i][6]   = mtl.has_texture.value
-            texture_data[i][7:9] = texture_ids[mtl.texture] if mtl.texture else [0, 0]
-            texture_data[i][9]   = mtl.has_normal_map.value
-            texture_data[i][10:] = texture_ids[mtl.normal_map] if mtl.normal_map else [0, 0]
+    def get_features(self, id: int) -> tuple:
+        """
+        Returns the shader feature keys of a material. Materials without texture maps use a permutation of the batch shader with no texture branches
+        """
 
-        texture_buffer = self.scene.ctx.buffer(texture_data)
+        if id not in self.features: self.features[id] = self.find_features(self.get(id))
+        return self.features[id]
 
-        self.mtl_texture = self.scene.ctx.texture((texture_buffer.size, 1), components=1, data=texture_buffer.read())
+    @staticmethod
+    def find_features(mtl) -> tuple:
+        """
+        Returns the feature keys of the texture maps a material has, in sorted order
+        """
 
-        program[f'materialsTexture'] = 9
+        return tuple(key for key, value in (('ALBEDO_MAP', mtl.texture), ('NORMAL_MAP', mtl.normal_map)) if value)
+
+    @staticmethod
+    def pack(mtl, texture_ids) -> tuple:
+        """
+        Returns the 12 floats of a material in the table
+        """
+
+        # (3f, 1f, 1f, 1f, 1f, 2f, 1f, 2f)
+        return (mtl.color.x, mtl.color.y, mtl.color.z, mtl.specular.value, mtl.specular_exponent.value, mtl.alpha.value,
+                mtl.has_texture.value, *(texture_ids[mtl.texture] if mtl.texture else (0, 0)),
+                mtl.has_normal_map.value, *(texture_ids[mtl.normal_map] if mtl.normal_map else (0, 0)))
+
+    def make_texture(self, program, ids: list=None):
+        """
+        Writes the given material ids to the material table texture. Each material is a row of three RGBA texels, indexed by materialID in the shader.
+        The texture is only remade when the table runs out of rows.
+        """
+
+        if not len(self.materials): return
+
+        materials = list(self.materials.values())
+        if ids is None: ids = range(len(materials))
+
+        # Grow the table by doubling. A new texture needs every row written
+        if len(materials) > len(self.table):
+            max_size = self.scene.ctx.info['GL_MAX_TEXTURE_SIZE']
+            if len(materials) > max_size: raise ValueError(f'Scenes can have at most {max_size} materials on this GPU')
+            capacity = min(max(16, 1 << (len(materials) - 1).bit_length()), max_size)
+            table = np.zeros(shape=(capacity, 12), dtype='f4')
+            table[:len(self.table)] = self.table
+            self.table = table
+
+            if self.mtl_texture:
+                self.mtl_texture.release()
+                profiler.count('textures_released')
+            self.mtl_texture = self.scene.ctx.texture((3, capacity), components=4, dtype='f4')
+            self.mtl_texture.filter = (mgl.NEAREST, mgl.NEAREST)
+            self.upload_stats['tables_created'] += 1
+            profiler.count('textures_created')
+            ids = range(len(materials))
+
+        for i in ids:
+            self.table[i] = self.pack(materials[i], self.texture_ids)
+
+        # One write for each run of consecutive changed rows, so unchanged materials between them are not uploaded
+        ids = np.unique(np.asarray(ids, dtype='i8'))
+        for run in np.split(ids, np.flatnonzero(np.diff(ids) != 1) + 1):
+            start, stop = int(run[0]), int(run[-1]) + 1
+            self.mtl_texture.write(self.table[start:stop], viewport=(0, start, 3, stop - start))
+            self.upload_stats['table_writes'] += 1
+
+        self.shader_handler.write_uniform(program, 'materialsTexture', 9)
         self.mtl_texture.use(location=9)
 
 class Material:
     def __init__(self, handler, color: tuple, specular:float, specular_exponent: float, alpha: float, texture=None, normal_map=None) -> None:
         self.handler = handler
+        # Index in the handler's material table. Set by the handler when the material is added
+        self.id = None
         # Numberic attributes
         self.color:             glm.vec3    = color
         self.specular:          glm.float32 = specular
@@ -74,18 +178,6 @@ class Material:
             self.has_normal_map  = True
             self.normal_map: str = normal_map
 
-    def write(self, program, texture_ids, i=0):
-        program[f'materials[{i}].color'           ].write(self.color)
-        program[f'materials[{i}].specular'        ].write(self.specular)
-        program[f'materials[{i}].specularExponent'].write(self.specular_exponent)
-        program[f'materials[{i}].alpha'           ].write(self.alpha)
-
-        program[f'materials[{i}].hasAlbedoMap'  ].write(self.has_texture)
-        program[f'materials[{i}].hasNormalMap'  ].write(self.has_normal_map)
-
-        if self.has_texture  : program[f'materials[{i}].albedoMap'  ].write(glm.vec2(texture_ids[self.texture]))
-        if self.has_normal_map  : program[f'materials[{i}].normalMap'  ].write(glm.vec2(texture_ids[self.normal_map]))
-
     @property
     def color(self): return self._color
     @property
@@ -112,30 +204,31 @@ class Material:
     @color.setter
     def color(self, value):
         self._color = glm.vec3(value)
-        self.handler.write('batch')
+        self.handler.mark_dirty(self)
     @r.setter
     def r(self, value):
         self._color.x = value
-        self.handler.write('batch')
+        self.handler.mark_dirty(self)
     @g.setter
     def g(self, value):
         self._color.y = value
-        self.handler.write('batch')
+        self.handler.mark_dirty(self)
     @b.setter
     def b(self, value):
         self._color.z = value
-        self.handler.write('batch')
+        self.handler.mark_dirty(self)
     @specular.setter
     def specular(self, value):
         self._specular = glm.float32(value)
-        self.handler.write('batch')
+        self.handler.mark_dirty(self)
     @specular_exponent.setter
     def specular_exponent(self, value):
         self._specular_exponent = glm.float32(value)
-        self.handler.write('batch')
+        self.handler.mark_dirty(self)
     @alpha.setter
     def alpha(self, value):
         self._alpha = glm.float32(value)
+        self.handler.mark_dirty(self)
     @has_texture.setter
     def has_texture(self, value):
         self._has_texture = glm.int32(int(value))
@@ -147,8 +240,10 @@ class Material:
         if value: self.has_texture = True
         else: self.has_texture = False
         self._texture = value
+        self.handler.mark_dirty(self)
     @normal_map.setter
     def normal_map(self, value):
         if value: self.has_normal_map = True
         else: self.has_normal_map = False
-        self._normal_map = value
\ No newline at end of file
+        self._normal_map = value
+        self.handler.mark_dirty(self)
\ No newline at end of file
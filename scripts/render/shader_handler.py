@@ -1,46 +1,155 @@
 import moderngl as mgl
 import glm
+import hashlib
+import os
+import re
+from scripts.generic.profiler import profiler
 
-# Predefined uniforms that do not change each frame
-single_frame_uniforms = ['m_proj']
+# Binding point of the camera uniform block, shared by all programs
+CAMERA_BINDING = 0
+# Size of the camera uniform block in std140 layout. Two mat4 and a vec3 padded to 16 bytes
+CAMERA_BLOCK_SIZE = 144
+# Folder holding the shader files. Include paths are relative to it
+SHADER_DIRECTORY = 'shaders'
+# Matches a line including another file and the path of that file
+INCLUDE_PATTERN = re.compile(r'^[ \t]*#include[ \t]+"([^"]+)"[^\n]*', re.MULTILINE)
+# Matches the feature keys checked by #ifdef, #ifndef, and defined()
+FEATURE_PATTERN = re.compile(r'#[ \t]*ifn?def[ \t]+(\w+)|defined[ \t]*\([ \t]*(\w+)')
 
 
 class ShaderHandler:
     def __init__(self, project) -> None:
         self.project = project
         self.ctx = self.project.ctx
+        # Compiled permutations keyed by (name, features). Programs are compiled the first time get_program asks for them
         self.programs = {}
+        # Compiled programs keyed by the hash of their preprocessed source, so identical permutations share one program
+        self.compiled = {}
+        # Source of each shader file with its includes resolved, and the feature keys each program checks for
+        self.sources = {}
+        self.feature_keys = {}
         self.uniform_attribs = {}
 
-        self.programs['default'] = self.load_program('default')
-        self.programs['frame'] = self.load_program('frame')
-        self.programs['batch'] = self.load_program('batch')
-        self.programs['sky'] = self.load_program('sky')
+        # Last bytes written to each uniform of each program. Writes of unchanged bytes are skipped.
+        # Shared by all permutations of a program and written to new permutations when they are compiled
+        self.uniform_cache = {}
+        # Number of uniform writes to each program in the current frame and in the last full frame.
+        # Writes to the camera block are counted under 'camera'
+        self.write_counts = {}
+        self.frame_write_counts = {}
 
-    def load_program(self, name: str='default') -> mgl.Program:
+        # m_proj, m_view, and cameraPosition are shared by all programs through one uniform buffer
+        self.camera_buffer = self.ctx.buffer(reserve=CAMERA_BLOCK_SIZE)
+        self.camera_buffer.bind_to_uniform_block(CAMERA_BINDING)
+        profiler.count('buffers_created')
+        self.camera_data = None
+
+    def get_program(self, name: str='default', features: tuple=()) -> mgl.Program:
+        """
+        Returns the permutation of a program with the given feature keys defined, compiling it on first use.
+        Keys the program's shaders never check for are ignored, so they do not make extra permutations.
+        Args:
+            name: str
+                Name of the shader files, without extension
+            features: tuple
+                Feature keys to #define, such as 'ALBEDO_MAP'
         """
-        Creates a shader program from a file name.
-        Parses through shaders to identify uniforms and save for writting
+
+        key = (name, self.get_features(name, features))
+        if key not in self.programs: self.programs[key] = self.load_program(*key)
+        return self.programs[key]
+
+    def get_features(self, name: str, features: tuple) -> tuple:
         """
+        Returns the sorted feature keys of a permutation, keeping only the keys the program checks for
+        """
+
+        if name not in self.feature_keys:
+            source = self.read_source(f'{name}.vert') + self.read_source(f'{name}.frag')
+            self.feature_keys[name] = {key for match in FEATURE_PATTERN.findall(source) for key in match if key}
+
+        return tuple(sorted(set(features) & self.feature_keys[name]))
+
+    def read_source(self, file: str, included: set=None) -> str:
+        """
+        Reads a shader file and replaces each #include "file" with the contents of that file.
+        Included paths are relative to the shader directory. Each file is only included once per shader.
+        """
+
+        # Only whole shaders are stored, as an included file's result depends on what was already included
+        shader = included is None
+        if shader:
+            if file in self.sources: return self.sources[file]
+            included = set()
+
+        with open(os.path.join(SHADER_DIRECTORY, file)) as source_file:
+            source = source_file.read()
+
+        def include(match):
+            if match.group(1) in included: return ''
+            included.add(match.group(1))
+            return self.read_source(match.group(1), included)
+
+        source = INCLUDE_PATTERN.sub(include, source)
+
+        if shader: self.sources[file] = source
+        return source
+
+    def preprocess(self, file: str, features: tuple) -> str:
+        """
+        Returns the source of a shader file with its includes resolved and a #define for each feature key.
+        The defines are placed after the #version line, which must come first.
+        """
+
+        source = self.read_source(file)
+        if not features: return source
+
+        version, _, body = source.partition('\n')
+        defines = ''.join(f'#define {key}\n' for key in features)
+        return f'{version}\n{defines}{body}'
+
+    def load_program(self, name: str='default', features: tuple=()) -> mgl.Program:
+        """
+        Creates a shader program from a file name and feature keys.
+        Parses through shaders to identify uniforms and save for writting.
+        Values already written to other permutations of the program are written to the new one
+        """
+
+        # Read and preprocess the shaders
+        vertex_shader = self.preprocess(f'{name}.vert', features)
+        fragment_shader = self.preprocess(f'{name}.frag', features)
 
-        # Read the shaders
-        with open(f'shaders/{name}.vert') as file:
-            vertex_shader = file.read()
-        with open(f'shaders/{name}.frag') as file:
-            fragment_shader = file.read()
-            
         # Create blank list for uniforms
-        self.uniform_attribs[name] = []
+        uniforms = []
         # Create a list of all lines in both shaders
         lines = f'{vertex_shader}\n{fragment_shader}'.split('\n')
         # Parse through shader to find uniform variables
         for line in lines:
             tokens = line.strip().split(' ')
             if tokens[0] == 'uniform' and len(tokens) > 2:
-                self.uniform_attribs[name].append(tokens[2][:-1])
+                uniforms.append(tokens[2][:-1])
+
+        # Create a program with shaders. Permutations with the same source share a program
+        source_hash = hashlib.sha1(f'{vertex_shader}\0{fragment_shader}'.encode()).hexdigest()
+        if source_hash not in self.compiled:
+            self.compiled[source_hash] = self.ctx.program(vertex_shader=vertex_shader, fragment_shader=fragment_shader)
+        program = self.compiled[source_hash]
+
+        # Drop uniforms declared more than once or optimized out by the driver, so they are never written
+        # Permutations may use different uniforms, so the program's list holds those of every permutation
+        self.uniform_attribs[name] = list(dict.fromkeys(self.uniform_attribs.get(name, []) + [uniform for uniform in uniforms if program.get(uniform, None) is not None]))
+        # Use the shared camera buffer
+        if program.get('Camera', None) is not None: program['Camera'].binding = CAMERA_BINDING
+
+        # Bring the new permutation up to date with the values written to the program so far
+        self.uniform_cache.setdefault(name, {})
+        self.write_counts.setdefault(name, 0)
+        for uniform, data in self.uniform_cache[name].items():
+            member = program.get(uniform, None)
+            if member is None: continue
+            member.write(data)
+            self.write_counts[name] += 1
 
-        # Create a program with shaders
-        program = self.ctx.program(vertex_shader=vertex_shader, fragment_shader=fragment_shader)
         return program
 
     def set_camera(self, camera):
@@ -55,45 +164,110 @@ class ShaderHandler:
         Gets uniforms from various parts of the scene.
         These values are stored and used in write_all_uniforms and update_uniforms.
         This is called by write_all_uniforms and update_uniforms, so there is no need to call this manually.
+        Camera matricies and position are written to the camera uniform block instead, see write_camera.
         """
         
         self.uniform_values = {
-            'm_proj' : self.camera.m_proj,
-            'm_view' : self.camera.m_view,
             'm_model' : glm.mat4(),
             'textureID' : glm.vec2(0, 0),
-            'cameraPosition' : self.camera.position,
             'winSize' : glm.vec2(*self.project.engine.win_size)
         }
 
+    def write_uniform(self, program: str, uniform: str, value) -> bool:
+        """
+        Writes a value to a uniform of a program if its bytes changed since the last write.
+        Uniforms that are not active in the program are ignored.
+        The value is written to every compiled permutation of the program and does not cause any to be compiled.
+        Returns True if the uniform was written.
+        Args:
+            program: str
+                Name of the program
+            uniform: str
+                Name of the uniform
+            value:
+                A glm or ctypes value. Python ints and floats are written as int32 and float32
+        """
+
+        if isinstance(value, int): value = glm.int32(value)
+        elif isinstance(value, float): value = glm.float32(value)
+        # glm types give row major bytes through the buffer protocol, so use their column major to_bytes
+        data = value.to_bytes() if hasattr(value, 'to_bytes') else bytes(value)
+
+        cache = self.uniform_cache.setdefault(program, {})
+        if cache.get(uniform) == data: return False
+        cache[uniform] = data
+
+        # Written to every compiled permutation. Permutations compiled later are given the cached value
+        written = False
+        for permutation in self.get_permutations(program):
+            member = permutation.get(uniform, None)
+            if member is None: continue  # Optimized out by the driver
+            member.write(data)
+            self.write_counts[program] += 1
+            written = True
+        return written
+
+    def get_permutations(self, name: str) -> list:
+        """
+        Returns the distinct compiled programs of all permutations of a program
+        """
+
+        return list({id(program) : program for (program_name, _), program in self.programs.items() if program_name == name}.values())
+
+    def write_camera(self) -> bool:
+        """
+        Writes the camera's matricies and position to the camera uniform buffer if they changed.
+        Returns True if the buffer was written.
+        """
+
+        camera = self.camera
+        data = camera.m_proj.to_bytes() + camera.m_view.to_bytes() + glm.vec4(camera.position, 0).to_bytes()
+        if data == self.camera_data: return False
+
+        self.camera_buffer.write(data)
+        self.camera_data = data
+        self.write_counts['camera'] = self.write_counts.get('camera', 0) + 1
+        return True
+
+    def new_frame(self) -> None:
+        """
+        Starts counting uniform writes for a new frame. The counts of the frame that ended are kept in frame_write_counts
+        """
+
+        self.frame_write_counts = self.write_counts
+        self.write_counts = {name : 0 for name in self.frame_write_counts}
+
     def write_all_uniforms(self) -> None:
         """
         Writes all of the uniforms in every shader program.
         This should only be used on the first frame or to reset uniforms
         """
 
-        self.get_all_uniforms()
-        for uniform in self.uniform_values:
-            for program in self.programs:
-                if not uniform in self.uniform_attribs[program]: continue  # Does not write uniforms not in the shader
-                self.programs[program][uniform].write(self.uniform_values[uniform])
+        # Forget cached values so that everything is written
+        self.uniform_cache = {program : {} for program in self.uniform_cache}
+        self.camera_data = None
+
+        self.update_uniforms()
 
+    @profiler.timed('shader_handler.update_uniforms')
     def update_uniforms(self) -> None:
         """
-        Updates uniforms that are likely to change each frame
+        Updates uniforms that are likely to change each frame. Only uniforms whose values changed are written.
         Ideal to call once every frame
         """
 
+        self.write_camera()
         self.get_all_uniforms()
         for uniform in self.uniform_values:
-            if uniform in single_frame_uniforms: continue  # Does not write uniforms that dont update each frame
-            for program in self.programs:
+            for program in self.uniform_attribs:
                 if not uniform in self.uniform_attribs[program]: continue  # Does not write uniforms not in the shader
-                self.programs[program][uniform].write(self.uniform_values[uniform])
+                self.write_uniform(program, uniform, self.uniform_values[uniform])
 
     def release(self) -> None:
         """
         Releases all shader programs in handler
         """
         
-        [program.release() for program in self.programs.values()]
\ No newline at end of file
+        [program.release() for program in self.compiled.values()]
+        self.camera_buffer.release()
+        profiler.count('buffers_released')
\ No newline at end of file
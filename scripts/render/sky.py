@@ -10,18 +10,21 @@ class Sky:
         self.scene = scene
         self.ctx = scene.ctx
         self.vao_handler = scene.vao_handler
-        self.programs = self.vao_handler.shader_handler.programs
+        self.shader_handler = self.vao_handler.shader_handler
 
-        # Generate the sky and void planes  
-        self.get_planes()
+        # The sky and void planes are generated on the first render, so the sky program is only compiled if it is used
+        self.sky_vao = None
     
     def get_planes(self):
         sky_vbo = PlaneVBO(self.ctx)
-        self.sky_vao = self.ctx.vertex_array(self.programs['sky'], [(sky_vbo.vbo, sky_vbo.format, *sky_vbo.attribs)], skip_errors=True)
+        self.program = self.shader_handler.get_program('sky')
+        self.sky_vao = sky_vbo.get_vao(self.program)
 
 
     def render(self):
 
+        if not self.sky_vao: self.get_planes()
+
         self.ctx.disable(flags=mgl.DEPTH_TEST | mgl.CULL_FACE)
 
         # Get Model Matrix
@@ -45,16 +48,16 @@ class Sky:
         void_color = glm.vec4(119 / 255, 127 / 255, 127 / 255, 1.0)
 
         self.ctx.clear(color=fog_color)
-        self.programs['sky']['fogColor'].write(fog_color)
+        self.program['fogColor'].write(fog_color)
 
         # Render sky
-        self.programs['sky']['m_model'].write(m_model_sky)
-        self.programs['sky']['planeColor'].write(sky_color)
+        self.program['m_model'].write(m_model_sky)
+        self.program['planeColor'].write(sky_color)
         self.sky_vao.render()
 
         # Render void
-        self.programs['sky']['m_model'].write(m_model_void)
-        self.programs['sky']['planeColor'].write(void_color)
+        self.program['m_model'].write(m_model_void)
+        self.program['planeColor'].write(void_color)
         self.sky_vao.render()
 
         self.ctx.enable(flags=mgl.DEPTH_TEST | mgl.CULL_FACE)
\ No newline at end of file
@@ -2,10 +2,11 @@ import pygame as pg
 import numpy as np
 import moderngl as mgl
 import os
+from scripts.file_manager.texture_cache import TextureCache, texture_cache
 
 
 class TextureHandler:
-    def __init__(self, engine, vao_handler, directory: str='textures') -> None:
+    def __init__(self, engine, vao_handler, directory: str='textures', cache: TextureCache=texture_cache, keep_surfaces: bool=False) -> None:
         # Stores the engine and context
         self.engine = engine
         self.vao_handler = vao_handler
@@ -13,12 +14,19 @@ class TextureHandler:
 
         # The folder containing all textures for the project
         self.directory = directory
+        # Cache of rescaled image data on disk. None to always decode the image files
+        self.cache = cache
 
         # Dictionary containing all texture's data. This is not the texture itself.
+        # Values are the rescaled and flipped RGB data and the size bucket
         self.textures = {}
         # Maps the texture name to the ID in the texture array
         self.texture_ids = {}
+        # Maps the texture name to the path of its image file
+        self.texture_paths = {}
         # Dictionary containing the pygame surfaces of textures. Keys are names, not IDs
+        # Only filled for all textures if keep_surfaces is set, as the editor needs them. Otherwise loaded on request by get_surface
+        self.keep_surfaces = keep_surfaces
         self.texture_surfaces = {}
 
         # Dictionary containing all texture arrays
@@ -29,10 +37,9 @@ class TextureHandler:
         self.load_directory()
 
     def write_textures(self, program='default') -> None:
-        program = self.vao_handler.shader_handler.programs[program]
         for i, size in enumerate(self.sizes):
             if not size in self.texture_arrays: continue
-            program[f'textureArrays[{i}].array'] = i + 3
+            self.vao_handler.shader_handler.write_uniform(program, f'textureArrays[{i}].array', i + 3)
             self.texture_arrays[size].use(location=i+3)
 
     def generate_texture_arrays(self):
@@ -40,16 +47,18 @@ class TextureHandler:
         self.texture_ids.clear()
 
         for texture in self.textures:
-            data = self.textures[texture][0].read()
-            size = self.textures[texture][1]
+            data, size = self.textures[texture]
             location = (self.sizes.index(size), len(size_data[size]))
 
             size_data[size].append(data)
             self.texture_ids[texture] = location
 
         for size in self.sizes:
-            data = np.array(size_data[size])
+            # Layers are copied straight from the CPU side data, one size bucket at a time
+            data = np.stack(size_data[size]) if size_data[size] else np.zeros((0, size, size, 3), dtype='u1')
+            if isinstance(self.texture_arrays[size], mgl.TextureArray): self.texture_arrays[size].release()
             self.texture_arrays[size] = self.ctx.texture_array((size, size, len(size_data[size])), 3, data)
+            del data
             # Mipmaps
             self.texture_arrays[size].build_mipmaps()
             self.texture_arrays[size].filter = (mgl.LINEAR_MIPMAP_LINEAR, mgl.LINEAR)
@@ -63,28 +72,64 @@ class TextureHandler:
         File argument should include the file extension.
         """
 
-        # Constructs the path based on file and directory
-        if self.directory: path = self.directory + file
-        else: path = file
+        self.create_texture(file, self.read_texture(self.get_path(file), self.sizes, self.cache))
 
-        # Loads image using pygame
-        texture = pg.image.load(path).convert()
+    def get_path(self, file: str) -> str:
+        """
+        Constructs the path of a texture file based on file and directory
+        """
 
-        self.texture_surfaces[file[1:-4]] = texture.copy()
+        if self.directory: return self.directory + file
+        return file
+
+    @staticmethod
+    def read_texture(path: str, sizes: tuple, cache: TextureCache=None) -> np.ndarray:
+        """
+        Decodes an image, rescales it to the closest size bucket, and flips it.
+        Uses the texture cache if the file has not changed since it was cached.
+        Does not use the GL context or the display, so it can be run in a worker process.
+        Returns the (size, size, 3) RGB data.
+        """
+
+        cached = cache.load(path, sizes) if cache else None
+        if cached is not None: return cached
+
+        # Loads image using pygame
+        texture = pg.image.load(path)
 
         # Get the closest size
         original_size = texture.get_size()[0]
-        distances = np.array([abs(bucket_size - original_size) for bucket_size in self.sizes])
-        size = self.sizes[np.argmin(distances)]
+        distances = np.array([abs(bucket_size - original_size) for bucket_size in sizes])
+        size = sizes[np.argmin(distances)]
 
         # Rescale to closest size bucket
         texture = pg.transform.scale(texture, (size, size))
         texture = pg.transform.flip(texture, False, True)
 
-        # Make a texture
-        texture = self.ctx.texture(size=texture.get_size(), components=3, data=pg.image.tostring(texture, 'RGB'))
+        data = np.frombuffer(pg.image.tostring(texture, 'RGB'), dtype='u1').reshape(size, size, 3)
+        if cache: cache.save(path, sizes, data)
+
+        return data
+
+    def create_texture(self, file: str, data: np.ndarray) -> None:
+        """
+        Stores image data read by read_texture. The texture arrays are made from it in generate_texture_arrays
+        """
+
+        self.textures[file[1:-4]] = (data, data.shape[0])
+        self.texture_paths[file[1:-4]] = self.get_path(file)
+        # Drop any surface of an earlier image with the same name
+        self.texture_surfaces.pop(file[1:-4], None)
+        if self.keep_surfaces: self.get_surface(file[1:-4])
+
+    def get_surface(self, name: str) -> pg.Surface:
+        """
+        Returns the full size pygame surface of a texture, loading it the first time it is requested
+        """
 
-        self.textures[file[1:-4]] = (texture, size)
+        if name not in self.texture_surfaces:
+            self.texture_surfaces[name] = pg.image.load(self.texture_paths[name])
+        return self.texture_surfaces[name]
 
     def load_directory(self):
         for file in os.listdir(self.directory):
@@ -96,7 +141,7 @@ class TextureHandler:
 
     def release(self) -> None:
         """
-        Releases all textures in a project
+        Releases all texture arrays in a project
         """
 
-        [tex.release() for tex in self.textures.values()]
\ No newline at end of file
+        [array.release() for array in self.texture_arrays.values() if isinstance(array, mgl.TextureArray)]
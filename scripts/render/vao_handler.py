@@ -25,12 +25,12 @@ class VAOHandler:
         """
         Adds a new VAO with a program and VBO. Creates an empty instance buffer
         """
-        # Get program an vbo
-        program = self.shader_handler.programs[program_key]
+        # Get program an vbo. The program is compiled if this is its first use
+        program = self.shader_handler.get_program(program_key)
         vbo = self.vbo_handler.frame_vbo if vbo_key == 'frame' else self.vbo_handler.vbos[vbo_key]
 
         # Make the VAO
-        vao = self.ctx.vertex_array(program, [(vbo.vbo, vbo.format, *vbo.attribs)], skip_errors=True)
+        vao = vbo.get_vao(program)
 
         # Save th VAO
         self.vaos[name] = vao
@@ -2,7 +2,10 @@ import os
 import numpy as np
 from pyobjloader import load_model
 #from scripts.model import load_model
-from numba import njit
+from scripts.file_manager.mesh_cache import MeshCache, mesh_cache
+from scripts.generic.simplify import get_lods
+from scripts.generic.mesh_optimize import optimize_mesh
+from scripts.generic.profiler import profiler
 from uuid import uuid4
 
 
@@ -30,7 +33,7 @@ class VBOHandler:
         Releases all VBOs in handler
         """
 
-        [vbo.vbo.release() for vbo in self.vbos.values()]
+        [vbo.release() for vbo in self.vbos.values()]
         
     def create_vbo(self, vertices, indices) -> str:
         """
@@ -48,6 +51,9 @@ class BaseVBO:
     def __init__(self, ctx):
         self.ctx = ctx
         self.vbo = self.get_vbo()
+        # Vertex and index buffers of each level of detail. The first level is the full mesh
+        self.lod_buffers = [(self.vbo, self.ibo)] + [(self.ctx.buffer(vertex_data), self.ctx.buffer(index_data)) for vertex_data, index_data in self.lods[1:]]
+        profiler.count('buffers_created', 2 * len(self.lod_buffers))
         self.unique_points: list
         self.format: str = None
         self.attrib: list = None
@@ -64,28 +70,71 @@ class BaseVBO:
 
     def get_vbo(self):
         """
-        Creates a buffer with the vertex data
+        Creates a buffer with the unique verticies of the mesh, and an index buffer of its triangles ordered for the vertex cache
         """
         
-        self.vertex_data = self.get_vertex_data()
+        self.vertex_data, self.index_data = optimize_mesh(self.get_vertex_data())
+        self.lods = [(self.vertex_data, self.index_data)]
         vbo = self.ctx.buffer(self.vertex_data)
+        self.ibo = self.ctx.buffer(self.index_data)
+
+        # Save the mesh vertex indicies for softbody reconstruction
+        self.unique_points, self.mesh_indicies = self.get_unique_points(self.vertex_data[self.index_data,:3])
+        # Radius of the sphere around the origin containing the mesh. Used for culling
+        self.radius = float(np.linalg.norm(self.unique_points, axis=1).max())
 
-        unique_points_set = set()
-        self.unique_points = []
-        for x in self.vertex_data[:,:3].tolist():
-            if tuple(x) not in unique_points_set:
-                self.unique_points.append(x)
-                unique_points_set.add(tuple(x))
+        return vbo
 
-        # Save the mash vertex indicies for softbody reconstruction
-        self.mesh_indicies = np.zeros(shape=(len(self.vertex_data)))
-        for i, vertex in enumerate(self.vertex_data):
-            index = self.unique_points.index(vertex[:3].tolist())
-            self.mesh_indicies[i] = index
+    def get_lod(self, level: int) -> tuple:
+        """
+        Returns the (vertex data, index data) of a level of detail, or of the simplest level if the mesh has fewer levels
+        """
 
-        self.unique_points = np.array(self.unique_points, dtype='f4')
+        return self.lods[min(level, len(self.lods) - 1)]
 
-        return vbo
+    def get_lod_buffers(self, level: int) -> tuple:
+        """
+        Returns the (vbo, ibo) of a level of detail, or of the simplest level if the mesh has fewer levels
+        """
+
+        return self.lod_buffers[min(level, len(self.lod_buffers) - 1)]
+
+    def release(self) -> None:
+        """
+        Releases the vertex and index buffers of every level of detail
+        """
+
+        for buffers in self.lod_buffers:
+            for buffer in buffers: buffer.release()
+        profiler.count('buffers_released', 2 * len(self.lod_buffers))
+
+    def get_vao(self, program):
+        """
+        Creates an indexed vertex array of the full mesh for a program
+        """
+
+        return self.ctx.vertex_array(program, [(self.vbo, self.format, *self.attribs)], index_buffer=self.ibo, index_element_size=4, skip_errors=True)
+
+    @staticmethod
+    def get_unique_points(points: np.ndarray) -> tuple:
+        """
+        Finds the unique points of a mesh in a single sorting pass.
+        Returns the unique points in order of first occurrence and the index of each point into them.
+        Args:
+            points: np.ndarray
+                (n, 3) array of vertex positions
+        """
+
+        # Adding zero turns -0.0 into 0.0 so both compare as the same point
+        points = np.asarray(points, dtype='f4') + np.float32(0)
+        unique, first, inverse = np.unique(points, axis=0, return_index=True, return_inverse=True)
+
+        # np.unique sorts the points, so reorder them to match the order they appear in the mesh
+        order = np.argsort(first)
+        rank = np.empty_like(order)
+        rank[order] = np.arange(len(order))
+
+        return unique[order], rank[inverse.reshape(-1)]
     
 class CubeVBO(BaseVBO):
     def __init__(self, ctx):
@@ -193,50 +242,89 @@ class FrameVBO(BaseVBO):
     
 
 class ModelVBO(BaseVBO):
-    def __init__(self, ctx, path):
+    def __init__(self, ctx, path, cache: MeshCache=mesh_cache, mesh: tuple=None):
         self.path = path
+        # Cache of processed vertex data on disk. None to always load from the file
+        self.cache = cache
+        # Arrays from read_mesh if they were already read, for example by the import pipeline
+        self.mesh = mesh
         super().__init__(ctx)
-        self.format = self.model.format
-        self.attribs = self.model.attribs
+        # Describe the vertex data as laid out by get_vertex_data, rather than as given in the file
+        self.format  = '3f 2f 3f'
+        self.attribs = ['in_position', 'in_uv', 'in_normal']
+        if self.vertex_data.shape[1] == 14:
+            self.format += ' 3f 3f'
+            self.attribs += ['in_tangent', 'in_bitangent']
         self.triangles = None
-        self.unique_points = np.array(list(set(map(tuple, self.vertex_data))), dtype='f4')
         self.indicies = []
 
     def get_vbo(self):
         """
         Creates a buffer with the vertex data
         """
-        
-        self.vertex_data = self.get_vertex_data()
-        vbo = self.ctx.buffer(self.vertex_data)
 
-        unique_points_set = set()
-        self.unique_points = []
-        for x in self.vertex_data[:,:3].tolist():
-            if tuple(x) not in unique_points_set:
-                self.unique_points.append(x)
-                unique_points_set.add(tuple(x))
-        self.unique_points = np.array(self.unique_points, dtype='f4')
-        
-        #[self.unique_points.append(x) for x in self.vertex_data[:,:3].tolist() if x not in self.unique_points]
-        #self.unique_points = np.array(list(set(map(tuple, self.vertex_data))), dtype='f4')
+        if self.mesh is None: self.mesh = self.read_mesh(self.path, self.cache)
+        self.vertex_data, self.index_data, self.unique_points, self.mesh_indicies, lod_data, lod_indices, lod_counts = self.mesh
+        self.mesh = None
+        # Split the stacked levels of detail. Views, so cached levels stay memory mapped
+        self.lods = [(self.vertex_data, self.index_data)]
+        if len(lod_counts):
+            self.lods += zip(np.split(lod_data, np.cumsum(lod_counts[:,0])[:-1]), np.split(lod_indices, np.cumsum(lod_counts[:,1])[:-1]))
+        # Radius of the sphere around the origin containing the mesh. Used for culling
+        self.radius = float(np.linalg.norm(self.unique_points, axis=1).max())
 
-        return vbo
+        # Cached arrays are memory mapped, so the vertex data is read straight from the file into the buffer
+        self.ibo = self.ctx.buffer(self.index_data)
+        return self.ctx.buffer(self.vertex_data)
+
+    @staticmethod
+    def read_mesh(path: str, cache: MeshCache=None) -> tuple:
+        """
+        Returns the (vertex_data, index_data, unique_points, mesh_indicies, lod_data, lod_indices, lod_counts) of a model file.
+        The mesh is indexed and ordered for the vertex cache, and the simplified levels of detail are made here, so they are cached with the mesh.
+        Uses the mesh cache if the file has not changed since it was cached.
+        Does not use the GL context, so it can be run in a worker process.
+        """
+
+        cached = cache.load(path) if cache else None
+        if cached is not None: return cached
+
+        vertex_data, index_data = optimize_mesh(ModelVBO.read_vertex_data(path))
+        unique_points, mesh_indicies = BaseVBO.get_unique_points(vertex_data[index_data,:3])
+
+        # Levels are simplified from the triangle list of the mesh, then indexed the same way
+        lod_data, lod_counts = get_lods(vertex_data[index_data], unique_points, mesh_indicies)
+        lods = [optimize_mesh(level) for level in np.split(lod_data, np.cumsum(lod_counts)[:-1])] if len(lod_counts) else []
+        lod_data    = np.vstack([level[0] for level in lods]) if lods else np.zeros(shape=(0, vertex_data.shape[1]), dtype='f4')
+        lod_indices = np.concatenate([level[1] for level in lods]) if lods else np.zeros(shape=(0,), dtype='u4')
+        lod_counts  = np.array([(len(level[0]), len(level[1])) for level in lods], dtype='i4').reshape(-1, 2)
+
+        if cache: cache.save(path, vertex_data, index_data, unique_points, mesh_indicies, lod_data, lod_indices, lod_counts)
+
+        return vertex_data, index_data, unique_points, mesh_indicies, lod_data, lod_indices, lod_counts
 
     def get_vertex_data(self):
-        self.model = load_model(self.path, calculate_tangents=True)
+        return self.read_vertex_data(self.path)
 
-        if len(self.model.vertex_data[0]) == 8:
-            vertex_data = self.model.vertex_data.copy()
+    @staticmethod
+    def read_vertex_data(path: str) -> np.ndarray:
+        """
+        Parses a model file and lays out its vertex data as position, uv, normal, and tangent and bitangent if the file has uvs
+        """
+
+        model = load_model(path, calculate_tangents=True)
+
+        if len(model.vertex_data[0]) == 8:
+            vertex_data = model.vertex_data.copy()
         else:
-            vertex_data = np.zeros(shape=(len(self.model.vertex_data), 8))
-            vertex_data[:,:3] = self.model.vertex_data[:,:3]
-            vertex_data[:,5:] = self.model.vertex_data[:,3:]
+            vertex_data = np.zeros(shape=(len(model.vertex_data), 8))
+            vertex_data[:,:3] = model.vertex_data[:,:3]
+            vertex_data[:,5:] = model.vertex_data[:,3:]
         
-        if len(self.model.tangent_data[0]) == 6:
-            vertex_data = np.hstack([vertex_data, self.model.tangent_data])
+        if len(model.tangent_data[0]) == 6:
+            vertex_data = np.hstack([vertex_data, model.tangent_data])
 
-        return vertex_data
+        return vertex_data.astype('f4')
     
 class RuntimeVBO(BaseVBO):
     def __init__(self, ctx, unique_points, indicies):
@@ -1,3 +1,4 @@
+import os
 from scripts.camera import *
 from scripts.model_handler import ModelHandler
 from scripts.render.material_handler import MaterialHandler
@@ -7,11 +8,16 @@ from scripts.file_manager.save_scene import save_scene
 from scripts.file_manager.load_scene import load_scene
 from math import cos, sin
 import moderngl as mgl
+from scripts.generic.profiler import profiler
 
 class Scene:
-    def __init__(self, engine, project) -> None:
+    def __init__(self, engine, project, save: str="lighting_test") -> None:
         """
         Contains all data for scene
+        Args:
+            save: str
+                Name of a save in the saves folder, or the path of a glTF or binary glTF file, to load.
+                The scene starts empty, with only the base material, if None
         """
 
         # Stores the engine, project, and ctx
@@ -31,10 +37,14 @@ class Scene:
         self.light_handler = LightHandler(self)
         self.time = 0
         
-        load_scene(self, "lighting_test")
+        if save is None: self.material_handler.add("base")
+        elif os.path.isfile(save): load_scene(self, abs_file_path=save)
+        else: load_scene(self, save)
 
-        self.model_handler.add(vbo="sphere", position=(-8, 0, 0))
-        self.model_handler.add(vbo="sphere", position=(-4, 0, 0), material="normal_test")
+        # Models for testing the lighting of the default save
+        if save == "lighting_test":
+            self.model_handler.add(vbo="sphere", position=(-8, 0, 0))
+            self.model_handler.add(vbo="sphere", position=(-4, 0, 0), material="normal_test")
                         
     def use(self, camera=True):
         """
@@ -50,15 +60,18 @@ class Scene:
         self.light_handler.write('batch')
         self.material_handler.write('batch')
 
+    @profiler.timed('scene.update')
     def update(self, camera=True):
         """
         Updates uniforms, and camera
         """
 
+        self.vao_handler.shader_handler.new_frame()
         self.time += self.engine.dt * 2
         self.light_handler.dir_light.dir = glm.vec3(cos(self.time), -1, sin(self.time))
         self.light_handler.write('batch')
 
+        self.material_handler.update('batch')
         self.model_handler.update()
         self.vao_handler.shader_handler.update_uniforms()
         if camera: self.camera.update()
@@ -72,18 +85,19 @@ class Scene:
         self.vao_handler.framebuffer.use()
         # self.sky.render()
         self.ctx.disable(flags=mgl.CULL_FACE)
-        self.model_handler.render()
+        with profiler.gpu_section('scene'): self.model_handler.render()
 
         if not display: return
 
         self.ctx.screen.use()
-        self.vao_handler.shader_handler.programs['frame']['screenTexture'] = 0
+        self.vao_handler.shader_handler.write_uniform('frame', 'screenTexture', 0)
         self.vao_handler.frame_texture.use(location=0)
-        self.vao_handler.vaos['frame'].render()
+        with profiler.gpu_section('frame'): self.vao_handler.vaos['frame'].render()
 
     def release(self):
         """
         Releases scene's VAOs
         """
 
-        self.vao_handler.release()
\ No newline at end of file
+        self.vao_handler.release()
+        self.light_handler.release()
\ No newline at end of file
@@ -9,61 +9,10 @@ in vec3 normal;
 in vec3 position;
 in mat3 TBN;
 
-uniform vec3 cameraPosition;
-
-
-float mtlRed;
-
-
-struct textArray {
-    sampler2DArray array;
-};
-
-struct DirLight {
-    vec3 direction;
-  
-    vec3 color;
-
-    float ambient;
-    float diffuse;
-    float specular;
-};  
-
-struct PointLight{
-    vec3 position;
-
-    vec3 color;
-
-    float constant;
-    float linear;
-    float quadratic;  
-
-    float ambient;
-    float diffuse;
-    float specular;
-    float radius;
-};
-
-struct Material {
-    vec3 color;
-    float specular;
-    float specularExponent;
-    float alpha;
-
-    int hasAlbedoMap;
-    //int hasSpecularMap;
-    int hasNormalMap;
-
-    vec2 albedoMap;
-    //vec2 specularMap;
-    vec2 normalMap;
-};
-
-uniform DirLight dirLight;
-
-#define maxMaterials 10
-uniform Material materials[maxMaterials];
-uniform sampler2D materialsTexture;
+#include "include/camera.glsl"
+#include "include/lights.glsl"
+#include "include/material.glsl"
+#include "include/textures.glsl"
 
 float schlickFresnel(float x) {
     x = clamp(1.0 - x, 0.0, 1.0);
@@ -95,38 +44,101 @@ vec3 CalcDirLight(DirLight light, Material mtl, vec3 normal, vec3 out_vector, ve
     return albedo * diff;
 }
 
+// Point lights, one row of four texels per light. See LightHandler.pack_point_lights
+uniform int numPointLights;
+uniform sampler2D pointLightTexture;
+// (offset, count) of each cluster's lights in the index list, and the index list itself
+uniform usampler2D clusterTexture;
+uniform usampler2D lightIndexTexture;
+uniform ivec3 clusterCount;
+uniform vec2 clusterTileSize;
+uniform vec4 clusterDepth;  // Near plane, far plane, slice scale, slice bias
+
+PointLight getPointLight(int id) {
+    vec4 a = texelFetch(pointLightTexture, ivec2(0, id), 0);
+    vec4 b = texelFetch(pointLightTexture, ivec2(1, id), 0);
+    vec4 c = texelFetch(pointLightTexture, ivec2(2, id), 0);
+    vec4 d = texelFetch(pointLightTexture, ivec2(3, id), 0);
+
+    PointLight light;
+    light.position  = a.xyz;
+    light.radius    = a.w;
+    light.color     = b.rgb;
+    light.constant  = b.a;
+    light.linear    = c.r;
+    light.quadratic = c.g;
+    light.ambient   = c.b;
+    light.diffuse   = c.a;
+    light.specular  = d.r;
+    return light;
+}
 
-uniform textArray textureArrays[5];
+ivec3 getCluster() {
+    // Linear view depth from the depth buffer value
+    float near = clusterDepth.x;
+    float far  = clusterDepth.y;
+    float z = gl_FragCoord.z * 2.0 - 1.0;
+    float depth = 2.0 * near * far / (far + near - z * (far - near));
+
+    ivec3 cluster = ivec3(ivec2(gl_FragCoord.xy / clusterTileSize), int(floor(log(depth) * clusterDepth.z + clusterDepth.w)));
+    return clamp(cluster, ivec3(0), clusterCount - 1);
+}
+
+vec3 CalcPointLight(PointLight light, Material mtl, vec3 normal, vec3 out_vector, vec3 albedo) {
+    vec3 to_light = light.position - position;
+    float distance = length(to_light);
+    if (distance > light.radius) return vec3(0.0);
+
+    // Vector between the view and light vectors
+    vec3 incident_vector = to_light / distance;
+    vec3 halfVector = normalize(out_vector + incident_vector);
+    float attenuation = 1.0 / (light.constant + light.linear * distance + light.quadratic * distance * distance);
+    // Disney Diffuse
+    float diff = disneyDiffuse(mtl, normal, incident_vector, halfVector, out_vector);
+    return light.color * albedo * (light.ambient + light.diffuse * diff) * attenuation;
+}
+
+vec3 CalcPointLights(Material mtl, vec3 normal, vec3 out_vector, vec3 albedo) {
+    // Only the lights binned into this fragment's cluster can reach it
+    ivec3 cluster = getCluster();
+    uvec2 range = texelFetch(clusterTexture, ivec2(cluster.x + cluster.y * clusterCount.x, cluster.z), 0).rg;
+    int width = textureSize(lightIndexTexture, 0).x;
+
+    vec3 result = vec3(0.0);
+    for (int i = int(range.x); i < int(range.x + range.y); i++) {
+        int id = int(texelFetch(lightIndexTexture, ivec2(i % width, i / width), 0).r);
+        result += CalcPointLight(getPointLight(id), mtl, normal, out_vector, albedo);
+    }
+    return result;
+}
 
 
 void main() {
 
 
-    Material mtl = materials[int(materialID)];
+    Material mtl = getMaterial(materialID);
 
+    // Texture maps are compiled in per material, see MaterialHandler.get_features
     vec3 albedo;
     vec2 textureID;
-    if (bool(mtl.hasAlbedoMap)) {
-        textureID = mtl.albedoMap;
-        albedo = texture(textureArrays[int(round(textureID.x))].array, vec3(uv, round(textureID.y))).rgb;
-    }
-    else {
-        albedo = mtl.color;
-    }
+#ifdef ALBEDO_MAP
+    textureID = mtl.albedoMap;
+    albedo = texture(textureArrays[int(round(textureID.x))].array, vec3(uv, round(textureID.y))).rgb;
+#else
+    albedo = mtl.color;
+#endif
 
     vec3 normalDirection = normal;
-    if (bool(mtl.hasNormalMap)) {
-        textureID = mtl.normalMap;
-        vec3 nomral_map_fragment = texture(textureArrays[int(round(textureID.x))].array, vec3(uv, round(textureID.y))).rgb;
-        normalDirection = nomral_map_fragment * 2.0 - 1.0;
-        normalDirection = normalize(TBN * normalDirection); 
-    }
+#ifdef NORMAL_MAP
+    textureID = mtl.normalMap;
+    vec3 nomral_map_fragment = texture(textureArrays[int(round(textureID.x))].array, vec3(uv, round(textureID.y))).rgb;
+    normalDirection = nomral_map_fragment * 2.0 - 1.0;
+    normalDirection = normalize(TBN * normalDirection); 
+#endif
 
 
     vec3 out_vector = normalize(cameraPosition - position);
     vec3 light_result = CalcDirLight(dirLight, mtl, normalize(normalDirection), out_vector, albedo);
+    if (numPointLights > 0) light_result += CalcPointLights(mtl, normalize(normalDirection), out_vector, albedo);
     fragColor = vec4(light_result, mtl.alpha);
-
-    mtlRed = texture(materialsTexture, vec2(materialID * 12, 1)).r  * 255;
-    fragColor.rgb += vec3(mtlRed) / 100000;
 }
\ No newline at end of file
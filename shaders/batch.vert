@@ -7,7 +7,7 @@ layout (location = 3) in vec3 in_tangent;
 layout (location = 4) in vec3 in_bitangent;
 
 layout (location = 5) in vec3 obj_position;
-layout (location = 6) in vec3 obj_rotation;
+layout (location = 6) in vec4 obj_rotation;  // Quaternion (x, y, z, w)
 layout (location = 7) in vec3 obj_scale;
 layout (location = 8) in float obj_material;
 
@@ -17,45 +17,26 @@ out vec3 normal;
 out vec3 position;
 out mat3 TBN;
 
-uniform mat4 m_proj;
-uniform mat4 m_view;
+#include "include/camera.glsl"
+
+vec3 rotate(vec4 q, vec3 v) {
+    // Rotates v by the unit quaternion q
+    return v + 2.0 * cross(q.xyz, cross(q.xyz, v) + q.w * v);
+}
 
 void main() {
-    vec3 rot = obj_rotation;
-
-    mat4 m_rot = mat4(
-        cos(rot.z) * cos(rot.y), cos(rot.z) * sin(rot.y) * sin(rot.x) - sin(rot.z) * cos(rot.x), cos(rot.z) * sin(rot.y) * cos(rot.x) + sin(rot.z) * sin(rot.x), 0,
-        sin(rot.z) * cos(rot.y), sin(rot.z) * sin(rot.y) * sin(rot.x) + cos(rot.z) * cos(rot.x), sin(rot.z) * sin(rot.y) * cos(rot.x) - cos(rot.z) * sin(rot.x), 0,
-        -sin(rot.y)            , cos(rot.y) * sin(rot.x)                                       , cos(rot.y) * cos(rot.x)                                       , 0,
-        0                      , 0                                                             , 0                                                             , 1
-    );
-
-    mat4 m_trans = mat4(
-        1, 0, 0, 0,
-        0, 1, 0, 0,
-        0, 0, 1, 0,
-        obj_position.x, obj_position.y, obj_position.z, 1
-    );
-
-    mat4 m_scale = mat4(
-        obj_scale.x, 0          , 0          , 0,
-        0          , obj_scale.y, 0          , 0,
-        0          , 0          , obj_scale.z, 0,
-        0          , 0          , 0          , 1
-    );
-
-    mat4 m_model = m_trans * m_rot * m_scale;
-
-    position = (m_model * vec4(in_position, 1.0)).xyz;
-
-    normal = normalize(mat3(transpose(inverse(m_model))) * in_normal);
-    vec3 T = normalize(vec3(m_model * vec4(in_tangent,   0.0)));
-    vec3 B = normalize(vec3(m_model * vec4(in_bitangent, 0.0)));
-    vec3 N = normalize(vec3(m_model * vec4(in_normal,    0.0)));
+    // Scale, rotate, then translate. Same as m_trans * m_rot * m_scale
+    position = obj_position + rotate(obj_rotation, obj_scale * in_position);
+
+    // The normal matrix of a rotation and scale is the rotation with the inverse scale
+    normal = normalize(rotate(obj_rotation, in_normal / obj_scale));
+    vec3 T = normalize(rotate(obj_rotation, obj_scale * in_tangent));
+    vec3 B = normalize(rotate(obj_rotation, obj_scale * in_bitangent));
+    vec3 N = normalize(rotate(obj_rotation, obj_scale * in_normal));
     TBN = mat3(T, B, N);
 
     uv = in_uv;
     materialID = int(obj_material);
 
-    gl_Position = m_proj * m_view * m_model * vec4(in_position, 1.0);
+    gl_Position = m_proj * m_view * vec4(position, 1.0);
 }
\ No newline at end of file
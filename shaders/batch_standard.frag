@@ -9,61 +9,10 @@ in vec3 normal;
 in vec3 position;
 in mat3 TBN;
 
-uniform vec3 cameraPosition;
-
-
-float mtlRed;
-
-
-struct textArray {
-    sampler2DArray array;
-};
-
-struct DirLight {
-    vec3 direction;
-  
-    vec3 color;
-
-    float ambient;
-    float diffuse;
-    float specular;
-};  
-
-struct PointLight{
-    vec3 position;
-
-    vec3 color;
-
-    float constant;
-    float linear;
-    float quadratic;  
-
-    float ambient;
-    float diffuse;
-    float specular;
-    float radius;
-};
-
-struct Material {
-    vec3 color;
-    float specular;
-    float specularExponent;
-    float alpha;
-
-    int hasAlbedoMap;
-    //int hasSpecularMap;
-    int hasNormalMap;
-
-    vec2 albedoMap;
-    //vec2 specularMap;
-    vec2 normalMap;
-};
-
-uniform DirLight dirLight;
-
-#define maxMaterials 10
-uniform Material materials[maxMaterials];
-uniform sampler2D materialsTexture;
+#include "include/camera.glsl"
+#include "include/lights.glsl"
+#include "include/material.glsl"
+#include "include/textures.glsl"
 
 
 vec3 CalcDirLight(DirLight light, Material mtl, vec3 normal, vec3 viewDir, vec3 albedo) {
@@ -79,13 +28,10 @@ vec3 CalcDirLight(DirLight light, Material mtl, vec3 normal, vec3 viewDir, vec3
 }
 
 
-uniform textArray textureArrays[5];
-
-
 void main() {
 
 
-    Material mtl = materials[int(materialID)];
+    Material mtl = getMaterial(materialID);
 
     vec3 albedo;
     vec2 textureID;
@@ -110,7 +56,5 @@ void main() {
     vec3 light_result = CalcDirLight(dirLight, mtl, normalDirection, viewDir, albedo);
     fragColor = vec4(light_result, mtl.alpha);
 
-    mtlRed = texture(materialsTexture, vec2(materialID * 12, 1)).r  * 255;
-    fragColor.rgb += vec3(mtlRed) / 100000;
     fragColor.rgb += viewDir      / 100000;
 }
\ No newline at end of file
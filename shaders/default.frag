@@ -7,11 +7,7 @@ in float shading;
 
 uniform vec2 textureID;
 
-struct textArray {
-    sampler2DArray array;
-};
-
-uniform textArray textureArrays[5];
+#include "include/textures.glsl"
 
 
 void main() {
@@ -4,8 +4,7 @@ layout (location = 0) in vec3 in_position;
 layout (location = 1) in vec2 in_uv;
 layout (location = 2) in vec3 in_normal;
 
-uniform mat4 m_proj;
-uniform mat4 m_view;
+#include "include/camera.glsl"
 uniform mat4 m_model;
 
 out vec2 uv;
@@ -0,0 +1,6 @@
+// Shared by all programs, written by ShaderHandler.write_camera
+layout (std140) uniform Camera {
+    mat4 m_proj;
+    mat4 m_view;
+    vec3 cameraPosition;
+};
\ No newline at end of file
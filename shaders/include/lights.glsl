@@ -0,0 +1,26 @@
+struct DirLight {
+    vec3 direction;
+  
+    vec3 color;
+
+    float ambient;
+    float diffuse;
+    float specular;
+};  
+
+struct PointLight{
+    vec3 position;
+
+    vec3 color;
+
+    float constant;
+    float linear;
+    float quadratic;  
+
+    float ambient;
+    float diffuse;
+    float specular;
+    float radius;
+};
+
+uniform DirLight dirLight;
\ No newline at end of file
@@ -0,0 +1,34 @@
+struct Material {
+    vec3 color;
+    float specular;
+    float specularExponent;
+    float alpha;
+
+    int hasAlbedoMap;
+    //int hasSpecularMap;
+    int hasNormalMap;
+
+    vec2 albedoMap;
+    //vec2 specularMap;
+    vec2 normalMap;
+};
+
+// Table of all materials, one row of three texels per material. See MaterialHandler.pack
+uniform sampler2D materialsTexture;
+
+Material getMaterial(int id) {
+    vec4 a = texelFetch(materialsTexture, ivec2(0, id), 0);
+    vec4 b = texelFetch(materialsTexture, ivec2(1, id), 0);
+    vec4 c = texelFetch(materialsTexture, ivec2(2, id), 0);
+
+    Material mtl;
+    mtl.color            = a.rgb;
+    mtl.specular         = a.a;
+    mtl.specularExponent = b.r;
+    mtl.alpha            = b.g;
+    mtl.hasAlbedoMap     = int(b.b);
+    mtl.albedoMap        = vec2(b.a, c.r);
+    mtl.hasNormalMap     = int(c.g);
+    mtl.normalMap        = c.ba;
+    return mtl;
+}
\ No newline at end of file
@@ -0,0 +1,5 @@
+struct textArray {
+    sampler2DArray array;
+};
+
+uniform textArray textureArrays[5];
\ No newline at end of file
@@ -2,8 +2,7 @@
 
 layout (location = 0) in vec3 in_position;
 
-uniform mat4 m_proj;
-uniform mat4 m_view;
+#include "include/camera.glsl"
 uniform mat4 m_model;
 
 out vec3 v_viewpos;